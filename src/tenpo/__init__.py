@@ -0,0 +1,3 @@
+# first, so that a startup profile sees every import after it
+# LOCAL
+from tenpo.startup_utils import STARTUP
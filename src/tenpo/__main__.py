@@ -1,5 +1,6 @@
 # STL
 import os
+import sys
 import logging
 from typing import Any
 
@@ -11,6 +12,7 @@ from discord.ext import commands
 # LOCAL
 from tenpo.db import TenpoDB, TenpoDBFactory
 from tenpo.log_utils import getLogger, configure_logger
+from tenpo.startup_utils import STARTUP
 
 LOG = getLogger()
 
@@ -29,10 +31,28 @@ def load_envvar(envvar: str, default: Any = None) -> str:
 
 TOKEN = load_envvar("DISCORD_TOKEN")
 DB_FILE = load_envvar("DB_FILE")
+DB_SHARDS = int(load_envvar("DB_SHARDS", "1"))  # >1: split with `tenpo.shard_utils`
 LOG_LEVEL = load_envvar("LOG_LEVEL", "WARNING")
 LOG_LEVEL_DISCORD = load_envvar("LOG_LEVEL_DISCORD", "WARNING")
 LOG_LEVEL_INT = getattr(logging, LOG_LEVEL.upper())
 LOG_LEVEL_DISCORD_INT = getattr(logging, LOG_LEVEL_DISCORD.upper())
+LOG_MODE = load_envvar("LOG_MODE", "dev")  # prod: queued, tracebacks only on errors
+LOG_SAMPLE = int(load_envvar("LOG_SAMPLE", "1"))  # keep 1 in N debug lines per line
+METRICS_PORT = int(load_envvar("METRICS_PORT", "0"))  # 0: don't export metrics
+
+BACKUP_DIR = load_envvar("BACKUP_DIR", "")  # unset: compact, but take no snapshots
+BACKUP_KEEP = int(load_envvar("BACKUP_KEEP", "7"))
+BACKUP_HOURS = float(load_envvar("BACKUP_HOURS", "24"))
+
+INGRESS_SIZE = int(load_envvar("INGRESS_SIZE", "1000"))  # messages waiting at most
+POLICY_WORKERS = int(load_envvar("POLICY_WORKERS", "16"))
+# classifying holds the loop, so more workers only overlap their waits
+CLASSIFY_WORKERS = int(load_envvar("CLASSIFY_WORKERS", "2"))
+CLASSIFY_SIZE = int(load_envvar("CLASSIFY_SIZE", "100"))  # waiting, else policy waits
+INGRESS_POLICY = load_envvar("INGRESS_POLICY", "priority")  # see `ShedPolicy`
+RESPONSE_WORKERS = int(load_envvar("RESPONSE_WORKERS", "8"))
+RESPONSE_GUILD_CAP = int(load_envvar("RESPONSE_GUILD_CAP", "2"))  # at once, per guild
+RESPONSE_BACKLOG = int(load_envvar("RESPONSE_BACKLOG", "5000"))  # across all guilds
 
 DEBUG_GUILDS = load_envvar("DEBUG_GUILDS", "")
 if DEBUG_GUILDS:
@@ -45,19 +65,26 @@ INTENTS = Intents(
     message_content=True,  # so we can evaluate messages for goodness
     reactions=True,  # knowing what reactions are available in guilds
 )
-BOT = commands.Bot(
-    command_prefix="/",
-    intents=INTENTS,
-    debug_guilds=DEBUG_GUILDS,
-)
-DB: TenpoDB = BOT.loop.run_until_complete(TenpoDBFactory(database_file=DB_FILE))
+with STARTUP.step("init", "bot"):
+    BOT = commands.Bot(
+        command_prefix="/",
+        intents=INTENTS,
+        debug_guilds=DEBUG_GUILDS,
+    )
+with STARTUP.step("init", "db"):
+    DB: TenpoDB = BOT.loop.run_until_complete(
+        TenpoDBFactory(database_file=DB_FILE, shards=DB_SHARDS)
+    )
 # use bot's loop instead of our own so tasks work as intended
 
 
 @BOT.event
 async def on_ready():
     for index, guild in enumerate(BOT.guilds):
-        LOG.info("{}) {}".format(index + 1, guild.name))
+        LOG.info("%s) %s", index + 1, guild.name)
+    if STARTUP.enabled:
+        LOG.warning("Startup profile:\n%s", STARTUP.report("Ready"))
+        STARTUP.enabled = False  # on_ready fires again on every reconnect
 
 
 def load_extensions():
@@ -76,15 +103,24 @@ def load_extensions():
         if "__init__.py" not in os.listdir(path):
             continue
         LOG.info("Loading cog %s", cogname)
-        BOT.load_extension(f"tenpo.cogs.{cogname}")
+        with STARTUP.step("cog", cogname):
+            BOT.load_extension(f"tenpo.cogs.{cogname}")
 
 
 def main():
-    configure_logger("tenpo", log_level=LOG_LEVEL_INT)
-    configure_logger("discord", log_level=LOG_LEVEL_DISCORD_INT)
+    configure_logger(
+        "tenpo", log_level=LOG_LEVEL_INT, mode=LOG_MODE, sample_rate=LOG_SAMPLE
+    )
+    configure_logger("discord", log_level=LOG_LEVEL_DISCORD_INT, mode=LOG_MODE)
     load_extensions()
+    if STARTUP.enabled:
+        STARTUP.finish()
+        LOG.warning("Startup profile:\n%s", STARTUP.report("Cogs loaded"))
     BOT.run(TOKEN, reconnect=True)
 
 
 if __name__ == "__main__":
+    # cogs import this module as `tenpo.__main__`; without this, importing it
+    # would run it all again, building a second bot and opening the DB twice
+    _ = sys.modules.setdefault("tenpo.__main__", sys.modules[__name__])
     main()
@@ -1,3 +1,8 @@
+# STL
+from heapq import nsmallest
+from collections import OrderedDict, defaultdict
+from collections.abc import Iterable
+
 # LOCAL
 from tenpo.log_utils import getLogger
 
@@ -27,3 +32,81 @@ def startswith_filter(s: str, opts: list[str]):
 
 def autocomplete_filter(s: str, opts: list[str]):
     return fuzzy_filter(s, opts)
+
+
+# a query matching right after one of these matches the start of a word
+WORD_SEPARATORS = "/_- "
+AUTOCOMPLETE_LIMIT = 25  # discord shows at most 25 choices
+QUERY_CACHE_SIZE = 2048
+
+
+def match_score(query: str, lowered: str) -> tuple[int, int, int] | None:
+    """
+    How well `query` matches `lowered`, lower being better, or None if it
+    isn't a subsequence. Exact beats prefix beats word start beats substring
+    beats scattered letters, which rank by how tightly they cluster.
+    """
+    if lowered == query:
+        return 0, 0, len(lowered)
+    if lowered.startswith(query):
+        return 1, 0, len(lowered)
+    if (at := lowered.find(query)) >= 0:
+        kind = 2 if lowered[at - 1] in WORD_SEPARATORS else 3
+        return kind, at, len(lowered)
+
+    start = end = lowered.find(query[0])
+    if start < 0:
+        return None
+    for char in query[1:]:
+        end = lowered.find(char, end + 1)
+        if end < 0:
+            return None
+    return 4, end - start, len(lowered)
+
+
+class AutocompleteIndex:
+    """
+    Ranked fuzzy search over a fixed list of options. Options are lowercased
+    once, and an inverted index from each character to the options holding
+    it narrows every query to options with all of its letters before any
+    matching. Candidates are cached per query, so each keystroke starts from
+    the candidates of the query before it.
+    """
+
+    def __init__(self, options: Iterable[str], limit: int = AUTOCOMPLETE_LIMIT):
+        self.options = list(dict.fromkeys(options))
+        self.limit = limit
+        self.__lowered = [opt.lower() for opt in self.options]
+        self.__by_char: dict[str, set[int]] = defaultdict(set)
+        for i, lowered in enumerate(self.__lowered):
+            for char in lowered:
+                self.__by_char[char].add(i)
+        # query -> ids of every option it matches, and the best of them
+        self.__cache: OrderedDict[str, tuple[list[int], list[str]]] = OrderedDict()
+
+    def __narrow(self, query: str) -> list[int]:
+        for end in range(len(query) - 1, 0, -1):
+            if (cached := self.__cache.get(query[:end])) is not None:
+                pool = cached[0]
+                break
+        else:
+            sets = sorted((self.__by_char.get(c, set()) for c in set(query)), key=len)
+            pool = sorted(set.intersection(*sets))
+        return [i for i in pool if match_score(query, self.__lowered[i])]
+
+    def search(self, query: str) -> list[str]:
+        # spaces stand for any run of letters: "eur lon" finds Europe/London
+        query = "".join(query.lower().split())
+        if not query:
+            return self.options[: self.limit]
+        if (cached := self.__cache.get(query)) is not None:
+            self.__cache.move_to_end(query)
+            return cached[1].copy()
+
+        found = self.__narrow(query)
+        scored = ((match_score(query, self.__lowered[i]), i) for i in found)
+        results = [self.options[i] for _, i in nsmallest(self.limit, scored)]
+        self.__cache[query] = (found, results)
+        if len(self.__cache) > QUERY_CACHE_SIZE:
+            _ = self.__cache.popitem(last=False)
+        return results.copy()
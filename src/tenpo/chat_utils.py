@@ -32,8 +32,8 @@ async def send_dm_to_user(user: User | Member, message: str):
         LOG.error("Cannot DM user %s", user.name)
     except discord.errors.HTTPException as e:
         LOG.error("Couldn't send DM due to unexpected exception!")
-        LOG.error(f"Error code: {e.code}")
-        LOG.error(f"Error text: {e.text}")
+        LOG.error("Error code: %s", e.code)
+        LOG.error("Error text: %s", e.text)
 
 
 async def send_delete_dm(message: Message):
@@ -0,0 +1,6 @@
+# LOCAL
+from .cog import CogBackup
+
+
+def setup(bot):
+    bot.add_cog(CogBackup(bot))
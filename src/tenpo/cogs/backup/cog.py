@@ -0,0 +1,58 @@
+# STL
+import os
+from datetime import UTC, datetime
+
+# PDM
+from discord import Bot, Cog
+from discord.ext import tasks
+
+# LOCAL
+from tenpo.db import rotate_backups, remove_partial_backups
+from tenpo.__main__ import DB, DB_FILE, BACKUP_DIR, BACKUP_KEEP, BACKUP_HOURS
+from tenpo.log_utils import getLogger
+
+LOG = getLogger()
+
+
+async def take_snapshot(backup_dir: str, keep: int) -> str:
+    os.makedirs(backup_dir, exist_ok=True)
+    stem = os.path.splitext(os.path.basename(DB_FILE))[0]
+    stamp = datetime.now(UTC).strftime("%Y%m%dT%H%M%S")
+    path = os.path.join(backup_dir, f"{stem}.{stamp}.sqlite")
+
+    if partial := remove_partial_backups(backup_dir, stem):
+        LOG.warning("Removed partial snapshots %s", partial)
+    await DB.backup(path)
+
+    expired = rotate_backups(backup_dir, stem, keep)
+    if expired:
+        LOG.info("Removed old snapshots %s", expired)
+    return path
+
+
+class CogBackup(Cog):
+    def __init__(self, bot: Bot):
+        super().__init__()
+        self.bot: Bot = bot
+        if DB_FILE == ":memory:":
+            LOG.info("In-memory database; not backing up or compacting")
+            return
+        self.maintain.change_interval(hours=BACKUP_HOURS)
+        _ = self.maintain.start()
+
+    @tasks.loop(hours=24)
+    async def maintain(self):
+        if BACKUP_DIR:
+            try:
+                path = await take_snapshot(BACKUP_DIR, BACKUP_KEEP)
+                LOG.info("Wrote snapshot %s", path)
+            except Exception as e:
+                LOG.error("Couldn't back up the DB; no snapshot taken! %s", e)
+
+        try:
+            pruned = await DB.prune_entities()
+            freed = await DB.compact()
+            LOG.info("Pruned %s empty entities, freed %s pages", pruned, freed)
+        except Exception as e:
+            LOG.error("Got an error during DB maintenance! %s", e)
+            LOG.error("Swallowing the error in the hopes of the task surviving.")
@@ -1,8 +1,11 @@
 # STL
+import io
 import sys
+import time
+import asyncio
 import contextlib
 from io import StringIO
-from typing import List, Optional
+from typing import List, Optional, cast
 
 # PDM
 import discord
@@ -13,8 +16,12 @@ from discord.ext.commands import Cog
 from discord.commands.context import ApplicationContext
 
 # LOCAL
+from tenpo.__main__ import DB
+from tenpo.lag_utils import MONITOR, format_stalls
 from tenpo.log_utils import getLogger
 from tenpo.chat_utils import chunk_response, codeblock_wrap
+from tenpo.metrics_utils import dump_call_stats, format_call_stats
+from tenpo.profile_utils import ProfileMode, MemoryTracker, profile_loop
 
 LOG = getLogger()
 
@@ -44,6 +51,8 @@ async def safe_respond(ctx: ApplicationContext, resp: Optional[str]):
 class CogDebug(Cog):
     def __init__(self, bot: commands.Bot):
         self.bot = bot
+        self.profiling = asyncio.Lock()
+        self.memory = MemoryTracker()
 
     @commands.is_owner()
     @commands.slash_command(name="ping", help="Ping the bot.")
@@ -75,3 +84,52 @@ class CogDebug(Cog):
                 response = repr(e)
 
         await safe_respond(ctx, response)
+
+    @commands.is_owner()
+    @commands.slash_command(name="db_stats", help="Show time spent per DB method.")
+    @option(name="dump", description="Also attach the full stats as a file.")
+    async def db_stats(self, ctx: ApplicationContext, dump: bool = False):
+        await safe_respond(ctx, format_call_stats(DB.stats))
+        if dump:
+            name = "db_stats_%s.json" % int(time.time())
+            data = dump_call_stats(DB.stats).encode()
+            await ctx.respond(file=discord.File(io.BytesIO(data), name))
+
+    @commands.is_owner()
+    @commands.slash_command(name="stalls", help="Show the worst event loop stalls.")
+    @option(name="stacks", description="How many of their stacks to show.")
+    async def stalls(self, ctx: ApplicationContext, stacks: int = 1):
+        await safe_respond(ctx, format_stalls(MONITOR.worst(), stacks))
+
+    @commands.is_owner()
+    @commands.slash_command(name="profile", help="Profile the running bot.")
+    @option(name="seconds", description="How long to profile for, up to a minute.")
+    @option(
+        name="mode",
+        description="cprofile counts calls; sample barely slows the bot.",
+        choices=["sample", "cprofile"],
+    )
+    async def profile(
+        self,
+        ctx: ApplicationContext,
+        seconds: int = 10,
+        mode: str = "sample",
+    ):
+        if self.profiling.locked():
+            await ctx.respond("Already profiling.")
+            return
+        await ctx.defer()
+        async with self.profiling:
+            report = await profile_loop(seconds, cast(ProfileMode, mode))
+        name = "profile_%s_%s.txt" % (mode, int(time.time()))
+        await ctx.respond(file=discord.File(io.BytesIO(report.encode()), name))
+
+    @commands.is_owner()
+    @commands.slash_command(name="memory", help="Diff tracemalloc snapshots.")
+    @option(
+        name="action",
+        description="diff compares with the last snapshot.",
+        choices=["start", "diff", "stop"],
+    )
+    async def memory(self, ctx: ApplicationContext, action: str = "diff"):
+        await safe_respond(ctx, getattr(self.memory, action)())
@@ -1,5 +1,12 @@
+# STL
+import time
+import asyncio
+from datetime import UTC, datetime
+from collections import Counter, deque
+
 # PDM
-from discord.ext import commands
+import discord
+from discord.ext import tasks, commands
 from discord.guild import Guild
 from discord.channel import TextChannel
 from discord.ext.commands import Cog, slash_command
@@ -8,6 +15,10 @@ from discord.commands.context import ApplicationContext
 # LOCAL
 from tenpo.__main__ import DB
 from tenpo.log_utils import getLogger
+from tenpo.event_utils import EventOp, DesiredEvent, plan_events, format_event_ops
+from tenpo.phase_utils import PhaseTimer
+from tenpo.timer_utils import MultiTimer
+from tenpo.croniter_utils import EventTimer
 
 LOG = getLogger()
 
@@ -27,55 +38,220 @@ DESCRIPTIONS = {
     "none": NON_MOON_DESC,
 }
 
+EVENT_LIMIT = 3
+RECONCILE_MINUTES = 30
+EVENT_CONCURRENCY = 4
+# event writes allowed per guild per window; the rest wait for the next pass
+EVENT_BUDGET = 5
+EVENT_WINDOW = 10 * 60
+
 
 class CogEvents(Cog):
     def __init__(self, bot):
         self.bot = bot
+        # guild id -> when we lately wrote one of its events
+        self.writes: dict[int, deque[float]] = {}
+        self.limit = asyncio.Semaphore(EVENT_CONCURRENCY)
+        self.outcomes: Counter[str] = Counter()
+        DB.schedule.subscribe(self.on_window)
+        _ = self.reconcile.start()
 
     @slash_command(name="setup_events")
     @commands.has_permissions(manage_channels=True)
-    async def slash_setup(self, ctx: ApplicationContext, limit: int = 3):
-        await setup_events(ctx, limit)
-        await ctx.respond(content="Set up events!", ephemeral=True)
+    async def slash_setup(
+        self,
+        ctx: ApplicationContext,
+        limit: int = EVENT_LIMIT,
+        dry_run: bool = False,
+        stop: bool = False,
+    ):
+        guild = ctx.guild
+        assert guild
+        if stop:
+            await DB.set_events(guild.id, False)
+            await ctx.respond(content="mi pali ala e tenpo kama.", ephemeral=True)
+            return
+        await ctx.defer(ephemeral=True)
+        if not dry_run:
+            await DB.set_events(guild.id, True)
+        ops = await self.reconcile_guild(guild, limit, dry_run=dry_run)
+        report = format_event_ops(ops)
+        if dry_run:
+            report = "mi ante ala. mi pali la mi pali e ni:\n" + report
+        await ctx.respond(content=report, ephemeral=True)
 
+    async def on_window(self, eid: int, active: bool):
+        """
+        Once a window opens, its event is the one running now; top up the
+        upcoming ones for guilds which use events at all.
+        """
+        if not active or not (guild := self.bot.get_guild(eid)):
+            return
+        if not await uses_events(guild):
+            return
+        try:
+            _ = await self.reconcile_guild(guild)
+        except Exception as e:
+            LOG.error("Couldn't top up events for guild %s: %s", eid, e)
 
-async def setup_events(ctx: ApplicationContext, limit: int = 3):
-    # TODO: this should be a repeating event that checks the server for set configuration
-    guild: Guild = ctx.guild
+    def take_budget(self, guild_id: int) -> bool:
+        """Spend one of the guild's event writes, if it has one left this window."""
+        now = time.monotonic()
+        recent = self.writes.setdefault(guild_id, deque())
+        while recent and now - recent[0] > EVENT_WINDOW:
+            _ = recent.popleft()
+        if len(recent) >= EVENT_BUDGET:
+            return False
+        recent.append(now)
+        return True
 
-    starts = [
-        (event.name, int(event.start_time.timestamp()))
-        for event in guild.scheduled_events
-        if event.start_time
-    ]
+    async def apply(self, guild: Guild, op: EventOp) -> str:
+        if not self.take_budget(guild.id):
+            return "deferred"
+        try:
+            async with self.limit:
+                if op.kind == "delete":
+                    await op.event.delete()
+                elif op.kind == "update":
+                    assert op.desired
+                    _ = await op.event.edit(
+                        description=op.desired.description,
+                        start_time=op.desired.start,
+                        end_time=op.desired.end,
+                    )
+                else:
+                    assert op.desired
+                    LOG.info(
+                        "Making event from %s to %s", op.desired.start, op.desired.end
+                    )
+                    _ = await guild.create_scheduled_event(
+                        name=NAME,
+                        location=guild.name,
+                        description=op.desired.description,
+                        start_time=op.desired.start,
+                        end_time=op.desired.end,
+                    )
+            return op.kind
+        except discord.errors.NotFound:
+            return "gone"  # deleted under us; the next pass re-plans
+        except discord.errors.Forbidden:
+            LOG.warning("Events may not be managed in guild %s", guild.id)
+        except discord.errors.HTTPException as e:
+            if e.status == 429:
+                LOG.warning("Rate limited managing events of guild %s", guild.id)
+                return "rate_limited"
+            LOG.error("Got HTTPException while managing events! %s", e)
+            LOG.error("Occurred in guild %s doing %s", guild.id, op.kind)
+        return "failed"
+
+    async def reconcile_guild(
+        self,
+        guild: Guild,
+        limit: int = EVENT_LIMIT,
+        dry_run: bool = False,
+    ) -> list[EventOp]:
+        """
+        Bring the guild's upcoming events in line with its next `limit`
+        windows, changing only what differs. Returns what was planned.
+        """
+        now = datetime.now(UTC)
+        desired = await get_desired_events(guild.id, limit, now)
+        if desired is None:
+            return []
+        # without the scheduled_events intent the guild's cache never learns of
+        # our own writes, so it would plan the same creates on every pass
+        existing = await guild.fetch_scheduled_events()
+        ops = plan_events(NAME, existing, desired, now)
+        if ops and not dry_run:
+            outcomes = await asyncio.gather(*(self.apply(guild, op) for op in ops))
+            self.outcomes.update(outcomes)
+        return ops
+
+    @tasks.loop(minutes=RECONCILE_MINUTES)
+    async def reconcile(self):
+        timed = set(await DB.get_timed())
+        guilds = [
+            guild
+            for guild in self.bot.guilds
+            if guild.id in timed and await uses_events(guild)
+        ]
+        before = self.outcomes.copy()
+        results = await asyncio.gather(
+            *(self.reconcile_guild(guild) for guild in guilds),
+            return_exceptions=True,
+        )
+        for guild, result in zip(guilds, results):
+            if isinstance(result, Exception):
+                LOG.error("Couldn't reconcile events of guild %s: %s", guild.id, result)
+        LOG.info(
+            "Reconciled events of %s guilds: %s",
+            len(guilds),
+            dict(self.outcomes - before),
+        )
+
+    @reconcile.before_loop
+    async def before_reconcile(self):
+        await self.bot.wait_until_ready()
 
-    method = await DB.get_timing(guild.id)
+
+async def uses_events(guild: Guild) -> bool:
+    """Guilds opt in by running `/setup_events` once, and out with `stop`."""
+    if (wanted := await DB.get_events(guild.id)) is not None:
+        return wanted
+    # opted in before it was stored, if one of our events is still around;
+    # stored either way, so each guild is only fetched once
+    try:
+        events = await guild.fetch_scheduled_events()
+    except discord.errors.HTTPException as e:
+        LOG.warning("Couldn't fetch events of guild %s: %s", guild.id, e)
+        return False
+    wanted = any(event.name == NAME for event in events)
+    await DB.set_events(guild.id, wanted)
+    return wanted
+
+
+async def get_desired_events(
+    guild_id: int,
+    limit: int,
+    now: datetime,
+) -> list[DesiredEvent] | None:
+    """
+    The guild's window open at `now`, if any, then its next `limit` windows,
+    as events; or None if it isn't timed. The open window is only there to
+    claim the event which is starting, so it isn't mistaken for a stray.
+    """
+    method = await DB.get_timing(guild_id)
     if method == "mun":
-        timer = await DB.get_moon_timer(guild.id)
-    elif method == "wile":
-        timer = await DB.get_event_timer(guild.id)
+        timer = await DB.get_moon_timer(guild_id)
+        desired = [
+            DesiredEvent(start, end, DESCRIPTIONS[timer.get_phase(now) or "none"])
+            for start, end in open_window(timer, now)
+        ]
+        # one search yields the phase alongside each event
+        return desired + [
+            DesiredEvent(start, end, DESCRIPTIONS[phase])
+            for start, end, phase in timer.get_phases_from(limit, now)
+        ]
+
+    if method == "wile":
+        timer = await DB.get_event_timer(guild_id)
+    elif method == "mute":
+        # one event per merged window, however many schedules overlap in it
+        timer = await DB.get_multi_timer(guild_id)
+        if not timer:
+            return None
     else:
-        return False
+        return None
+    return [
+        DesiredEvent(start, end, DESCRIPTIONS["none"])
+        for start, end in open_window(timer, now)
+        + list(timer.get_events_from(limit, now))
+    ]
 
-    for start, end in timer.get_events_from():
-        LOG.info("Making event from %s to %s", start, end)
-
-        description = DESCRIPTIONS["none"]
-        if method == "mun":
-            phase = timer.get_phase(ref=start)
-            assert phase
-            description = DESCRIPTIONS[phase]
-
-        if (NAME, int(start.timestamp())) in starts:
-            LOG.warning("Event already scheduled. Not re-creating!")
-            continue
-
-        event = await guild.create_scheduled_event(
-            name=NAME,
-            location=guild.name,
-            description=description,
-            start_time=start,
-            end_time=end,
-        )
 
-    return True
+def open_window(
+    timer: EventTimer | PhaseTimer | MultiTimer,
+    now: datetime,
+) -> list[tuple[datetime, datetime]]:
+    start, end = timer.get_prev_range(now)
+    return [(start, end)] if start <= now < end else []
@@ -0,0 +1,6 @@
+# LOCAL
+from .cog import CogMetrics
+
+
+def setup(bot):
+    bot.add_cog(CogMetrics(bot))
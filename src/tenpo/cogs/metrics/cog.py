@@ -0,0 +1,91 @@
+# STL
+import time
+import asyncio
+
+# PDM
+from discord import Bot, Cog
+from discord.ext import tasks
+from discord.errors import HTTPException
+
+# LOCAL
+from tenpo.__main__ import DB, METRICS_PORT
+from tenpo.lag_utils import MONITOR
+from tenpo.log_utils import getLogger
+from tenpo.metrics_utils import METRICS, serve_metrics, render_call_stats
+
+LOG = getLogger()
+
+DISCORD_REQUESTS = METRICS.counter(
+    "tenpo_discord_requests_total",
+    "Discord API requests by method, route and outcome.",
+    ("method", "route", "outcome"),
+)
+DISCORD_SECONDS = METRICS.histogram(
+    "tenpo_discord_request_seconds",
+    "Discord API request latency by method and route, rate limits included.",
+    ("method", "route"),
+)
+
+
+def instrument_http(http):
+    """Count and time every request `http` makes, by its unformatted route."""
+    request = http.request
+
+    async def timed_request(route, **kwargs):
+        start = time.perf_counter()
+        outcome = "ok"
+        try:
+            return await request(route, **kwargs)
+        except HTTPException as e:
+            outcome = str(e.status)
+            raise
+        except BaseException:
+            outcome = "error"
+            raise
+        finally:
+            _ = DISCORD_SECONDS.labels(route.method, route.path).observe_since(start)
+            DISCORD_REQUESTS.labels(route.method, route.path, outcome).inc()
+
+    http.request = timed_request
+
+
+class CogMetrics(Cog):
+    """Records what the rest of the bot doesn't, and serves it all if asked."""
+
+    def __init__(self, bot: Bot):
+        super().__init__()
+        self.bot: Bot = bot
+        instrument_http(bot.http)
+        METRICS.gauge(
+            "tenpo_schedule_windows", "Event windows tracked by the schedule."
+        ).labels().track(lambda: len(DB.schedule))
+        METRICS.gauge("tenpo_tasks", "Tasks on the event loop.").labels().track(
+            lambda: len(asyncio.all_tasks(bot.loop))
+        )
+        METRICS.collect(lambda: render_call_stats(DB.stats, "tenpo_db"))
+        _ = self.watch_lag.start()
+        if not METRICS_PORT:
+            LOG.info("METRICS_PORT unset; not serving metrics")
+            return
+        _ = self.serve.start()
+
+    def cog_unload(self):
+        MONITOR.stop()
+
+    @tasks.loop(seconds=1)
+    async def watch_lag(self):
+        # only returns if something went wrong; the loop restarts it
+        try:
+            await MONITOR.run()
+        except Exception as e:
+            LOG.error("Lag monitor stopped! %s", e)
+
+    @tasks.loop(minutes=1)
+    async def serve(self):
+        # only returns if something went wrong; the loop restarts it
+        try:
+            server = await serve_metrics(METRICS, METRICS_PORT)
+            async with server:
+                await server.serve_forever()
+        except Exception as e:
+            LOG.error("Metrics server stopped! %s", e)
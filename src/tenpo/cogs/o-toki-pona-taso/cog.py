@@ -1,5 +1,6 @@
 # STL
 import io
+import time
 import random
 from typing import Any, Optional, cast
 from datetime import UTC, datetime, timedelta
@@ -13,10 +14,29 @@ from discord.reaction import Reaction
 from discord.ext.commands import Cog
 
 # LOCAL
-from tenpo.__main__ import DB
+from tenpo.__main__ import (
+    DB,
+    INGRESS_SIZE,
+    CLASSIFY_SIZE,
+    INGRESS_POLICY,
+    POLICY_WORKERS,
+    CLASSIFY_WORKERS,
+    RESPONSE_BACKLOG,
+    RESPONSE_WORKERS,
+    RESPONSE_GUILD_CAP,
+)
 from tenpo.log_utils import getLogger
 from tenpo.str_utils import prep_msg_for_resend
 from tenpo.chat_utils import send_delete_dm, send_react_error_dm
+from tenpo.queue_utils import (
+    STAGE_BUSY,
+    ShedQueue,
+    ShedPolicy,
+    StageQueue,
+    WorkerPool,
+    FairScheduler,
+)
+from tenpo.metrics_utils import METRICS
 from tenpo.toki_pona_utils import is_toki_pona
 
 LOG = getLogger()
@@ -33,6 +53,39 @@ ALLOWED_MESSAGE_TYPES = {
 
 MAX_AGE = timedelta(minutes=15)
 
+# under the "priority" shedding policy, reacts are shed before deletes
+RESPONSE_PRIORITY = {
+    "sitelen": 0,
+    "sitelen lili": 0,
+    "weka": 1,
+    "len": 1,
+}
+# Discord calls per response; a guild's turn covers the costliest
+RESPONSE_COST = {
+    "sitelen": 1,
+    "sitelen lili": 1,
+    "weka": 1,
+    "len": 2,
+}
+
+STAGE_SECONDS = METRICS.histogram(
+    "tenpo_message_stage_seconds", "Time in each stage of on_message.", ("stage",)
+)
+PRECONDITIONS_SECONDS = STAGE_SECONDS.labels("preconditions")
+GUILD_POLICY_SECONDS = STAGE_SECONDS.labels("guild_policy")
+USER_POLICY_SECONDS = STAGE_SECONDS.labels("user_policy")
+CLASSIFY_SECONDS = STAGE_SECONDS.labels("classify")
+RESPOND_SECONDS = STAGE_SECONDS.labels("respond")
+VERDICTS = METRICS.counter(
+    "tenpo_messages_total", "Messages seen, by verdict.", ("verdict",)
+)
+RESPONDED = VERDICTS.labels("respond")
+IGNORED = VERDICTS.labels("ignore")
+RESPONSES = METRICS.counter(
+    "tenpo_responses_total", "Responses made, by type.", ("response",)
+)
+FILTER_BUSY = STAGE_BUSY.labels("filter")
+
 
 def user_has_role(user: Member, role: int) -> bool:
     return not not user.get_role(role)
@@ -41,14 +94,84 @@ def user_has_role(user: Member, role: int) -> bool:
 
 
 class CogOTokiPonaTaso(Cog):
+    """
+    Messages go through four stages, each with its own workers:
+    filter (the listener) -> ingress -> policy -> classify -> act.
+    Only ingress sheds; the classify queue holds policy back when full.
+    """
+
     def __init__(self, bot: Bot):
         self.bot: Bot = bot
         super().__init__()
+        # a raid fills this instead of piling up tasks holding sessions and calls
+        self.ingress: ShedQueue[Message] = ShedQueue(
+            "ingress",
+            INGRESS_SIZE,
+            cast(ShedPolicy, INGRESS_POLICY),
+            max_age=MAX_AGE.total_seconds(),
+            priorities=len(set(RESPONSE_PRIORITY.values())),
+        )
+        self.policy = WorkerPool(
+            self.ingress, self.check_policy, POLICY_WORKERS, stage="policy"
+        )
+        self.candidates: StageQueue[tuple[Message, set[bool]]] = StageQueue(
+            "classify", CLASSIFY_SIZE
+        )
+        self.classify = WorkerPool(
+            self.candidates, self.classify_message, CLASSIFY_WORKERS
+        )
+        # a guild's spike waits its turns, so other guilds' responses don't
+        self.responses: FairScheduler[int, Message] = FairScheduler(
+            "responses",
+            timed_respond,
+            RESPONSE_WORKERS,
+            per_key=RESPONSE_GUILD_CAP,
+            maxsize=RESPONSE_BACKLOG,
+            quantum=max(RESPONSE_COST.values()),
+            stage="act",
+        )
+        for stage in (self.policy, self.classify, self.responses):
+            stage.start(bot.loop)
+
+    def cog_unload(self):
+        for stage in (self.policy, self.classify, self.responses):
+            stage.stop()
+
+    async def check_policy(self, message: Message):
+        if not (spoilers := await applicable_spoilers(message)):
+            IGNORED.inc()
+            return
+        await self.candidates.put((message, spoilers))
+
+    async def classify_message(self, candidate: tuple[Message, set[bool]]):
+        message, spoilers = candidate
+        if not is_bad(message.content, spoilers):
+            IGNORED.inc()
+            return
+        RESPONDED.inc()
+        await self.queue_response(message)
+
+    async def queue_response(self, message: Message):
+        assert message.guild
+        response_type = await DB.get_response(message.author.id)
+        self.responses.submit(message.guild.id, message, RESPONSE_COST[response_type])
 
     @commands.Cog.listener("on_message")
     async def o_toki_pona_taso(self, message: Message):
-        if await should_respond(message):
-            await respond(message)
+        start = time.perf_counter()
+        try:
+            if not await timed_preconditions(message):
+                IGNORED.inc()
+                return
+            priority = 0
+            # cached only: a query per new author here is the pile-up the queue
+            # is for; a miss gets the default response's priority
+            if self.ingress.policy == "priority":
+                response = DB.peek_response(message.author.id)
+                priority = RESPONSE_PRIORITY[response] if response else 0
+            _ = self.ingress.put(message, message.created_at.timestamp(), priority)
+        finally:
+            _ = FILTER_BUSY.observe_since(start)
 
     @commands.Cog.listener("on_message_edit")
     async def toki_li_ante_la(self, before: Message, after: Message):
@@ -63,13 +186,26 @@ class CogOTokiPonaTaso(Cog):
         if resp_before == resp_after:
             return
         if not resp_before and resp_after:
-            await respond(after)
+            await self.queue_response(after)
             return
         if resp_before and not resp_after:
             assert self.bot.user  # asserts we are actually logged in...
             await after.remove_reaction(react, self.bot.user)
 
 
+async def timed_preconditions(message: Message) -> bool:
+    start = time.perf_counter()
+    ok = await preconditions(message)
+    _ = PRECONDITIONS_SECONDS.observe_since(start)
+    return ok
+
+
+async def timed_respond(message: Message):
+    start = time.perf_counter()
+    await respond(message)
+    _ = RESPOND_SECONDS.observe_since(start)
+
+
 async def preconditions(message: Message) -> bool:
     """
     Determine if a message is worth checking.
@@ -173,22 +309,38 @@ async def should_check_guild(message: Message) -> bool:
     return True
 
 
-async def should_respond(message: Message) -> bool:
-    if not await preconditions(message):
-        # LOG.debug("Ignoring message; preconditions failed")
-        return False
-
+async def applicable_spoilers(message: Message) -> set[bool]:
+    """
+    The spoiler setting of each of the guild and the author whose rules
+    apply to the message; empty if neither's do. Both are checked, since
+    classifying comes after; a shared setting is classified once.
+    """
+    assert message.guild
+    spoilers: set[bool] = set()
+    start = time.perf_counter()
     if await should_check_guild(message):
-        spoilers = await DB.get_spoilers(message.guild.id)
-        if not is_toki_pona(message.content, spoilers=spoilers):
-            return True
-
+        spoilers.add(await DB.get_spoilers(message.guild.id))
+    start = GUILD_POLICY_SECONDS.observe_since(start)
     if await should_check_user(message):
-        spoilers = await DB.get_spoilers(message.author.id)
-        if not is_toki_pona(message.content, spoilers=spoilers):
-            return True
+        spoilers.add(await DB.get_spoilers(message.author.id))
+    _ = USER_POLICY_SECONDS.observe_since(start)
+    return spoilers
+
+
+def is_bad(content: str, spoilers: set[bool]) -> bool:
+    """Whether the content breaks the rules under any of the spoiler settings."""
+    start = time.perf_counter()
+    bad = any(not is_toki_pona(content, spoilers=spoiler) for spoiler in spoilers)
+    _ = CLASSIFY_SECONDS.observe_since(start)
+    return bad
 
-    return False
+
+async def should_respond(message: Message) -> bool:
+    """Every stage at once, for one message."""
+    if not await timed_preconditions(message):
+        # LOG.debug("Ignoring message; preconditions failed")
+        return False
+    return is_bad(message.content, await applicable_spoilers(message))
 
 
 async def get_react(eid: int):
@@ -206,7 +358,7 @@ async def react_message(message: Message):
 
         try:
             await message.add_reaction(react)
-            LOG.debug("Reacted %s to user message" % react)
+            LOG.debug("Reacted %s to user message", react)
             return
 
         except discord.errors.Forbidden as e:
@@ -247,8 +399,8 @@ async def delete_message(message: Message, dm: bool = True):
         LOG.warning("Couldn't delete message; not found")
     except discord.errors.HTTPException as e:
         LOG.error("Couldn't delete message; reason unknown")
-        LOG.error(f"Error code: {e.code}")
-        LOG.error(f"Error text: {e.text}")
+        LOG.error("Error code: %s", e.code)
+        LOG.error("Error text: %s", e.text)
 
 
 async def resend_message(message: Message):
@@ -269,7 +421,7 @@ async def resend_message(message: Message):
             spoiler_name = f"SPOILER_{attachment.filename}"
             files.append(File(fp=io.BytesIO(data), filename=spoiler_name))
         except discord.errors.HTTPException as e:
-            LOG.error(f"Failed to fetch attachment {attachment.filename}: {e}")
+            LOG.error("Failed to fetch attachment %s: %s", attachment.filename, e)
 
     if files:
         kwargs["files"] = files
@@ -284,12 +436,13 @@ async def resend_message(message: Message):
         LOG.error("Couldn't resend message; channel is gone?")
     except discord.errors.HTTPException as e:
         LOG.error("Couldn't re-send message due to unexpected exception!")
-        LOG.error(f"Error code: {e.code}")
-        LOG.error(f"Error text: {e.text}")
+        LOG.error("Error code: %s", e.code)
+        LOG.error("Error text: %s", e.text)
 
 
 async def respond(message: Message):
     response_type = await DB.get_response(message.author.id)
+    RESPONSES.labels(response_type).inc()
     await RESPONSE_MAP[response_type](message)
 
 
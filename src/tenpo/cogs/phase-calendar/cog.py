@@ -1,5 +1,8 @@
 # STL
-from typing import cast
+import time
+import asyncio
+from typing import Literal, cast
+from collections import Counter, deque
 
 # PDM
 import discord
@@ -10,28 +13,68 @@ from discord.ext import tasks
 from tenpo.types import MessageableGuildChannel
 from tenpo.__main__ import DB
 from tenpo.log_utils import getLogger
-from tenpo.phase_utils import FACE_MAP, current_emoji
+from tenpo.phase_utils import FACE_MAP, current_emoji, moon_windows_open
 
 LOG = getLogger()
 
+CALENDAR_MINUTES = 15
+# discord allows about 2 renames of a channel per 10 minutes
+RENAME_BUDGET = 2
+RENAME_WINDOW = 10 * 60
+RENAME_CONCURRENCY = 4
+RENAME_SPREAD = 0.8  # share of the tick over which renames are spread
 
-async def get_calendar_title(eid: int) -> str:
+Outcome = Literal["skipped", "sent", "rate_limited", "failed"]
+
+
+def format_calendar_title(phase_emoji: str, in_moon_window: bool) -> str:
     # TODO: nimi li ken ante
     title = "mun tenpo"
-    phase_emoji = current_emoji()
-    timing = await DB.get_timing(eid)
-    is_event_time = await DB.is_event_time(eid)
-    if timing == "mun" and is_event_time:
+    if in_moon_window:
         phase_emoji = FACE_MAP[phase_emoji]
         title = "o toki pona taso"
-    title = f"{phase_emoji} {title}"
-    return title
+    return f"{phase_emoji} {title}"
+
+
+async def get_calendar_title(eid: int) -> str:
+    """Title for one calendar; the tick computes them in bulk instead."""
+    timing = await DB.get_timing(eid)
+    in_window = timing == "mun" and await DB.is_event_time(eid)
+    return format_calendar_title(current_emoji(), in_window)
+
+
+async def get_calendar_titles() -> dict[int, tuple[int, str]]:
+    """
+    Calendar channel and title of every entity with a calendar. The phase is
+    computed once and moon windows once per distinct (timezone, length),
+    so this costs the same for one guild as for thousands.
+    """
+    timings = await DB.get_calendar_timings()
+    phase_emoji = current_emoji()
+    moon_configs = {
+        eid: (timezone, length)
+        for eid, (_, timing, timezone, length) in timings.items()
+        if timing == "mun"
+    }
+    windows = moon_windows_open(moon_configs.values())
+
+    titles: dict[int, tuple[int, str]] = {}
+    for eid, (channel_id, *_) in timings.items():
+        in_window = eid in moon_configs and windows[moon_configs[eid]]
+        titles[eid] = (channel_id, format_calendar_title(phase_emoji, in_window))
+    return titles
 
 
 class CogPhaseCalendar(Cog):
     def __init__(self, bot: Bot):
         super().__init__()
         self.bot: Bot = bot
+        # channel id -> last title we applied, and when we renamed it lately
+        self.applied: dict[int, str] = {}
+        self.renames: dict[int, deque[float]] = {}
+        self.limit = asyncio.Semaphore(RENAME_CONCURRENCY)
+        self.outcomes: Counter[Outcome] = Counter()
+        DB.schedule.subscribe(self.on_window)
         _ = self.moon_calendar.start()
 
     async def fetch_channel(
@@ -55,42 +98,118 @@ class CogPhaseCalendar(Cog):
             _ = await channel.edit(name=title)
         except discord.errors.Forbidden:
             LOG.warning("Channel %s may not be edited", channel)
+            return False
         return True
 
-    @tasks.loop(minutes=15)
-    async def moon_calendar(self):
+    def is_current(self, channel: MessageableGuildChannel, title: str) -> bool:
+        if self.applied.get(channel.id) == title or channel.name == title:
+            self.applied[channel.id] = title
+            return True
+        return False
+
+    def take_budget(self, channel_id: int) -> bool:
+        """Spend one of the channel's renames, if it has one left this window."""
+        now = time.monotonic()
+        recent = self.renames.setdefault(channel_id, deque())
+        while recent and now - recent[0] > RENAME_WINDOW:
+            _ = recent.popleft()
+        if len(recent) >= RENAME_BUDGET:
+            return False
+        recent.append(now)
+        return True
+
+    async def on_window(self, eid: int, active: bool):
+        """Rename right away when a window opens or closes, not at the next tick."""
+        if channel_id := await DB.get_calendar(eid):
+            title = await get_calendar_title(eid)
+            self.outcomes[await self.update_calendar(eid, channel_id, title)] += 1
+
+    async def update_calendar(
+        self,
+        eid: int,
+        channel_id: int,
+        title: str,
+        delay: float = 0.0,
+    ) -> Outcome:
         channel = None
-        channel_id = None
-        moon_channels = await DB.get_calendars()
-        for eid, channel_id in moon_channels.items():
-            try:
+        try:
+            if delay:
+                await asyncio.sleep(delay)
+                # the phase may have turned, or a window opened, while we waited
                 title = await get_calendar_title(eid)
-                channel = await self.fetch_channel(eid, channel_id)
-                if not channel:
-                    continue
 
+            channel = await self.fetch_channel(eid, channel_id)
+            if not channel:
+                return "failed"
+            if self.is_current(channel, title):
+                return "skipped"
+
+            if not self.take_budget(channel_id):
+                LOG.debug("Out of renames for channel %s; retrying later", channel_id)
+                return "rate_limited"
+
+            async with self.limit:
                 result = await self.edit_channel(channel, title)
-                if result:
-                    LOG.info("Channel %s (%s) now %s", channel, channel_id, title)
-
-            except discord.errors.NotFound as e:
-                LOG.warning("Channel %s may no longer exist", channel_id)
-                await DB.set_calendar(eid, None)
-            except discord.errors.Forbidden as e:
-                LOG.warning("Channel %s is inaccessible", channel_id)
-                await DB.set_calendar(eid, None)
-            except discord.errors.HTTPException as e:
-                LOG.error("Got HTTPException while editing channel! %s", e)
-                LOG.error("Occurred on channel %s %s", channel_id, channel)
-                LOG.error("... %s", e.__dict__)
-                LOG.error("Swallowing the error in the hopes of the task surviving.")
-            except discord.errors.DiscordException as e:
-                LOG.error("Got a DiscordException while editing channel! %s", e)
-                LOG.error("Occurred on channel %s %s", channel_id, channel)
-                LOG.error("... %s", e.__dict__)
-                LOG.error("Swallowing the error in the hopes of the task surviving.")
-            except Exception as e:
-                LOG.error("Got an error while editing channel! %s", e)
-                LOG.error("Occurred on channel %s %s", channel_id, channel)
-                LOG.error("... %s", e.__dict__)
-                LOG.error("Swallowing the error in the hopes of the task surviving.")
+            if result:
+                self.applied[channel_id] = title
+                LOG.info("Channel %s (%s) now %s", channel, channel_id, title)
+                return "sent"
+
+        except discord.errors.NotFound as e:
+            LOG.warning("Channel %s may no longer exist", channel_id)
+            await DB.set_calendar(eid, None)
+        except discord.errors.Forbidden as e:
+            LOG.warning("Channel %s is inaccessible", channel_id)
+            await DB.set_calendar(eid, None)
+        except discord.errors.HTTPException as e:
+            if e.status == 429:
+                LOG.warning("Rate limited renaming channel %s", channel_id)
+                return "rate_limited"
+            LOG.error("Got HTTPException while editing channel! %s", e)
+            LOG.error("Occurred on channel %s %s", channel_id, channel)
+            LOG.error("... %s", e.__dict__)
+            LOG.error("Swallowing the error in the hopes of the task surviving.")
+        except discord.errors.DiscordException as e:
+            LOG.error("Got a DiscordException while editing channel! %s", e)
+            LOG.error("Occurred on channel %s %s", channel_id, channel)
+            LOG.error("... %s", e.__dict__)
+            LOG.error("Swallowing the error in the hopes of the task surviving.")
+        except Exception as e:
+            LOG.error("Got an error while editing channel! %s", e)
+            LOG.error("Occurred on channel %s %s", channel_id, channel)
+            LOG.error("... %s", e.__dict__)
+            LOG.error("Swallowing the error in the hopes of the task surviving.")
+        return "failed"
+
+    @tasks.loop(minutes=CALENDAR_MINUTES)
+    async def moon_calendar(self):
+        titles = await get_calendar_titles()
+        tick: Counter[Outcome] = Counter()
+        renames: list[tuple[int, int, str]] = []
+        for eid, (channel_id, title) in titles.items():
+            # only renames take a slot in the spread; cached channels already
+            # showing their title are settled here
+            channel = cast(MessageableGuildChannel, self.bot.get_channel(channel_id))
+            if channel and self.is_current(channel, title):
+                tick["skipped"] += 1
+            else:
+                renames.append((eid, channel_id, title))
+
+        # stagger the renames over the tick instead of bursting them
+        spacing = CALENDAR_MINUTES * 60 * RENAME_SPREAD / max(len(renames), 1)
+        tick.update(
+            await asyncio.gather(
+                *(
+                    self.update_calendar(eid, channel_id, title, delay=i * spacing)
+                    for i, (eid, channel_id, title) in enumerate(renames)
+                )
+            )
+        )
+        self.outcomes.update(tick)
+        LOG.info(
+            "Calendar tick: %s sent, %s skipped, %s rate limited, %s failed",
+            tick["sent"],
+            tick["skipped"],
+            tick["rate_limited"],
+            tick["failed"],
+        )
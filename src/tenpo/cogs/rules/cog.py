@@ -1,15 +1,21 @@
 # STL
 import re
+import time
+from math import inf
 from typing import Literal, cast
 from datetime import datetime, timedelta
+from zoneinfo import available_timezones
+from functools import cache
+from collections import OrderedDict
 
 # PDM
 import emoji
-from discord import Cog, Role, Guild, SlashCommandGroup, option
+from discord import Cog, Role, Guild, SlashCommandGroup, AutocompleteContext, option
 from discord.ext import commands
 from discord.commands.context import ApplicationContext
 
 # LOCAL
+from tenpo.db import Snapshot
 from tenpo.types import DiscordActor, MessageableGuildChannel
 from tenpo.__main__ import DB
 from tenpo.constants import NASIN_PI_MA_ILO, NANPA_PI_JAN_PALI
@@ -29,15 +35,18 @@ from tenpo.str_utils import (
     format_removed_role_info,
 )
 from tenpo.rules_menu import EnterRule
+from tenpo.timer_utils import get_multi_timer, get_schedule_timer
+from tenpo.metrics_utils import cache_counters
 from tenpo.croniter_utils import (
     InvalidTZ,
-    EventTimer,
     InvalidDelta,
     InvalidEventTimer,
     parse_delta,
     parse_timezone,
+    get_event_timer,
     parse_delta_safe,
 )
+from tenpo.autocomplete_utils import AutocompleteIndex
 
 LOG = getLogger()
 
@@ -46,6 +55,21 @@ SpoilerOptions = Literal["ken", "ala"]
 
 MAX_SLEEP = timedelta(days=1)
 
+# entity id -> (timing config, expiry, rendered timing blurbs)
+WINDOWS_CACHE: OrderedDict[int, tuple[tuple, float, list[str]]] = OrderedDict()
+WINDOWS_CACHE_SIZE = 1024
+WINDOWS_HIT, WINDOWS_MISS = cache_counters("windows_blurbs")
+
+
+@cache
+def get_timezone_index() -> AutocompleteIndex:
+    # listing the tz database walks the disk; wait until someone asks
+    return AutocompleteIndex(sorted(available_timezones()))
+
+
+async def autocomplete_timezone(ctx: AutocompleteContext) -> list[str]:
+    return get_timezone_index().search(ctx.value or "")
+
 
 # TODO: generate these functions
 class CogRules(Cog):
@@ -162,7 +186,7 @@ class CogRules(Cog):
     @option(
         name="nasin",
         description="mun la o open lon suno mun lon pimeja mun. wile la o kepeken tenpo wile.",
-        choices=["ale", "ala", "mun", "wile"],
+        choices=["ale", "ala", "mun", "wile", "mute"],
     )
     async def guild_set_event_timing_method(
         self,
@@ -203,6 +227,7 @@ class CogRules(Cog):
     @option(
         name="nasin_tenpo_ma",
         description="nasin tenpo ma seme? (ken: CST, UTC-6, US/Central. pana ala la UTC)",
+        autocomplete=autocomplete_timezone,
     )
     @option(
         # TODO: make optional. fetch current if missing
@@ -233,7 +258,7 @@ class CogRules(Cog):
         cron = " ".join(ale)
 
         try:
-            timer = EventTimer(cron, nasin_tenpo_ma, suli_tenpo)
+            timer = get_event_timer(cron, nasin_tenpo_ma, suli_tenpo)
         except InvalidEventTimer as e:
             await ctx.respond(
                 "%s\no lukin e ale: \n`%s` \n`%s` \n`%s`\n\nsina wile e sona pi ilo Cron la o lukin e ni: <https://crontab.guru/>"
@@ -259,6 +284,67 @@ class CogRules(Cog):
 
         await ctx.respond(resp, ephemeral=True)
 
+    @guild_rules.command(
+        name="tenpo_mute",
+        description="o pana e tenpo sin lon tenpo mute. pana sin la mi weka e ona.",
+    )
+    @commands.has_guild_permissions(manage_channels=True)
+    @option(
+        name="tenpo",
+        description="nasin Cron la tenpo seme? mun la o pana e `mun`. (ken: 0 0 * * 6, mun)",
+    )
+    @option(
+        name="nasin_tenpo_ma",
+        description="nasin tenpo ma seme? (ken: CST, UTC-6, US/Central. pana ala la UTC)",
+        autocomplete=autocomplete_timezone,
+    )
+    @option(
+        name="suli_tenpo",
+        description="tenpo o suli seme? (ken: 24h, 90m, 3d, 1mo. pana ala la 24h)",
+    )
+    async def guild_toggle_schedule(
+        self,
+        ctx: ApplicationContext,
+        tenpo: str,
+        nasin_tenpo_ma: str = "UTC",
+        suli_tenpo: str = "24h",
+    ):
+        ma = ctx.guild
+        assert ma
+
+        schedule = (" ".join(tenpo.split()), nasin_tenpo_ma, suli_tenpo)
+        try:
+            _ = get_schedule_timer(schedule)
+        except InvalidEventTimer as e:
+            await ctx.respond(
+                "%s\no lukin e ale: \n`%s` \n`%s` \n`%s`" % (e, *schedule),
+                ephemeral=True,
+            )
+            return
+
+        added = await DB.toggle_schedule(ma.id, schedule)
+        resp = "mi pana e tenpo ni: " if added else "mi weka e tenpo ni: "
+        resp += format_cron_data(*schedule)
+
+        try:
+            timer = await DB.get_multi_timer(ma.id)
+            windows = list(timer.get_events_from()) if timer else []
+        except InvalidEventTimer as e:
+            # a schedule saved before it was checked, or one gone bad since
+            schedules = await DB.get_schedules(ma.id)
+            await ctx.respond(
+                "%s\n\n%s\no lukin e ale: \n%s"
+                % (resp, e, "\n".join("`%s` `%s` `%s`" % s for s in schedules)),
+                ephemeral=True,
+            )
+            return
+        if windows:
+            resp += "\n\ntenpo ale la tenpo kama li ni: \n"
+            resp += format_date_ranges(windows)
+        if await DB.get_timing(ma.id) != "mute":
+            resp += "\no kepeken e ona kepeken `/lawa_ma nasin_tenpo mute`"
+        await ctx.respond(resp, ephemeral=True)
+
     @guild_rules.command(
         name="suli_tenpo",
         description="tenpo pi toki pona taso o suli seme?",
@@ -295,6 +381,7 @@ class CogRules(Cog):
     @option(
         name="nasin_tenpo_ma",
         description="nasin tenpo ma seme? (ken: CST, UTC-6, US/Central)",
+        autocomplete=autocomplete_timezone,
     )
     async def guild_set_timezone(
         self,
@@ -531,85 +618,115 @@ async def cmd_set_disabled(
 
 
 # TODO: for following two funcs, better division of user|guild behavior?
+def render_windows(snapshot: Snapshot) -> tuple[list[str], float]:
+    """
+    The timing blurbs of `/lawa_ma seme`: each schedule and its upcoming
+    windows. Also returns when they go stale, which is when the first
+    listed window opens.
+    """
+    timing = snapshot["timing"]
+    timezone, length = snapshot["timezone"], snapshot["length"]
+    if timing == "wile":
+        described = format_cron_data(snapshot["cron"], timezone, length)
+        schedules = [(snapshot["cron"], timezone, length)]
+    elif timing == "mun":
+        described = format_cron_data("mun", timezone, length)
+        schedules = [("mun", timezone, length)]
+    elif timing == "mute" and snapshot["schedules"]:
+        described = "\n".join(format_cron_data(*s) for s in snapshot["schedules"])
+        schedules = snapshot["schedules"]
+    else:
+        return [], inf
+
+    try:
+        if len(schedules) == 1:
+            timer = get_schedule_timer(schedules[0])
+        else:
+            timer = get_multi_timer(schedules)
+        windows = list(timer.get_events_from())
+    except InvalidEventTimer as e:
+        return [described, str(e)], inf
+    return [described + "\n" + format_date_ranges(windows)], windows[0][0].timestamp()
+
+
+def get_windows_blurbs(eid: int, snapshot: Snapshot) -> list[str]:
+    """`render_windows`, cached per entity until its timing or the windows change."""
+    key = (
+        snapshot["timing"],
+        snapshot["cron"],
+        snapshot["timezone"],
+        snapshot["length"],
+        tuple(snapshot["schedules"]),
+    )
+    cached = WINDOWS_CACHE.get(eid)
+    if cached and cached[0] == key and time.time() < cached[1]:
+        WINDOWS_CACHE.move_to_end(eid)
+        WINDOWS_HIT.inc()
+        return cached[2]
+
+    WINDOWS_MISS.inc()
+    blurbs, expires = render_windows(snapshot)
+    WINDOWS_CACHE[eid] = (key, expires, blurbs)
+    if len(WINDOWS_CACHE) > WINDOWS_CACHE_SIZE:
+        _ = WINDOWS_CACHE.popitem(last=False)
+    return blurbs
+
+
 async def cmd_list_rules(ctx: ApplicationContext, actor: DiscordActor, ephemeral: bool):
     # TODO: order is controlled by guild/user distinction which is bad.
     guild = ctx.guild
     assert guild
     user = ctx.user
     assert user
+    # the timers below may take longer than the interaction allows to answer
+    await ctx.defer(ephemeral=ephemeral)
 
     is_guild = isinstance(actor, Guild)
     prefix = "/lawa"
     if is_guild:
         prefix = "/lawa_ma"
 
+    snapshot = await DB.get_snapshot(actor.id)
     blurbs: list[str] = []
 
-    disabled = await DB.get_disabled(actor.id)
-    if disabled:
+    if snapshot["disabled"]:
         disabled_info = f"**wile sina la mi lukin ala e toki.** sina wile e lukin la o kepeken `{prefix} lukin`."
         blurbs.append(disabled_info)
 
-    sleeping = await DB.is_sleeping(actor.id)
-    if sleeping:
-        sleep_to = await DB.get_sleep(actor.id)
+    sleep_to = snapshot["sleep"]
+    if datetime.now().timestamp() < sleep_to:
         sleeping_info = f"**mi lape tawa tenpo {format_timestamp(sleep_to)} la mi lukin ala e toki.** sina wile ante e ni la o kepeken `{prefix} lape`"
         blurbs.append(sleeping_info)
 
     # TODO: sort by guild -> category -> channel considering ownership...
-    rules, exceptions = await DB.list_rules(actor.id)
-    rules_info = format_rules_exceptions(rules, exceptions)
+    rules_info = format_rules_exceptions(snapshot["rules"], snapshot["exceptions"])
     if not rules_info:
         rules_info = f"**lawa lukin li lon ala** la mi lukin ala e toki sina.\no pana e lawa kepeken `{prefix} sin`"
 
     blurbs.append(rules_info)
 
     if not is_guild:
-        response = await DB.get_response(actor.id)
+        response = snapshot["response"]
 
         if response.startswith("sitelen"):
-            reacts = await DB.get_reacts(actor.id)
-            reacts_info = format_response(response, reacts)
+            reacts_info = format_response(response, snapshot["reacts"])
             blurbs.append(reacts_info)
         else:
             blurbs.append(f"sina toki pona ala la mi **{response}** e toki sina")
 
-        opens = await DB.get_opens(actor.id)
-        if opens:
+        if opens := snapshot["opens"]:
             opens_info = format_opens_user(opens)
             blurbs.append(opens_info)
 
     if is_guild:
-        role_id = await DB.get_role(actor.id)
+        role_id = snapshot["role"]
         if role_id and (role := guild.get_role(role_id)):
             # safety check in case configured role is deleted
             role_info = format_role_info(role.id)
             blurbs.append(role_info)
 
-        timing = await DB.get_timing(actor.id)
-        blurbs.append("nasin tenpo ma li " + format_timing_data(timing))
-
-        method = await DB.get_timing(actor.id)
-        cron = await DB.get_cron(actor.id)
-        timezone = await DB.get_timezone(actor.id)
-        length = await DB.get_length(actor.id)
-        if cron and timezone and length and method == "wile":
-            try:
-                timer = await DB.get_event_timer(actor.id)
-                ranges = format_date_ranges([t for t in timer.get_events_from()])
-                blurbs.append(format_cron_data(cron, timezone, length) + "\n" + ranges)
-            except InvalidEventTimer as e:
-                blurbs.append(format_cron_data(cron, timezone, length))
-                blurbs.append(str(e))
-
-        if timezone and length and method == "mun":
-            try:
-                timer = await DB.get_moon_timer(actor.id)
-                ranges = format_date_ranges([t for t in timer.get_events_from()])
-                blurbs.append(format_cron_data("mun", timezone, length) + "\n" + ranges)
-            except InvalidEventTimer as e:
-                blurbs.append(format_cron_data("mun", timezone, length))
-                blurbs.append(str(e))
+        blurbs.append("nasin tenpo ma li " + format_timing_data(snapshot["timing"]))
+        blurbs.extend(get_windows_blurbs(actor.id, snapshot))
 
     result = "\n\n".join(blurbs)  # TODO: best order?
     await ctx.respond(result, ephemeral=ephemeral)
@@ -671,14 +788,18 @@ mi __ilo pi toki pona taso__ li pona e toki {ref}! o lukin e ken mi:
 
     lawa_tenpo = f"""
 ### lawa tenpo
-- `{prefix} nasin_tenpo [ale|ala|mun|wile]`: o lukin e toki ma lon nasin tenpo.
+- `{prefix} nasin_tenpo [ale|ala|mun|wile|mute]`: o lukin e toki ma lon nasin tenpo.
   - {format_timing_data('ale')}
   - {format_timing_data('ala')}
   - {format_timing_data('mun')}
   - {format_timing_data('wile')}
+  - {format_timing_data('mute')}
 - `{prefix} tenpo [ijo mute]`: nasin Cron la mi lukin e toki {ref} lon tenpo. <https://crontab.guru/>
   - sina pana ala e `nasin_tenpo` la mi kepeken nasin tenpo `UTC`.
   - sina pana ala e `suli_tenpo` la mi kepeken suli tenpo `24h`
+- `{prefix} tenpo_mute [tenpo]`: o pana e tenpo Cron anu `mun` lon nasin tenpo `mute`.
+  - tenpo li lon insa tenpo ante la mi wan e ona.
+  - sina pana sin e tenpo sama la mi weka e ona.
 - `{prefix} suli_tenpo [suli_tenpo]`: tenpo pi toki pona taso o suli seme?
 - `{prefix} nasin_tenpo_ma [nasin_tenpo_ma]`: mi kepeken nasin tenpo pi ma seme?"""
 
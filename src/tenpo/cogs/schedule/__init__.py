@@ -0,0 +1,6 @@
+# LOCAL
+from .cog import CogSchedule
+
+
+def setup(bot):
+    bot.add_cog(CogSchedule(bot))
@@ -0,0 +1,36 @@
+# PDM
+from discord import Bot, Cog
+from discord.ext import tasks
+
+# LOCAL
+from tenpo.__main__ import DB
+from tenpo.log_utils import getLogger
+
+LOG = getLogger()
+
+
+class CogSchedule(Cog):
+    """Drives `DB.schedule`, so event windows flip exactly on time."""
+
+    def __init__(self, bot: Bot):
+        super().__init__()
+        self.bot: Bot = bot
+        _ = self.run_schedule.start()
+
+    async def seed(self):
+        for eid in await DB.get_timed():
+            try:
+                _ = await DB.is_event_time(eid)
+            except Exception as e:
+                LOG.warning("Couldn't resolve event window for %s: %s", eid, e)
+        LOG.info("Tracking event windows of %s entities", len(DB.schedule))
+
+    @tasks.loop(minutes=1)
+    async def run_schedule(self):
+        # only returns if something went wrong; the loop restarts it
+        try:
+            await self.seed()
+            await DB.schedule.run(DB.resolve_window)
+        except Exception as e:
+            LOG.error("Schedule stopped! %s", e)
+            LOG.error("Swallowing the error in the hopes of the task surviving.")
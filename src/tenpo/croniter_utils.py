@@ -1,6 +1,8 @@
 # STL
+from bisect import bisect_left, bisect_right
 from typing import Tuple, Union, Generator, cast
 from datetime import datetime, timedelta
+from functools import lru_cache
 
 # PDM
 from croniter import croniter
@@ -9,11 +11,18 @@ from pytimeparse import parse as timeparse
 
 # LOCAL
 from tenpo.log_utils import getLogger
+from tenpo.metrics_utils import track_lru_cache
 
 ValidTZ = tzlocal | tzfile | tzstr
 
 LOG = getLogger()
 
+# distinct (cron, timezone, length) configs kept parsed
+TIMER_CACHE_SIZE = 1024
+# how far ahead shared timers expand their cron, and the most they keep
+OCCURRENCE_HORIZON = timedelta(days=90)
+MAX_OCCURRENCES = 2_000
+
 
 class InvalidEventTimer(Exception):
     def __init__(self, *args: object) -> None:
@@ -86,33 +95,96 @@ def parse_cron(cron_str: str, tz: ValidTZ) -> croniter:
     return croniter(cron_str, datetime.now(tz))
 
 
+class OccurrenceTable:
+    """
+    A cron expanded into the sorted epoch seconds of its occurrences, from the
+    last one before a reference time to `horizon` after it. Queries inside
+    that span are a bisect; one outside it re-expands around the new ref.
+    """
+
+    def __init__(self, cron_str: str, tz: ValidTZ, horizon: timedelta):
+        self.__cron_str = cron_str
+        self.__tz = tz
+        self.__horizon = horizon
+        self.__starts: list[float] = []
+
+    def __expand(self, ref: datetime):
+        cron = croniter(self.__cron_str, ref)
+        # step on from the prev, not `ref`, which may itself be an occurrence
+        starts = [cast(float, cron.get_prev(float))]
+        until = (ref + self.__horizon).timestamp()
+        # the first one past the horizon too, so `get_next` near its end works
+        while starts[-1] <= until and len(starts) < MAX_OCCURRENCES:
+            starts.append(cast(float, cron.get_next(float)))
+        self.__starts = starts
+        LOG.debug("Expanded `%s` to %s occurrences", self.__cron_str, len(starts))
+
+    def __to_datetime(self, ts: float) -> datetime:
+        return datetime.fromtimestamp(ts, tz=self.__tz)
+
+    def get_prev(self, ref: datetime) -> datetime:
+        """The last occurrence strictly before `ref`, as croniter has it."""
+        ts = ref.timestamp()
+        i = bisect_left(self.__starts, ts)
+        if i == 0 or i == len(self.__starts):
+            self.__expand(ref)
+            i = bisect_left(self.__starts, ts)
+        return self.__to_datetime(self.__starts[i - 1])
+
+    def get_next(self, ref: datetime) -> datetime:
+        """The first occurrence strictly after `ref`."""
+        ts = ref.timestamp()
+        i = bisect_right(self.__starts, ts)
+        if i == 0 or i == len(self.__starts):
+            self.__expand(ref)
+            i = bisect_right(self.__starts, ts)
+        return self.__to_datetime(self.__starts[i])
+
+
 class EventTimer:
+    """
+    Start and end of a cron-scheduled event. The croniter is only ever asked
+    about an explicit reference time, so one timer is safe to share between
+    callers; see `get_event_timer`.
+    """
+
     __tz: ValidTZ
     __cron: croniter
     __delta: timedelta
+    __table: OccurrenceTable | None
 
-    def __init__(self, cron_str: str, tz_str: str, delta_str: str):
+    def __init__(
+        self,
+        cron_str: str,
+        tz_str: str,
+        delta_str: str,
+        horizon: timedelta | None = None,
+    ):
         self.__tz = parse_timezone(tz_str)
         self.__cron = parse_cron(cron_str, self.__tz)
         self.__delta = parse_delta(delta_str)
+        self.__table = None
+        if horizon:
+            self.__table = OccurrenceTable(cron_str, self.__tz, horizon)
 
-    def __normalize_to_now(self) -> datetime:
-        """
-        Set current croniter to use `datetime.now` with the configured timezone.
-        Return the created datetime.
-        """
-        now = datetime.now(tz=self.__tz)
-        self.__cron.set_current(start_time=now)
-        return now
+    def __ref(self, ref: datetime | None) -> datetime:
+        """`ref`, or now, in the configured timezone; croniter follows its tz."""
+        if not ref:
+            return datetime.now(tz=self.__tz)
+        if ref.tzinfo is not None and ref.tzinfo is not self.__tz:
+            return ref.astimezone(self.__tz)
+        return ref
 
     def get_prev(self, ref: datetime | None = None) -> datetime:
-        if not ref:
-            ref = self.__normalize_to_now()
+        ref = self.__ref(ref)
+        if self.__table:
+            return self.__table.get_prev(ref)
         return self.__cron.get_prev(datetime, ref)
 
     def get_next(self, ref: datetime | None = None) -> datetime:
-        if not ref:
-            ref = self.__normalize_to_now()
+        ref = self.__ref(ref)
+        if self.__table:
+            return self.__table.get_next(ref)
         # it incorrectly claims to return a float...
         return cast(datetime, cast(object, self.__cron.get_next(datetime, ref)))
 
@@ -129,16 +201,42 @@ class EventTimer:
         n: int = 3,
         ref: datetime | None = None,
     ) -> Generator[Tuple[datetime, datetime], None, None]:
-        if not ref:
-            ref = self.__normalize_to_now()
+        ref = self.__ref(ref)
         for _ in range(n):
             start, end = self.get_next_range(ref)
             yield start, end
             # Advance reference slightly past the end of the current event
             ref = end + self.__delta
 
+    def iter_events(
+        self,
+        ref: datetime | None = None,
+    ) -> Generator[Tuple[datetime, datetime], None, None]:
+        """Every event starting after `ref`, for as long as the caller consumes."""
+        start = self.__ref(ref)
+        while True:
+            start, end = self.get_next_range(start)
+            yield start, end
+
     def is_event_on(self, ref: datetime | None = None) -> bool:
-        if not ref:
-            ref = self.__normalize_to_now()
+        ref = self.__ref(ref)
         start, end = self.get_prev_range(ref)
         return start <= ref < end
+
+
+@lru_cache(maxsize=TIMER_CACHE_SIZE)
+def _cached_event_timer(cron_str: str, tz_str: str, delta_str: str) -> EventTimer:
+    return EventTimer(cron_str, tz_str, delta_str, horizon=OCCURRENCE_HORIZON)
+
+
+track_lru_cache("event_timer", _cached_event_timer)
+
+
+def get_event_timer(cron_str: str, tz_str: str, delta_str: str) -> EventTimer:
+    """
+    The shared timer for this config. Most guilds use one of a few configs,
+    so parsing them once saves a `gettz`, cron parse and delta parse per call,
+    and its occurrence table answers most queries without stepping croniter.
+    Invalid configs raise every time; exceptions are not cached.
+    """
+    return _cached_event_timer(cron_str.strip(), tz_str.strip(), delta_str.strip())
@@ -1,18 +1,35 @@
 # STL
+import os
 import enum
-from typing import Any, Literal, Optional, TypeAlias, cast
+import json
+import time
+import uuid
+import asyncio
+import inspect
+import sqlite3
+import contextlib
+from copy import deepcopy
+from math import inf
+from typing import Any, Literal, Optional, TypeAlias, TypedDict, cast
 from datetime import datetime
+from functools import wraps
 from contextlib import asynccontextmanager
+from collections import OrderedDict, defaultdict
+from contextvars import ContextVar
 
 # PDM
 from sqlalchemy import (
     Enum,
     Column,
+    String,
     Boolean,
+    Integer,
     BigInteger,
     ForeignKey,
     CheckConstraint,
     PrimaryKeyConstraint,
+    func,
+    event,
     delete,
     select,
 )
@@ -21,6 +38,7 @@ from sqlalchemy_json import NestedMutableJson
 from sqlalchemy.ext.asyncio import (
     AsyncEngine,
     AsyncSession,
+    AsyncConnection,
     async_sessionmaker,
     create_async_engine,
 )
@@ -28,8 +46,11 @@ from sqlalchemy.dialects.sqlite import Insert as insert
 
 # LOCAL
 from tenpo.log_utils import getLogger
-from tenpo.phase_utils import PhaseTimer
-from tenpo.croniter_utils import EventTimer
+from tenpo.phase_utils import PhaseTimer, get_phase_timer
+from tenpo.timer_utils import MultiTimer, ScheduleConfig, get_multi_timer
+from tenpo.metrics_utils import CallStats, cache_counters
+from tenpo.croniter_utils import EventTimer, get_event_timer
+from tenpo.schedule_utils import Window, Schedule
 
 LOG = getLogger()
 Base = declarative_base()
@@ -87,6 +108,22 @@ DEFAULT_DISABLED = False
 DEFAULT_OPENS = []
 DEFAULT_PAUSE = 45
 
+CACHE_SIZE = 50_000  # entities whose config and rules are kept in memory
+CHANGE_POLL_INTERVAL = 1.0  # seconds between checks for other processes' writes
+CHANGE_LOG_KEEP = 10_000  # change rows kept for processes that fall behind
+
+BACKUP_PAGES = 256  # pages copied per backup step; the source is unlocked between
+BACKUP_SLEEP = 0.05  # seconds between backup steps, so writers can get in
+BACKUP_RESTARTS = 10  # times a backup may start over after a write before failing
+VACUUM_PAGES = 64  # free pages returned to the filesystem per vacuum step
+PRUNE_BATCH = 500  # empty entities deleted per transaction
+
+# innermost instrumented TenpoDB method running in this task
+CURRENT_CALL: ContextVar[str] = ContextVar("CURRENT_CALL", default="<none>")
+CONFIG_HIT, CONFIG_MISS = cache_counters("config")
+RULES_HIT, RULES_MISS = cache_counters("rules")
+WINDOW_HIT, WINDOW_MISS = cache_counters("window")
+
 
 class Pali(enum.Enum):
     PANA = 0
@@ -121,6 +158,8 @@ class ConfigKey(enum.Enum):
     LENGTH = "length"  # length of events
     TIMING = "timer"  # timing method (cron, ale, ala, moon phase)
     TIMEZONE = "timezone"  # timezone used to calculate event times
+    SCHEDULES = "schedules"  # (cron or mun, timezone, length) for timing "mute"
+    EVENTS = "events"  # whether the bot keeps Discord scheduled events
 
     # both
     DISABLED = "disabled"  # whether the bot looks at messages at all
@@ -139,6 +178,8 @@ class ConfigKeyTypes(enum.Enum):
     LENGTH = str  # TODO
     TIMEZONE = str
     TIMER = str
+    SCHEDULES = list[list[str]]
+    EVENTS = bool
     SPOILERS = bool
 
     DISABLED = bool
@@ -149,6 +190,7 @@ class NasinTenpo(enum.Enum):
     ALA = "ala"
     MUN = "mun"
     WILE = "wile"
+    MUTE = "mute"
 
 
 Lawa = dict[IjoSiko, set[int]]
@@ -161,6 +203,24 @@ IjoPiLawaKen = [
 ]
 
 
+class Snapshot(TypedDict):
+    """Everything `/lawa seme` shows about an entity, read at once."""
+
+    disabled: bool
+    sleep: int
+    rules: Lawa
+    exceptions: Lawa
+    response: str
+    reacts: list[str]
+    opens: list[str]
+    role: int | None
+    timing: str
+    cron: str
+    timezone: str
+    length: str
+    schedules: list[ScheduleConfig]
+
+
 class Entity(Base):
     __tablename__ = "entity"  # guilds and users
     id = Column(BigInteger, primary_key=True, nullable=False)
@@ -184,6 +244,13 @@ class Rules(Base):
     )
 
 
+class Change(Base):
+    __tablename__ = "change"  # entities written to, for other processes' caches
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    eid = Column(BigInteger, nullable=False)
+    writer = Column(String, nullable=False)  # `TenpoDB.writer` of the author
+
+
 # class Rules(Base):
 #     __tablename__ = "rules"
 #     # the entity who wrote the rule
@@ -211,33 +278,275 @@ class Rules(Base):
 #     )
 
 
+class BackupError(Exception):
+    pass
+
+
+class BackupProgress:
+    """
+    Progress callback for `sqlite3.Connection.backup`. A write from another
+    connection makes SQLite start the copy over; each restart backs off for
+    longer, and past `BACKUP_RESTARTS` the copy is abandoned.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.copied = 0
+        self.restarts = 0
+
+    def __call__(self, status: int, remaining: int, total: int):
+        done = total - remaining
+        if done <= self.copied:
+            self.restarts += 1
+            if self.restarts > BACKUP_RESTARTS:
+                raise BackupError(
+                    "%s restarted %s times; too busy to back up"
+                    % (self.path, BACKUP_RESTARTS)
+                )
+            time.sleep(BACKUP_SLEEP * 2 ** min(self.restarts, 6))
+        self.copied = done
+
+
+def instrumented(cls):
+    """
+    Time every public coroutine method of `cls` into `self.stats`.
+    Statements run by the engine are attributed to the innermost method.
+    """
+
+    def timed(name: str, method):
+        @wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            stats = self.stats[name]
+            token = CURRENT_CALL.set(name)
+            start = time.perf_counter()
+            try:
+                return await method(self, *args, **kwargs)
+            except BaseException:
+                stats.errors += 1
+                raise
+            finally:
+                stats.latency.observe(time.perf_counter() - start)
+                stats.calls += 1
+                CURRENT_CALL.reset(token)
+
+        return wrapper
+
+    for name, method in list(vars(cls).items()):
+        if name.startswith("_") or not inspect.iscoroutinefunction(method):
+            continue
+        setattr(cls, name, timed(name, method))
+    return cls
+
+
+def shard_path(database_file: str, index: int, shards: int) -> str:
+    """`tenpo.sqlite` for 1 shard; `tenpo.0.sqlite` to `tenpo.<N-1>.sqlite` for N."""
+    if shards == 1 or database_file == ":memory:":
+        return database_file
+    stem, ext = os.path.splitext(database_file)
+    return f"{stem}.{index}{ext}"
+
+
+class Shard:
+    """One SQLite file, holding every entity whose id maps to it."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+        self.sgen = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+        # no other process can open an in-memory db
+        self.watched = path != ":memory:"
+        self.watch: AsyncConnection | None = None
+        self.data_version: int | None = None
+        self.last_change = 0
+        self.last_poll = 0.0
+
+    async def open(self):
+        async with self.engine.begin() as conn:
+            # only takes effect on a new file; see `enable_incremental_vacuum`
+            await conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            await conn.run_sync(Base.metadata.create_all)
+
+        if self.watched:
+            await self.enable_incremental_vacuum()
+            # `PRAGMA data_version` is per connection, so one is held for polling
+            self.watch = await self.engine.connect()
+            self.data_version = await self.read_data_version()
+            result = await self.watch.execute(select(func.max(Change.id)))
+            self.last_change = result.scalar() or 0
+            await self.watch.rollback()
+
+    async def close(self):
+        if self.watch:
+            await self.watch.close()
+            self.watch = None
+        await self.engine.dispose()
+
+    async def enable_incremental_vacuum(self):
+        """
+        Switch a file made before incremental vacuum over to it, so `compact`
+        can shrink it. This is one full `VACUUM` on the first start after
+        upgrading, which locks the file for as long as it takes.
+        """
+        async with self.engine.connect() as conn:
+            result = await conn.exec_driver_sql("PRAGMA auto_vacuum")
+            if result.scalar_one() == 2:  # INCREMENTAL
+                return
+            LOG.warning("Enabling incremental vacuum on %s; vacuuming once", self.path)
+            await conn.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+            await conn.commit()
+            # VACUUM can't run inside a transaction
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.exec_driver_sql("VACUUM")
+
+    async def read_data_version(self) -> int:
+        assert self.watch
+        result = await self.watch.exec_driver_sql("PRAGMA data_version")
+        version = result.scalar_one()
+        await self.watch.rollback()
+        return version
+
+
+@instrumented
 class TenpoDB:
     engine: AsyncEngine
     sgen: async_sessionmaker
+    shards: list[Shard]
+    stats: defaultdict[str, CallStats]
+    schedule: Schedule
 
     """
     Any function which
     - exposes a session parameter
     - exposes a config key parameter
     Must be protected (`__methodname`).
+
+    Entity configs and rules are cached in memory. Every write also appends
+    to the `change` table, so other processes on the same file can evict
+    exactly the entities they have stale copies of.
+
+    With `shards > 1`, each entity and its rules live in the file picked by
+    `eid % shards`, so writes to different shards don't share a lock.
     """
 
-    def __init__(self, database_file: str):
-        self.engine = create_async_engine(f"sqlite+aiosqlite:///{database_file}")
-        self.sgen = async_sessionmaker(bind=self.engine, expire_on_commit=False)
+    def __init__(self, database_file: str, shards: int = 1):
+        assert shards >= 1
+        self.database_file = database_file
+        self.shards = [
+            Shard(shard_path(database_file, i, shards)) for i in range(shards)
+        ]
+        self.engine = self.shards[0].engine
+        self.sgen = self.shards[0].sgen
+        self.stats = defaultdict(CallStats)
+        for shard in self.shards:
+            event.listen(
+                shard.engine.sync_engine, "after_cursor_execute", self.__on_execute
+            )
+        self.writer = uuid.uuid4().hex
+        self.schedule = Schedule()
+        self.__configs: OrderedDict[int, dict[str, JSONType]] = OrderedDict()
+        self.__rules: OrderedDict[int, tuple[Lawa, Lawa]] = OrderedDict()
 
     async def __ainit__(self):
-        async with self.engine.begin() as conn:
-            await conn.run_sync(Base.metadata.create_all)
+        self.__check_split()
+        for shard in self.shards:
+            await shard.open()
 
     async def close(self):
-        await self.engine.dispose()
+        for shard in self.shards:
+            await shard.close()
+
+    def __check_split(self):
+        """Refuse to open empty shards next to the unsplit file they came from."""
+        shards = len(self.shards)
+        if shards == 1 or not os.path.exists(self.database_file):
+            return
+        if missing := [s.path for s in self.shards if not os.path.exists(s.path)]:
+            raise FileNotFoundError(
+                f"{self.database_file} isn't split into {shards} shards (missing "
+                f"{', '.join(missing)}); stop the bot and run "
+                f"`python -m tenpo.shard_utils {self.database_file} {shards}`"
+            )
+
+    def __shard(self, eid: int) -> Shard:
+        return self.shards[eid % len(self.shards)]
 
     @asynccontextmanager
-    async def session(self):
-        async with self.sgen() as s:
+    async def session(self, eid: int = 0):
+        async with self.__shard(eid).sgen() as s:
             yield s
 
+    def __on_execute(self, conn, cursor, statement, parameters, context, executemany):
+        stats = self.stats[CURRENT_CALL.get()]
+        stats.statements += 1
+        # the aiosqlite adapter buffers result rows; rowcount is -1 for selects
+        rows = getattr(cursor, "_rows", None)
+        if cursor.description and rows is not None:
+            stats.rows += len(rows)
+        elif cursor.rowcount > 0:
+            stats.rows += cursor.rowcount
+
+    def __evict(self, eid: int):
+        _ = self.__configs.pop(eid, None)
+        _ = self.__rules.pop(eid, None)
+        self.schedule.invalidate(eid)
+
+    def __cache(self, cache: OrderedDict, eid: int, value: Any):
+        cache[eid] = value
+        if len(cache) > CACHE_SIZE:
+            _ = cache.popitem(last=False)
+
+    async def __poll_changes(self, eid: int):
+        """
+        Evict cached entities which another process has written to the shard
+        of `eid`. `data_version` only moves when another connection commits,
+        so the change log is only read when there is something new in it.
+        """
+        shard = self.__shard(eid)
+        if not shard.watch:
+            return
+        now = time.monotonic()
+        if now - shard.last_poll < CHANGE_POLL_INTERVAL:
+            return
+        shard.last_poll = now
+
+        version = await shard.read_data_version()
+        if version == shard.data_version:
+            return
+        shard.data_version = version
+
+        stmt = (
+            select(Change.id, Change.eid, Change.writer)
+            .where(Change.id > shard.last_change)
+            .order_by(Change.id)
+        )
+        result = await shard.watch.execute(stmt)
+        changes = result.all()
+        await shard.watch.rollback()
+        if not changes:
+            return
+
+        if changes[0].id > shard.last_change + 1:
+            # the log was pruned past our position; anything could be stale
+            LOG.warning("Fell behind the change log; flushing entity cache")
+            self.__configs.clear()
+            self.__rules.clear()
+            self.schedule.invalidate_all()
+        else:
+            for change in changes:
+                if change.writer != self.writer:
+                    self.__evict(change.eid)
+        shard.last_change = changes[-1].id
+
+    async def __log_change(self, s: AsyncSession, eid: int):
+        """Record a write to `eid` in the same transaction as the write."""
+        change = Change(eid=eid, writer=self.writer)
+        s.add(change)
+        await s.flush()
+        if change.id % CHANGE_LOG_KEEP == 0:
+            _ = await s.execute(
+                delete(Change).where(Change.id <= change.id - CHANGE_LOG_KEEP)
+            )
+
     async def __get_entity(self, s: AsyncSession, eid: int) -> Entity:
         stmt = select(Entity).where(Entity.id == eid)
         result = await s.execute(stmt)
@@ -248,25 +557,41 @@ class TenpoDB:
             await s.commit()
         return entity
 
-    async def __get_config(self, eid: int) -> Column:
-        async with self.session() as s:
+    async def __get_config(self, eid: int) -> dict[str, JSONType]:
+        await self.__poll_changes(eid)
+        if (config := self.__configs.get(eid)) is not None:
+            self.__configs.move_to_end(eid)
+            CONFIG_HIT.inc()
+            return config
+        CONFIG_MISS.inc()
+
+        async with self.session(eid) as s:
             e = await self.__get_entity(s, eid)
-            return e.config
+            # detach from sqlalchemy_json's change tracking
+            config = json.loads(json.dumps(e.config or {}))
+        self.__cache(self.__configs, eid, config)
+        return config
 
     async def __set_config(self, eid: int, value: JSONType):
-        async with self.session() as s:
+        async with self.session(eid) as s:
             e = await self.__get_entity(s, eid)
             e.config = value
+            await self.__log_change(s, eid)
             await s.commit()
+        self.__evict(eid)
+
+    @staticmethod
+    def __pick(config: dict[str, JSONType], key: ConfigKey, default: Any = None):
+        item = config.get(key.value, default) if config else default
+        if isinstance(item, list) and not item:
+            return deepcopy(default)
+        # callers may mutate what they get; the cache must not see it
+        return deepcopy(item) if isinstance(item, (list, dict)) else item
 
     async def __get_config_item(
         self, eid: int, key: ConfigKey, default: Any = None
     ) -> JSONType | None:
-        config = await self.__get_config(eid)
-        item = config.get(key.value, default) if config else default
-        if isinstance(item, list) and not item:
-            return default
-        return item
+        return self.__pick(await self.__get_config(eid), key, default)
 
     async def __set_config_item(
         self,
@@ -274,11 +599,13 @@ class TenpoDB:
         key: ConfigKey,
         value: JSONType,
     ):
-        async with self.session() as s:
+        async with self.session(eid) as s:
             entity = await self.__get_entity(s, eid)
             entity.config[key.value] = value  # type: ignore
             # you can assign to Column with `sqlalchemy_json`
+            await self.__log_change(s, eid)
             await s.commit()
+        self.__evict(eid)
 
     async def reset_config(self, eid: int):
         await self.__set_config(eid, {})
@@ -422,40 +749,107 @@ class TenpoDB:
         c = await self.get_cron(eid)
         t = await self.get_timezone(eid)
         d = await self.get_length(eid)
-        return EventTimer(c, t, d)
+        return get_event_timer(c, t, d)
 
     async def get_moon_timer(self, eid: int) -> PhaseTimer:
         t = await self.get_timezone(eid)
         d = await self.get_length(eid)
-        return PhaseTimer(t, d)
+        return get_phase_timer(t, d)
+
+    async def get_schedules(self, eid: int) -> list[ScheduleConfig]:
+        schedules = await self.__get_config_item(eid, ConfigKey.SCHEDULES, [])
+        return [cast(ScheduleConfig, tuple(s)) for s in cast(list, schedules)]
+
+    async def toggle_schedule(self, eid: int, schedule: ScheduleConfig) -> bool:
+        schedules = await self.get_schedules(eid)
+        if is_in := schedule in schedules:
+            schedules.remove(schedule)
+        else:
+            schedules.append(schedule)
+        await self.__set_config_item(
+            eid, ConfigKey.SCHEDULES, [list(s) for s in schedules]
+        )
+        return not is_in
+
+    async def get_multi_timer(self, eid: int) -> MultiTimer | None:
+        schedules = await self.get_schedules(eid)
+        if not schedules:
+            return None
+        return get_multi_timer(schedules)
 
     async def get_response(self, eid: int) -> str:  # DEFAULT: react
         return cast(
             str, await self.__get_config_item(eid, ConfigKey.RESPONSE, DEFAULT_RESPONSE)
         )
 
+    def peek_response(self, eid: int) -> str | None:
+        """`eid`'s response if its config is cached; None rather than query."""
+        if (config := self.__configs.get(eid)) is None:
+            return None
+        return cast(str, self.__pick(config, ConfigKey.RESPONSE, DEFAULT_RESPONSE))
+
     async def set_response(self, eid: int, response: str):
         return await self.__set_config_item(eid, ConfigKey.RESPONSE, response)
 
+    async def get_events(self, eid: int) -> bool | None:
+        """Whether `eid` wants scheduled events; None if it never said."""
+        return cast(bool | None, await self.__get_config_item(eid, ConfigKey.EVENTS))
+
+    async def set_events(self, eid: int, events: bool):
+        await self.__set_config_item(eid, ConfigKey.EVENTS, events)
+
     async def get_calendar(self, eid: int) -> int | None:
         return cast(int, await self.__get_config_item(eid, ConfigKey.CALENDAR))
 
     async def set_calendar(self, eid: int, calendar: int | None):
         return await self.__set_config_item(eid, ConfigKey.CALENDAR, calendar)
 
+    async def __select_all(self, stmt) -> list:
+        """Run `stmt` on every shard at once and concatenate the rows."""
+
+        async def run(shard: Shard) -> list:
+            async with shard.sgen() as s:
+                result = await s.execute(stmt)
+                return list(result.all())
+
+        results = await asyncio.gather(*(run(shard) for shard in self.shards))
+        return [row for rows in results for row in rows]
+
     async def get_calendars(self) -> dict[int, int]:
-        async with self.session() as s:
-            stmt = select(Entity.id, Entity.config[ConfigKey.CALENDAR.value]).where(
-                Entity.config[ConfigKey.CALENDAR.value].isnot(None)
-            )
-            result = await s.execute(stmt)
-            entities_with_calendar = result.all()
+        stmt = select(Entity.id, Entity.config[ConfigKey.CALENDAR.value]).where(
+            Entity.config[ConfigKey.CALENDAR.value].isnot(None)
+        )
+        entities_with_calendar = await self.__select_all(stmt)
         calendars = {
             eid: calendar for eid, calendar in entities_with_calendar if calendar
         }
         # TODO: fix stmt to actually filter at DB side
         return calendars
 
+    async def get_calendar_timings(self) -> dict[int, tuple[int, str, str, str]]:
+        """
+        For every entity with a calendar: its channel, timing, timezone and
+        length, read from every shard at once.
+        """
+        config = Entity.config
+        stmt = select(
+            Entity.id,
+            config[ConfigKey.CALENDAR.value],
+            config[ConfigKey.TIMING.value].as_string(),
+            config[ConfigKey.TIMEZONE.value].as_string(),
+            config[ConfigKey.LENGTH.value].as_string(),
+        ).where(config[ConfigKey.CALENDAR.value].isnot(None))
+        return {
+            eid: (
+                calendar,
+                timing or DEFAULT_TIMING,
+                timezone or DEFAULT_TIMEZONE,
+                length or DEFAULT_LENGTH,
+            )
+            for eid, calendar, timing, timezone, length in await self.__select_all(stmt)
+            if calendar
+        }
+
     async def toggle_calendar(self, eid: int, calendar: int) -> bool:
         config_calendar = await self.get_calendar(eid)
         is_same = calendar == config_calendar
@@ -502,17 +896,21 @@ class TenpoDB:
             )
         )
         await s.execute(stmt)
+        await self.__log_change(s, eid)
         await s.commit()
+        self.__evict(eid)
 
     async def __delete_rule(self, s: AsyncSession, id: int, ctype: IjoSiko, eid: int):
         stmt = delete(Rules).where(
             (Rules.id == id) & (Rules.eid == eid) & (Rules.ctype == ctype)
         )
         await s.execute(stmt)
+        await self.__log_change(s, eid)
         await s.commit()
+        self.__evict(eid)
 
     async def select_rule(self, id: int, ctype: IjoSiko, eid: int) -> tuple[bool, bool]:
-        async with self.session() as s:
+        async with self.session(eid) as s:
             return await self.__select_rule(s, id, ctype, eid)
 
     async def upsert_rule(
@@ -528,7 +926,7 @@ class TenpoDB:
         Delete a rule if it is in the database.
         Return the action taken as a string.
         """
-        async with self.session() as s:
+        async with self.session(eid) as s:
             stmt = select(Rules).where(
                 (Rules.id == id) & (Rules.eid == eid) & (Rules.ctype == ctype)
             )
@@ -546,8 +944,16 @@ class TenpoDB:
             await self.__delete_rule(s, id, ctype, eid)
             return Pali.WEKA
 
-    async def list_rules(self, eid: int) -> tuple[Lawa, Lawa]:
-        async with self.session() as s:
+    async def __list_rules(self, eid: int) -> tuple[Lawa, Lawa]:
+        """Cached rules of `eid`. Callers must not mutate the result."""
+        await self.__poll_changes(eid)
+        if (cached := self.__rules.get(eid)) is not None:
+            self.__rules.move_to_end(eid)
+            RULES_HIT.inc()
+            return cached
+        RULES_MISS.inc()
+
+        async with self.session(eid) as s:
             stmt = select(Rules).where(Rules.eid == eid)
             result = await s.execute(stmt)
             found_rules = result.scalars().all()
@@ -563,7 +969,39 @@ class TenpoDB:
                     else rules[rule.ctype].add(rule.id)
                 )
 
-            return rules, exceptions
+        self.__cache(self.__rules, eid, (rules, exceptions))
+        return rules, exceptions
+
+    async def list_rules(self, eid: int) -> tuple[Lawa, Lawa]:
+        rules, exceptions = await self.__list_rules(eid)
+        return (
+            {ctype: set(ids) for ctype, ids in rules.items()},
+            {ctype: set(ids) for ctype, ids in exceptions.items()},
+        )
+
+    async def get_snapshot(self, eid: int) -> Snapshot:
+        """
+        One read of the config and one of the rules, where a getter per
+        item would make a round trip each.
+        """
+        config = await self.__get_config(eid)
+        rules, exceptions = await self.list_rules(eid)
+        pick = self.__pick
+        return Snapshot(
+            disabled=pick(config, ConfigKey.DISABLED, DEFAULT_DISABLED),
+            sleep=pick(config, ConfigKey.SLEEP, 0),
+            rules=rules,
+            exceptions=exceptions,
+            response=pick(config, ConfigKey.RESPONSE, DEFAULT_RESPONSE),
+            reacts=pick(config, ConfigKey.REACTS, DEFAULT_REACTS),
+            opens=pick(config, ConfigKey.OPENS, DEFAULT_OPENS),
+            role=pick(config, ConfigKey.ROLE),
+            timing=pick(config, ConfigKey.TIMING, DEFAULT_TIMING),
+            cron=pick(config, ConfigKey.CRON, DEFAULT_CRON),
+            timezone=pick(config, ConfigKey.TIMEZONE, DEFAULT_TIMEZONE),
+            length=pick(config, ConfigKey.LENGTH, DEFAULT_LENGTH),
+            schedules=[tuple(s) for s in pick(config, ConfigKey.SCHEDULES, [])],
+        )
 
     async def in_checked_channel(
         self,
@@ -573,7 +1011,7 @@ class TenpoDB:
         category_id: int | None,
         guild_id: int | None,
     ) -> bool:
-        rules, exceptions = await self.list_rules(entity_id)
+        rules, exceptions = await self.__list_rules(entity_id)
 
         for value, scope in [
             (thread_id, IjoSiko.THREAD),
@@ -591,19 +1029,49 @@ class TenpoDB:
 
         return bool(rules[IjoSiko.ALL])
 
-    async def is_event_time(self, eid: int) -> bool:
+    async def get_timer(
+        self,
+        eid: int,
+    ) -> EventTimer | PhaseTimer | MultiTimer | None:
+        timing = await self.get_timing(eid)
+        if timing == "mun":
+            return await self.get_moon_timer(eid)
+        if timing == "wile":
+            return await self.get_event_timer(eid)
+        if timing == "mute":
+            return await self.get_multi_timer(eid)
+        return None
+
+    async def get_timed(self) -> list[int]:
+        """Entities whose event windows open and close on their own."""
+        timing = Entity.config[ConfigKey.TIMING.value].as_string()
+        stmt = select(Entity.id).where(timing.in_(["mun", "wile", "mute"]))
+        return [eid for (eid,) in await self.__select_all(stmt)]
+
+    async def resolve_window(self, eid: int) -> Window:
+        """Whether `eid` is in an event window now, and when that changes."""
         timing = await self.get_timing(eid)
         if timing == "ale":
-            return True
-        elif timing == "ala":
-            return False
-        elif timing == "mun":
-            timer = await self.get_moon_timer(eid)
-            return timer.is_event_on()
-        elif timing == "wile":
-            timer = await self.get_event_timer(eid)
-            return timer.is_event_on()
-        return False
+            return True, inf
+        timer = await self.get_timer(eid)
+        if timer is None:
+            return False, inf
+
+        start, end = timer.get_prev_range()
+        now = datetime.now(tz=start.tzinfo)
+        if start <= now < end:
+            return True, end.timestamp()
+        return False, timer.get_next(now).timestamp()
+
+    async def is_event_time(self, eid: int) -> bool:
+        await self.__poll_changes(eid)
+        if (active := self.schedule.get(eid)) is not None:
+            WINDOW_HIT.inc()
+            return active
+        WINDOW_MISS.inc()
+        active, until = await self.resolve_window(eid)
+        self.schedule.set(eid, active, until)
+        return active
 
     async def startswith_ignorable(self, eid: int, message: str) -> bool:
         opens = await self.get_opens(eid)
@@ -612,8 +1080,129 @@ class TenpoDB:
                 return True
         return False
 
-
-async def TenpoDBFactory(database_file: str) -> TenpoDB:
-    t = TenpoDB(database_file=database_file)
+    async def backup(self, target: str):
+        """
+        Copy each shard to `target` (suffixed like the shard files) with
+        SQLite's online backup API. The copy runs in small page steps on a
+        worker thread, so neither the event loop nor writers wait on it for
+        long. Copies are written under a temporary name and renamed once
+        all are complete, so `target` is never torn or partial.
+
+        If writes keep making it start over, see `BackupProgress`, the
+        backup fails with `BackupError` and leaves nothing behind.
+        """
+        assert self.shards[0].watched, "cannot back up an in-memory database"
+
+        def copy(source_path: str, dest_path: str):
+            progress = BackupProgress(source_path)
+            source = sqlite3.connect(source_path)
+            dest = sqlite3.connect(dest_path)
+            try:
+                source.backup(
+                    dest, pages=BACKUP_PAGES, progress=progress, sleep=BACKUP_SLEEP
+                )
+            finally:
+                dest.close()
+                source.close()
+
+        n = len(self.shards)
+        dest_paths = [shard_path(target, i, n) for i in range(n)]
+        try:
+            for shard, dest_path in zip(self.shards, dest_paths):
+                await asyncio.to_thread(copy, shard.path, dest_path + ".tmp")
+        except BaseException:
+            for dest_path in dest_paths:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(dest_path + ".tmp")
+            raise
+        for dest_path in dest_paths:
+            os.replace(dest_path + ".tmp", dest_path)
+
+    async def prune_entities(self) -> int:
+        """
+        Delete entities with an empty config and no rules.
+        `__get_entity` creates one for everyone the bot has looked at,
+        and they are indistinguishable from having no row at all.
+        """
+        empty = (
+            select(Entity.id)
+            .where(Entity.config == {})
+            .where(Entity.id.not_in(select(Rules.eid)))
+            .limit(PRUNE_BATCH)
+        )
+        pruned = 0
+        for shard in self.shards:
+            while True:
+                async with shard.sgen() as s:
+                    stmt = delete(Entity).where(Entity.id.in_(empty))
+                    result = await s.execute(stmt)
+                    await s.commit()
+                pruned += result.rowcount
+                if result.rowcount < PRUNE_BATCH:
+                    break
+                await asyncio.sleep(0)
+        return pruned
+
+    async def compact(self) -> int:
+        """
+        Return free pages to the filesystem a few at a time, committing
+        and yielding between steps so the write lock is only held briefly.
+        Returns the number of pages freed.
+        """
+        freed = 0
+        for shard in self.shards:
+            async with shard.engine.connect() as conn:
+                result = await conn.exec_driver_sql("PRAGMA auto_vacuum")
+                if result.scalar_one() != 2:  # INCREMENTAL
+                    LOG.warning("Incremental vacuum not enabled on %s", shard.path)
+                    continue
+                result = await conn.exec_driver_sql("PRAGMA freelist_count")
+                remaining = result.scalar_one()
+                freed += remaining
+                await conn.commit()
+                raw = await conn.get_raw_connection()
+                while remaining > 0:
+                    # a plain execute only steps once, which frees a single page
+                    await raw.driver_connection.executescript(
+                        f"PRAGMA incremental_vacuum({VACUUM_PAGES});"
+                    )
+                    remaining -= VACUUM_PAGES
+                    await asyncio.sleep(0)
+        return freed
+
+
+def remove_partial_backups(backup_dir: str, stem: str) -> list[str]:
+    """Delete copies of `stem` left behind by a backup that was killed."""
+    partial = [
+        f
+        for f in os.listdir(backup_dir)
+        if f.startswith(stem + ".") and f.endswith(".sqlite.tmp")
+    ]
+    for f in partial:
+        os.remove(os.path.join(backup_dir, f))
+    return partial
+
+
+def rotate_backups(backup_dir: str, stem: str, keep: int) -> list[str]:
+    """
+    Delete all but the newest `keep` snapshots of `stem`, where a snapshot
+    is every file sharing a `stem.<stamp>.` prefix. Returns the deleted files.
+    """
+    snapshots: dict[str, list[str]] = defaultdict(list)
+    for f in os.listdir(backup_dir):
+        if f.startswith(stem + ".") and f.endswith(".sqlite"):
+            stamp = f[len(stem) + 1 :].split(".")[0]
+            snapshots[stamp].append(f)
+
+    stamps = sorted(snapshots)
+    expired = stamps[:-keep] if keep > 0 else stamps
+    deleted = [f for stamp in expired for f in snapshots[stamp]]
+    for f in deleted:
+        os.remove(os.path.join(backup_dir, f))
+    return deleted
+
+
+async def TenpoDBFactory(database_file: str, shards: int = 1) -> TenpoDB:
+    t = TenpoDB(database_file=database_file, shards=shards)
     await t.__ainit__()
     return t
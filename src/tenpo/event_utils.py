@@ -0,0 +1,99 @@
+# STL
+from typing import Any, Literal, NamedTuple
+from datetime import datetime, timedelta
+from collections.abc import Iterable
+
+# PDM
+from discord import ScheduledEventStatus
+
+# LOCAL
+from tenpo.log_utils import getLogger
+from tenpo.str_utils import format_timestamp
+
+LOG = getLogger()
+
+OpKind = Literal["create", "update", "delete"]
+# moon event times move by microseconds between searches
+MATCH_TOLERANCE = timedelta(minutes=1)
+
+
+class DesiredEvent(NamedTuple):
+    start: datetime
+    end: datetime
+    description: str
+
+
+class EventOp(NamedTuple):
+    kind: OpKind
+    desired: DesiredEvent | None  # None for deletes
+    event: Any | None  # the existing ScheduledEvent; None for creates
+
+
+def plan_events(
+    name: str,
+    existing: Iterable[Any],
+    desired: list[DesiredEvent],
+    now: datetime,
+) -> list[EventOp]:
+    """
+    What to create, update and delete so the guild's upcoming events named
+    `name` are exactly `desired`. Both are walked in start order in one pass,
+    matching starts within `MATCH_TOLERANCE`. Events which have started are
+    left alone, even before Discord marks them active, as are events past
+    the last desired one, which another `limit` may have made on purpose.
+    A desired window which has started only claims its event; it is too
+    late to make or move one.
+    """
+    ours = sorted(
+        (
+            event
+            for event in existing
+            if event.name == name
+            and event.status == ScheduledEventStatus.scheduled
+            and event.start_time
+        ),
+        key=lambda event: event.start_time,
+    )
+
+    ops: list[EventOp] = []
+    i = 0
+    for want in sorted(desired):
+        # anything starting before this window that no window claimed
+        while i < len(ours) and ours[i].start_time < want.start - MATCH_TOLERANCE:
+            if ours[i].start_time > now:
+                ops.append(EventOp("delete", None, ours[i]))
+            i += 1
+
+        started = want.start <= now
+        if i < len(ours) and ours[i].start_time <= want.start + MATCH_TOLERANCE:
+            event = ours[i]
+            i += 1
+            if (
+                not started
+                and event.start_time > now
+                and (
+                    event.end_time is None
+                    or abs(event.end_time - want.end) > MATCH_TOLERANCE
+                    or event.description != want.description
+                )
+            ):
+                ops.append(EventOp("update", want, event))
+        elif not started:
+            ops.append(EventOp("create", want, None))
+    return ops
+
+
+def format_event_ops(ops: list[EventOp]) -> str:
+    if not ops:
+        return "tenpo ale li pona. mi ante ala."
+    lines = []
+    for op in ops:
+        if op.desired:
+            start, end = op.desired.start, op.desired.end
+        else:
+            start, end = op.event.start_time, op.event.end_time
+        event_range = format_timestamp(start)
+        if end:
+            event_range += " " + format_timestamp(end)
+        lines.append(f"**{op.kind}** {event_range}")
+    return "\n".join(lines)
@@ -0,0 +1,152 @@
+# STL
+import os
+import sys
+import time
+import asyncio
+import threading
+import traceback
+from types import FrameType
+from typing import NamedTuple
+from collections import deque
+
+# LOCAL
+from tenpo.log_utils import getLogger
+from tenpo.metrics_utils import METRICS
+
+LOG = getLogger()
+
+LAG_INTERVAL = 0.1  # seconds between heartbeats
+LAG_THRESHOLD = 0.25  # seconds late before a heartbeat counts as a stall
+STALL_HISTORY = 64
+STACK_LIMIT = 40  # innermost frames kept per stall
+
+PACKAGE_DIR = os.path.dirname(__file__)
+# ours, but only ever running someone else's handler
+PLUMBING = {__file__, os.path.join(PACKAGE_DIR, "queue_utils.py")}
+# frames outside the callback the loop is running are the loop's own
+LOOP_RUN_FILE = asyncio.events.__file__
+
+LAG_SECONDS = METRICS.histogram(
+    "tenpo_loop_lag_seconds", "How late the event loop ran a heartbeat."
+).labels()
+STALLS = METRICS.counter(
+    "tenpo_loop_stalls_total", "Event loop stalls by handler.", ("handler",)
+)
+
+
+class Stall(NamedTuple):
+    at: float  # unix time the stall ended
+    lag: float  # seconds
+    handler: str  # outermost function of ours running when it was caught
+    stack: str
+
+
+def find_handler(frame: FrameType | None) -> str:
+    """
+    The outermost frame in this package within the running callback, which
+    for a stalled coroutine is the listener, task or command it runs under,
+    like `o_toki_pona_taso`.
+    """
+    handler = "<unknown>"
+    while frame:
+        filename = frame.f_code.co_filename
+        if filename == LOOP_RUN_FILE and frame.f_code.co_name == "_run":
+            break
+        if filename.startswith(PACKAGE_DIR) and filename not in PLUMBING:
+            handler = frame.f_code.co_qualname
+        frame = frame.f_back
+    return handler
+
+
+class LagMonitor:
+    """
+    A heartbeat on the event loop, watched by a thread. When a beat is late,
+    the thread takes the loop thread's stack while it is still stuck, so
+    the stall is put down to what caused it and not to whatever ran next.
+    The worst recent stalls are kept in a ring buffer.
+    """
+
+    def __init__(
+        self,
+        interval: float = LAG_INTERVAL,
+        threshold: float = LAG_THRESHOLD,
+        keep: int = STALL_HISTORY,
+    ):
+        self.interval = interval
+        self.threshold = threshold
+        self.stalls: deque[Stall] = deque(maxlen=keep)
+        self.beat = time.monotonic()
+        self.loop_thread: int | None = None
+        # (handler, stack) the watcher caught during the current stall
+        self.caught: tuple[str, str] | None = None
+        self.stopped = threading.Event()
+
+    def __catch(self) -> tuple[str, str] | None:
+        assert self.loop_thread
+        frame = sys._current_frames().get(self.loop_thread)
+        if frame is None:
+            return None
+        stack = "".join(traceback.format_stack(frame, limit=STACK_LIMIT))
+        return find_handler(frame), stack
+
+    def __watch(self, stopped: threading.Event):
+        while not stopped.wait(self.interval):
+            late = time.monotonic() - self.beat - self.interval
+            if late > self.threshold and self.caught is None:
+                self.caught = self.__catch()
+
+    def stop(self):
+        self.stopped.set()
+
+    async def run(self):
+        """Beat until cancelled. Records every stall past the threshold."""
+        self.loop_thread = threading.get_ident()
+        # a fresh event per run, so a restart can't revive the last watcher
+        self.stopped = threading.Event()
+        self.beat = time.monotonic()
+        threading.Thread(
+            target=self.__watch, args=(self.stopped,), name="lag-watch", daemon=True
+        ).start()
+        try:
+            while True:
+                await asyncio.sleep(self.interval)
+                now = time.monotonic()
+                lag = max(now - self.beat - self.interval, 0.0)
+                self.beat = now
+                LAG_SECONDS.observe(lag)
+                if lag < self.threshold:
+                    continue
+                handler, stack = self.caught or ("<unknown>", "")
+                self.caught = None
+                self.stalls.append(Stall(time.time(), lag, handler, stack))
+                STALLS.labels(handler).inc()
+                LOG.warning("Event loop stalled for %.3fs in %s", lag, handler)
+        finally:
+            self.stop()
+
+    def worst(self, limit: int = 10) -> list[Stall]:
+        return sorted(self.stalls, key=lambda stall: stall.lag, reverse=True)[:limit]
+
+
+def format_stalls(stalls: list[Stall], stacks: int = 1) -> str:
+    """One line per stall, then the stacks of the first `stacks` of them."""
+    if not stalls:
+        return "No stalls recorded."
+    lines = ["%-20s %9s  %s" % ("ended", "lag ms", "handler")]
+    for stall in stalls:
+        lines.append(
+            "%-20s %9.1f  %s"
+            % (
+                time.strftime("%Y-%m-%d %H:%M:%S", time.gmtime(stall.at)),
+                stall.lag * 1000,
+                stall.handler,
+            )
+        )
+    for stall in stalls[:stacks]:
+        if stall.stack:
+            lines.append("\n%s, %.1fms:" % (stall.handler, stall.lag * 1000))
+            lines.append(stall.stack)
+    return "\n".join(lines)
+
+
+MONITOR = LagMonitor()
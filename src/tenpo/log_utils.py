@@ -1,6 +1,12 @@
 # STL
+import sys
+import queue
+import atexit
 import logging
+from typing import Literal
 from functools import partial
+from collections import Counter
+from logging.handlers import QueueHandler, QueueListener
 
 getLogger = partial(logging.getLogger, "tenpo")
 
@@ -9,16 +15,90 @@ LOG_FORMAT = (
     "[%(asctime)s] [%(filename)14s:%(lineno)-4s] [%(levelname)8s]   %(message)s"
 )
 
+# dev: stacks on every line at or past stacktrace_level, written inline
+# prod: tracebacks only while handling an exception, written off the loop
+LogMode = Literal["dev", "prod"]
+
+_listener: QueueListener | None = None
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    Hands records to the listener's thread as they are. The stock handler
+    formats them first, on the caller's thread; here, that is the loop.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class SampleFilter(logging.Filter):
+    """Pass one in `rate` (> 1) records at or below `level`, per call site."""
+
+    def __init__(self, rate: int, level: int = logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        self.level = level
+        self.seen: Counter[tuple[str, int]] = Counter()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.level:
+            return True
+        site = (record.pathname, record.lineno)
+        self.seen[site] += 1
+        return self.seen[site] % self.rate == 1
+
+
+def with_exc_info(method):
+    """`method`, attaching the traceback if an exception is being handled."""
+
+    def log(msg, *args, **kwargs):
+        if "exc_info" not in kwargs and sys.exc_info()[0] is not None:
+            kwargs["exc_info"] = True
+        # attribute the line to our caller, not to this wrapper
+        method(msg, *args, stacklevel=kwargs.pop("stacklevel", 1) + 1, **kwargs)
+
+    return log
+
+
+def start_queue_listener() -> None:
+    """Route every record through one queue, drained by one thread."""
+    global _listener
+    if _listener:
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    root = logging.getLogger()
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(DeferredQueueHandler(records))
+    _listener = QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    _ = atexit.register(_listener.stop)
+
 
 def configure_logger(
     logger: str,
     log_level: int = logging.DEBUG,
     stacktrace_level: int = logging.ERROR,
+    mode: LogMode = "dev",
+    sample_rate: int = 1,
 ) -> None:
     _log = logging.getLogger(logger)
     _log.setLevel(log_level)
     # level set on a per-logger basis to avoid 'discord' logger
 
+    if sample_rate > 1:
+        _log.addFilter(SampleFilter(sample_rate))
+
+    if mode == "prod":
+        start_queue_listener()
+        for level in ("debug", "info", "warning", "error", "critical"):
+            if stacktrace_level <= getattr(logging, level.upper()):
+                setattr(_log, level, with_exc_info(getattr(_log, level)))
+        return
+
     logging.basicConfig(format=LOG_FORMAT)
     if stacktrace_level > logging.NOTSET:
         if stacktrace_level <= logging.DEBUG:
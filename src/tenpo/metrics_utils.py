@@ -0,0 +1,367 @@
+# STL
+import json
+import time
+import asyncio
+from bisect import bisect_left
+from typing import Literal
+from collections.abc import Callable, Iterable, Iterator
+
+# LOCAL
+from tenpo.log_utils import getLogger
+
+LOG = getLogger()
+
+# seconds; anything slower lands in the overflow bucket
+LATENCY_BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+)
+
+
+class Histogram:
+    """Fixed-bucket histogram. Observing is a bisect and two additions."""
+
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def observe_since(self, start: float) -> float:
+        """Observe the time since `start`; returns now, to start the next stage."""
+        now = time.perf_counter()
+        self.observe(now - start)
+        return now
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the `q`th observation."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float("inf")
+
+    def to_dict(self) -> dict:
+        return {
+            "buckets": list(self.buckets),
+            "counts": self.counts,
+            "sum": self.sum,
+            "count": self.count,
+        }
+
+
+class CallStats:
+    """What one instrumented method has cost so far."""
+
+    __slots__ = ("calls", "errors", "statements", "rows", "latency")
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.statements = 0
+        self.rows = 0
+        self.latency = Histogram()
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "statements": self.statements,
+            "rows": self.rows,
+            "latency": self.latency.to_dict(),
+        }
+
+
+def format_ms(seconds: float) -> str:
+    if seconds == float("inf"):
+        return "inf"
+    return "%.2f" % (seconds * 1000)
+
+
+def format_call_stats(stats: dict[str, CallStats], limit: int = 20) -> str:
+    """Table of the `limit` methods with the most total time, worst first."""
+    ranked = sorted(stats.items(), key=lambda kv: kv[1].latency.sum, reverse=True)
+    lines = [
+        "%-24s %8s %6s %8s %8s %9s %8s %8s"
+        % ("method", "calls", "err", "stmts", "rows", "total ms", "p50 ms", "p99 ms")
+    ]
+    for name, s in ranked[:limit]:
+        lines.append(
+            "%-24s %8d %6d %8d %8d %9s %8s %8s"
+            % (
+                name[:24],
+                s.calls,
+                s.errors,
+                s.statements,
+                s.rows,
+                format_ms(s.latency.sum),
+                format_ms(s.latency.quantile(0.5)),
+                format_ms(s.latency.quantile(0.99)),
+            )
+        )
+    return "\n".join(lines)
+
+
+def dump_call_stats(stats: dict[str, CallStats]) -> str:
+    return json.dumps({name: s.to_dict() for name, s in stats.items()}, indent=2)
+
+
+MetricKind = Literal["counter", "gauge", "histogram"]
+
+
+class Counter:
+    """Only goes up. `fn`, if tracked, is read instead at export."""
+
+    __slots__ = ("value", "fn")
+
+    def __init__(self):
+        self.value = 0
+        self.fn: Callable[[], float] | None = None
+
+    def inc(self, n: int = 1):
+        self.value += n
+
+    def track(self, fn: Callable[[], float]):
+        self.fn = fn
+
+    def get(self) -> float:
+        return self.fn() if self.fn else self.value
+
+
+class Gauge(Counter):
+    """Goes up and down."""
+
+    __slots__ = ()
+
+    def set(self, value: float):
+        self.value = value
+
+    def dec(self, n: int = 1):
+        self.value -= n
+
+
+class Family:
+    """
+    A named metric and its children, one per tuple of label values.
+    Bind children once, up front, so recording is only an addition.
+    """
+
+    __slots__ = ("name", "help", "kind", "labelnames", "children", "factory")
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        kind: MetricKind,
+        labelnames: tuple[str, ...],
+        factory: Callable[[], Counter | Gauge | Histogram],
+    ):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labelnames = labelnames
+        self.factory = factory
+        self.children: dict[tuple[str, ...], Counter | Gauge | Histogram] = {}
+
+    def labels(self, *values: str):
+        if (child := self.children.get(values)) is None:
+            assert len(values) == len(self.labelnames), self.name
+            child = self.children[values] = self.factory()
+        return child
+
+
+class Registry:
+    """
+    Every metric of the process, exported in the Prometheus text format.
+    Everything runs on the event loop, so nothing is locked.
+    """
+
+    def __init__(self):
+        self.families: dict[str, Family] = {}
+        self.collectors: list[Callable[[], Iterable[str]]] = []
+
+    def __family(self, name, help, kind, labelnames, factory) -> Family:
+        if (family := self.families.get(name)) is not None:
+            assert family.kind == kind and family.labelnames == labelnames, name
+            return family
+        family = self.families[name] = Family(name, help, kind, labelnames, factory)
+        return family
+
+    def counter(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        return self.__family(name, help, "counter", labelnames, Counter)
+
+    def gauge(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        return self.__family(name, help, "gauge", labelnames, Gauge)
+
+    def histogram(
+        self,
+        name: str,
+        help: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        return self.__family(
+            name, help, "histogram", labelnames, lambda: Histogram(buckets)
+        )
+
+    def collect(self, collector: Callable[[], Iterable[str]]):
+        """Add lines rendered at export time, for stats kept elsewhere."""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        lines: list[str] = []
+        for family in self.families.values():
+            lines.extend(render_family(family))
+        for collector in self.collectors:
+            try:
+                lines.extend(collector())
+            except Exception as e:
+                LOG.error("Metrics collector %s failed: %s", collector, e)
+        lines.append("")
+        return "\n".join(lines)
+
+
+METRICS = Registry()
+CACHE_LOOKUPS = METRICS.counter(
+    "tenpo_cache_lookups_total",
+    "Cache lookups by cache and result.",
+    ("cache", "result"),
+)
+
+
+def cache_counters(cache: str) -> tuple[Counter, Counter]:
+    """The (hit, miss) counters of `cache`."""
+    return CACHE_LOOKUPS.labels(cache, "hit"), CACHE_LOOKUPS.labels(cache, "miss")
+
+
+def track_lru_cache(cache: str, fn):
+    """Export the hits and misses of an `lru_cache`d `fn` as those of `cache`."""
+    hit, miss = cache_counters(cache)
+    hit.track(lambda: fn.cache_info().hits)
+    miss.track(lambda: fn.cache_info().misses)
+
+
+def format_labels(names: Iterable[str], values: Iterable[str], le: str = "") -> str:
+    pairs = [
+        '%s="%s"'
+        % (k, str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for k, v in zip(names, values)
+    ]
+    if le:
+        pairs.append('le="%s"' % le)
+    return "{%s}" % ",".join(pairs) if pairs else ""
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_histogram(
+    name: str,
+    names: tuple[str, ...],
+    values: tuple[str, ...],
+    histogram: Histogram,
+) -> Iterator[str]:
+    seen = 0
+    for bound, count in zip(histogram.buckets, histogram.counts):
+        seen += count
+        yield "%s_bucket%s %d" % (name, format_labels(names, values, repr(bound)), seen)
+    overflow = format_labels(names, values, "+Inf")
+    yield "%s_bucket%s %d" % (name, overflow, histogram.count)
+    labels = format_labels(names, values)
+    yield "%s_sum%s %s" % (name, labels, format_value(histogram.sum))
+    yield "%s_count%s %d" % (name, labels, histogram.count)
+
+
+def render_header(name: str, help: str, kind: MetricKind) -> Iterator[str]:
+    yield "# HELP %s %s" % (name, help)
+    yield "# TYPE %s %s" % (name, kind)
+
+
+def render_family(family: Family) -> Iterator[str]:
+    yield from render_header(family.name, family.help, family.kind)
+    for values, child in list(family.children.items()):
+        if isinstance(child, Histogram):
+            yield from render_histogram(family.name, family.labelnames, values, child)
+        else:
+            labels = format_labels(family.labelnames, values)
+            yield "%s%s %s" % (family.name, labels, format_value(child.get()))
+
+
+def render_call_stats(stats: dict[str, CallStats], prefix: str) -> Iterator[str]:
+    """`CallStats` per method, as the `{prefix}_*` families."""
+    names = ("method",)
+    for suffix, attr, help in (
+        ("calls_total", "calls", "Calls by method."),
+        ("errors_total", "errors", "Calls which raised, by method."),
+        ("statements_total", "statements", "Statements run, by method."),
+        ("rows_total", "rows", "Rows read or written, by method."),
+    ):
+        yield from render_header(f"{prefix}_{suffix}", help, "counter")
+        for method, s in list(stats.items()):
+            yield "%s_%s%s %d" % (
+                prefix,
+                suffix,
+                format_labels(names, (method,)),
+                getattr(s, attr),
+            )
+    name = f"{prefix}_seconds"
+    yield from render_header(name, "Call latency by method.", "histogram")
+    for method, s in list(stats.items()):
+        yield from render_histogram(name, names, (method,), s.latency)
+
+
+async def serve_metrics(
+    registry: Registry,
+    port: int,
+    host: str = "127.0.0.1",
+) -> asyncio.Server:
+    """Answer every HTTP request on `host:port` with the rendered `registry`."""
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            # the request itself doesn't matter; read through its headers
+            while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            body = registry.render().encode()
+            writer.write(
+                b"HTTP/1.1 200 OK\r\n"
+                b"Content-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                b"Content-Length: %d\r\n"
+                b"Connection: close\r\n\r\n" % len(body)
+            )
+            writer.write(body)
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    server = await asyncio.start_server(handle, host, port)
+    LOG.info("Serving metrics on http://%s:%s/metrics", host, port)
+    return server
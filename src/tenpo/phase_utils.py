@@ -3,7 +3,9 @@ import typing
 from math import floor
 from typing import Literal, cast
 from datetime import datetime, timedelta
-from collections.abc import Generator
+from functools import lru_cache
+from itertools import islice
+from collections.abc import Iterable, Generator
 
 # PDM
 import numpy
@@ -12,7 +14,14 @@ from skyfield.timelib import Time
 
 # LOCAL
 from tenpo.log_utils import getLogger
-from tenpo.croniter_utils import ValidTZ, parse_delta, parse_timezone
+from tenpo.metrics_utils import track_lru_cache
+from tenpo.croniter_utils import (
+    TIMER_CACHE_SIZE,
+    ValidTZ,
+    InvalidEventTimer,
+    parse_delta,
+    parse_timezone,
+)
 
 LOG = getLogger()
 
@@ -29,6 +38,10 @@ PHASE_LEN_DAYS = 30
 # constants from skyfield
 PHASE_LEN_DEG = 360.0
 
+# new and full moons are 13.9 to 15.6 days apart
+MAX_EVENT_GAP_DAYS = 16
+SEARCH_CHUNK_DAYS = 60
+
 #               0               90            180             270           360
 PHASE_EMOJIS = "🌑🌑🌒🌒🌒🌒🌒🌓🌓🌔🌔🌔🌔🌔🌕🌕🌕🌖🌖🌖🌖🌖🌗🌗🌘🌘🌘🌘🌘🌑"
 # yes it's hard to read so here's a traceable English version:
@@ -90,6 +103,68 @@ def current_emoji(t: datetime | None = None) -> str:
     return emoji
 
 
+def find_moon_events(start: datetime, end: datetime) -> list[tuple[Time, int]]:
+    """Finds moon phase events (full and new) between two datetimes."""
+    t0 = TS.from_datetime(start)
+    t1 = TS.from_datetime(end)
+    f = almanac.moon_phases(EPH)
+    times, phases = almanac.find_discrete(t0, t1, f)
+    events = [(t, p) for t, p in zip(times, phases) if p in (0, 2)]
+    return events
+
+
+def moon_windows_open(
+    configs: Iterable[tuple[str, str]],
+    ref: datetime | None = None,
+) -> dict[tuple[str, str], bool]:
+    """
+    Whether a moon window is open at `ref` for each (timezone, length).
+    Windows start at the same instant everywhere, so one search serves every
+    config; this is `PhaseTimer(tz, length).is_event_on(ref)` for each of them.
+    Invalid configs are never open.
+    """
+    if not ref:
+        ref = now_skyfield()
+    events = find_moon_events(ref - timedelta(days=40), ref)
+    start = cast(datetime, events[-1][0].utc_datetime())
+
+    windows: dict[tuple[str, str], bool] = {}
+    for tz_str, delta_str in set(configs):
+        try:
+            _ = parse_timezone(tz_str)
+            delta = parse_delta(delta_str)
+        except InvalidEventTimer as e:
+            LOG.warning("Ignoring moon timing %s: %s", (tz_str, delta_str), e)
+            windows[(tz_str, delta_str)] = False
+            continue
+        windows[(tz_str, delta_str)] = start <= ref < start + delta
+    return windows
+
+
+def timestamps_to_times(ts: numpy.ndarray) -> Time:
+    """Epoch seconds to one skyfield `Time` holding all of them.
+    Whole days are split off because epoch seconds don't count leap seconds;
+    this matches `TS.from_datetime` exactly."""
+    days, seconds = numpy.divmod(numpy.asarray(ts, dtype=numpy.float64), 86400)
+    return TS.utc(1970, 1, 1 + days, 0, 0, seconds)
+
+
+def timestamps_to_degrees(ts: numpy.ndarray) -> numpy.ndarray:
+    """Vectorised `datetime_to_degrees`: one skyfield evaluation for all of `ts`"""
+    return almanac.moon_phase(ephemeris=EPH, t=timestamps_to_times(ts)).degrees
+
+
+def degrees_to_emoji_indices(d: numpy.ndarray) -> numpy.ndarray:
+    """Vectorised `degrees_to_emoji`, giving indices into `PHASE_EMOJIS`"""
+    return numpy.floor_divide(d, EMOJI_STEP_SIZE).astype(numpy.intp)
+
+
+def timestamps_to_emojis(ts: numpy.ndarray) -> list[str]:
+    """The phase emoji for each epoch second in `ts`"""
+    indices = degrees_to_emoji_indices(timestamps_to_degrees(ts))
+    return [PHASE_EMOJIS[i] for i in indices]
+
+
 class PhaseTimer:
     __tz: ValidTZ
     __delta: timedelta
@@ -100,13 +175,7 @@ class PhaseTimer:
 
     # TODO: better with a ref and forward arg instead?
     def __find_moon_events(self, start: datetime, end: datetime):
-        """Finds moon phase events (full and new) between two datetimes."""
-        t0 = TS.from_datetime(start)
-        t1 = TS.from_datetime(end)
-        f = almanac.moon_phases(EPH)
-        times, phases = almanac.find_discrete(t0, t1, f)
-        events = [(t, p) for t, p in zip(times, phases) if p in (0, 2)]
-        return events
+        return find_moon_events(start, end)
 
     def __ts_to_datetime(self, ts: Time) -> datetime:
         time = cast(datetime, ts.utc_datetime())
@@ -136,18 +205,53 @@ class PhaseTimer:
         start = self.get_next(ref)
         return start, start + self.__delta
 
+    def iter_phases(
+        self,
+        ref: datetime | None = None,
+        chunk_days: float = SEARCH_CHUNK_DAYS,
+    ) -> Generator[tuple[datetime, datetime, Phase], None, None]:
+        """
+        Every event after `ref` with its phase, searching `chunk_days` at a
+        time, and only as far as the caller consumes.
+        """
+        if not ref:
+            ref = datetime.now(tz=self.__tz)
+        search_from = ref
+        last: Time | None = None
+        while True:
+            search_to = search_from + timedelta(days=chunk_days)
+            for t, p in self.__find_moon_events(search_from, search_to):
+                if last is not None and t.tt <= last.tt:
+                    continue  # found again at the chunk boundary
+                last = t
+                start = self.__ts_to_datetime(t)
+                yield start, start + self.__delta, PHASES[p // 2]
+            search_from = search_to
+
+    def iter_events(
+        self,
+        ref: datetime | None = None,
+        chunk_days: float = SEARCH_CHUNK_DAYS,
+    ) -> Generator[tuple[datetime, datetime], None, None]:
+        for start, end, _ in self.iter_phases(ref, chunk_days):
+            yield start, end
+
+    def get_phases_from(
+        self,
+        n: int = 3,
+        ref: datetime | None = None,
+    ) -> Generator[tuple[datetime, datetime, Phase], None, None]:
+        # one search long enough to hold all `n` events
+        chunk_days = n * MAX_EVENT_GAP_DAYS + 1
+        yield from islice(self.iter_phases(ref, chunk_days), n)
+
     def get_events_from(
         self,
         n: int = 3,
         ref: datetime | None = None,
     ) -> Generator[tuple[datetime, datetime], None, None]:
-        if not ref:
-            ref = datetime.now(tz=self.__tz)
-        for _ in range(n):
-            start, end = self.get_next_range(ref)
+        for start, end, _ in self.get_phases_from(n, ref):
             yield start, end
-            ref = start + timedelta(days=1)
-            # start/end are always ~15d apart
 
     def is_event_on(self, ref: datetime | None = None) -> bool:
         if not ref:
@@ -165,3 +269,16 @@ class PhaseTimer:
             return None
         events = self.__find_moon_events(start, end)
         return PHASES[events[0][1] // 2]
+
+
+@lru_cache(maxsize=TIMER_CACHE_SIZE)
+def _cached_phase_timer(tz_str: str, delta_str: str) -> PhaseTimer:
+    return PhaseTimer(tz_str, delta_str)
+
+
+track_lru_cache("phase_timer", _cached_phase_timer)
+
+
+def get_phase_timer(tz_str: str, delta_str: str) -> PhaseTimer:
+    """The shared timer for this config, like `get_event_timer`."""
+    return _cached_phase_timer(tz_str.strip(), delta_str.strip())
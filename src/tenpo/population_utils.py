@@ -0,0 +1,267 @@
+"""
+Fill a database with a synthetic population, to see how it scales.
+
+    python -m tenpo.population_utils population.sqlite --guilds 100000 --users 1000000
+
+Distributions are rough guesses at the real ones: most users never
+configure anything, a few set hundreds of rules, and guilds have category,
+channel and thread rule trees of varied depth and a mix of timings. The
+same seed always makes the same population, and any guild's channels can
+be rebuilt from its index alone, so benchmarks can ask about real places
+without holding millions of ids.
+"""
+
+# STL
+import os
+import json
+import random
+import asyncio
+import sqlite3
+import argparse
+from typing import NamedTuple
+from functools import lru_cache
+from collections.abc import Iterator
+
+# LOCAL
+from tenpo.db import DEFAULT_REACTS, IjoSiko, ConfigKey, TenpoDBFactory
+from tenpo.log_utils import getLogger, configure_logger
+
+LOG = getLogger()
+
+# a plausible discord snowflake; ids are this plus an index, shifted like one
+FIRST_SNOWFLAKE = 1 << 56
+SNOWFLAKE_SHIFT = 22
+MAX_CONTAINERS = 4096  # per guild
+USER_OFFSET = 1 << 40  # user indices start here, past any guild container
+BATCH = 10_000
+LAYOUT_CACHE_SIZE = 8192
+
+TIMINGS = [("ala", 0.6), ("ale", 0.15), ("mun", 0.15), ("wile", 0.08), ("mute", 0.02)]
+CRONS = ["0 0 * * 6", "0 0 * * 0", "0 18 * * 5", "0 0 1 * *", "0 */6 * * *"]
+TIMEZONES = ["UTC", "US/Central", "US/Eastern", "Europe/London", "Asia/Tokyo"]
+LENGTHS = ["24h", "12h", "2h", "3d"]
+RESPONSES = ["sitelen", "weka", "len", "sitelen lili"]
+
+
+class GuildLayout(NamedTuple):
+    id: int
+    # (category, [(channel, [thread])])
+    categories: list[tuple[int, list[tuple[int, list[int]]]]]
+
+
+class Place(NamedTuple):
+    """Where a message was sent, as `in_checked_channel` takes it."""
+
+    user: int
+    guild: int
+    category: int
+    channel: int
+    thread: int | None
+
+
+def snowflake(index: int) -> int:
+    return FIRST_SNOWFLAKE + (index << SNOWFLAKE_SHIFT)
+
+
+def guild_id(i: int) -> int:
+    return snowflake(i * MAX_CONTAINERS)
+
+
+def user_id(i: int) -> int:
+    return snowflake(USER_OFFSET + i)
+
+
+@lru_cache(maxsize=LAYOUT_CACHE_SIZE)
+def guild_layout(seed: int, i: int) -> GuildLayout:
+    """The categories, channels and threads of guild `i`. Don't mutate it."""
+    rng = random.Random(seed * 1_000_003 + i)
+    n = 1
+    categories = []
+    for _ in range(min(1 + int(rng.paretovariate(1.5)), 40)):
+        category = snowflake(i * MAX_CONTAINERS + n)
+        n += 1
+        channels = []
+        for _ in range(rng.randint(1, 12)):
+            channel = snowflake(i * MAX_CONTAINERS + n)
+            n += 1
+            threads = []
+            for _ in range(int(rng.expovariate(0.7))):
+                if n >= MAX_CONTAINERS:
+                    break
+                threads.append(snowflake(i * MAX_CONTAINERS + n))
+                n += 1
+            channels.append((channel, threads))
+            if n >= MAX_CONTAINERS - 64:
+                break
+        categories.append((category, channels))
+        if n >= MAX_CONTAINERS - 64:
+            break
+    return GuildLayout(guild_id(i), categories)
+
+
+def pick(rng: random.Random, weighted: list[tuple[str, float]]) -> str:
+    return rng.choices([v for v, _ in weighted], [w for _, w in weighted])[0]
+
+
+def guild_rows(rng: random.Random, layout: GuildLayout) -> tuple[dict, list[tuple]]:
+    config = {}
+    timing = pick(rng, TIMINGS)
+    if timing != "ala":
+        config[ConfigKey.TIMING.value] = timing
+        config[ConfigKey.TIMEZONE.value] = rng.choice(TIMEZONES)
+        config[ConfigKey.LENGTH.value] = rng.choice(LENGTHS)
+    if timing == "wile":
+        config[ConfigKey.CRON.value] = rng.choice(CRONS)
+    if timing == "mute":
+        config[ConfigKey.SCHEDULES.value] = [
+            [rng.choice(CRONS + ["mun"]), rng.choice(TIMEZONES), rng.choice(LENGTHS)]
+            for _ in range(rng.randint(2, 4))
+        ]
+    if rng.random() < 0.05:
+        config[ConfigKey.CALENDAR.value] = layout.categories[0][1][0][0]
+    if rng.random() < 0.1:
+        config[ConfigKey.ROLE.value] = snowflake(rng.randrange(1 << 30))
+
+    rules = []
+    if rng.random() < 0.3:
+        rules.append((layout.id, layout.id, IjoSiko.GUILD.name, False))
+    # a tree: rules on some categories, exceptions and rules under them
+    for category, channels in layout.categories:
+        if rng.random() < 0.4:
+            rules.append((category, layout.id, IjoSiko.CATEGORY.name, False))
+        for channel, threads in channels:
+            roll = rng.random()
+            if roll < 0.15:
+                rules.append((channel, layout.id, IjoSiko.CHANNEL.name, False))
+            elif roll < 0.25:
+                rules.append((channel, layout.id, IjoSiko.CHANNEL.name, True))
+            for thread in threads:
+                if rng.random() < 0.2:
+                    exception = rng.random() < 0.5
+                    rules.append((thread, layout.id, IjoSiko.THREAD.name, exception))
+    return config, rules
+
+
+def user_rows(
+    rng: random.Random,
+    seed: int,
+    uid: int,
+    guilds: int,
+) -> tuple[dict, list[tuple]]:
+    roll = rng.random()
+    if roll < 0.7:
+        return {}, []  # seen once, never configured
+
+    config = {}
+    if rng.random() < 0.5:
+        config[ConfigKey.RESPONSE.value] = rng.choice(RESPONSES)
+    if rng.random() < 0.2:
+        config[ConfigKey.REACTS.value] = rng.sample(DEFAULT_REACTS, 3)
+    if rng.random() < 0.1:
+        config[ConfigKey.OPENS.value] = ["//"]
+
+    # most set a rule or two; a heavy tail sets hundreds
+    count = 1 + int(rng.paretovariate(1.2)) if roll < 0.99 else rng.randint(100, 500)
+    rules: dict[int, tuple] = {}
+    home = rng.randrange(guilds)
+    for _ in range(count):
+        i = home if rng.random() < 0.8 else rng.randrange(guilds)
+        layout = guild_layout(seed, i)
+        category, channels = rng.choice(layout.categories)
+        channel, threads = rng.choice(channels)
+        ctype, target = rng.choice(
+            [
+                (IjoSiko.GUILD, layout.id),
+                (IjoSiko.CATEGORY, category),
+                (IjoSiko.CHANNEL, channel),
+                (IjoSiko.CHANNEL, channel),
+            ]
+            + [(IjoSiko.THREAD, thread) for thread in threads[:1]]
+        )
+        rules[target] = (target, uid, ctype.name, rng.random() < 0.1)
+    return config, list(rules.values())
+
+
+def sample_place(rng: random.Random, seed: int, guilds: int, users: int) -> Place:
+    layout = guild_layout(seed, rng.randrange(guilds))
+    category, channels = rng.choice(layout.categories)
+    channel, threads = rng.choice(channels)
+    thread = rng.choice(threads) if threads and rng.random() < 0.2 else None
+    return Place(user_id(rng.randrange(users)), layout.id, category, channel, thread)
+
+
+def population(
+    seed: int,
+    guilds: int,
+    users: int,
+) -> Iterator[tuple[int, dict, list[tuple]]]:
+    rng = random.Random(seed)
+    for i in range(guilds):
+        layout = guild_layout(seed, i)
+        yield (layout.id, *guild_rows(rng, layout))
+    for i in range(users):
+        uid = user_id(i)
+        yield (uid, *user_rows(rng, seed, uid, guilds))
+
+
+async def generate_population(
+    path: str,
+    guilds: int,
+    users: int,
+    seed: int = 1234,
+) -> tuple[int, int]:
+    """Write the population to a new database at `path`. Returns (entities, rules)."""
+    if os.path.exists(path):
+        raise FileExistsError(path)
+    db = await TenpoDBFactory(path)  # creates the schema
+    await db.close()
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    n_entities = n_rules = 0
+    entities: list[tuple] = []
+    rules: list[tuple] = []
+
+    def flush():
+        conn.executemany("INSERT INTO entity (id, config) VALUES (?, ?)", entities)
+        conn.executemany(
+            "INSERT INTO rules (id, eid, ctype, exception) VALUES (?, ?, ?, ?)",
+            rules,
+        )
+        entities.clear()
+        rules.clear()
+
+    try:
+        for eid, config, entity_rules in population(seed, guilds, users):
+            entities.append((eid, json.dumps(config)))
+            rules.extend(entity_rules)
+            n_entities += 1
+            n_rules += len(entity_rules)
+            if len(entities) >= BATCH:
+                flush()
+                LOG.info("Wrote %s entities, %s rules", n_entities, n_rules)
+        flush()
+        conn.commit()
+    finally:
+        conn.close()
+    return n_entities, n_rules
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("path", help="database file to create")
+    parser.add_argument("--guilds", type=int, default=10_000)
+    parser.add_argument("--users", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=1234)
+    args = parser.parse_args()
+
+    configure_logger("tenpo")
+    entities, rules = asyncio.run(
+        generate_population(args.path, args.guilds, args.users, args.seed)
+    )
+    print("Wrote %s entities and %s rules to %s" % (entities, rules, args.path))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+# STL
+import io
+import sys
+import time
+import pstats
+import asyncio
+import cProfile
+import threading
+import tracemalloc
+from typing import Literal
+from collections import Counter
+
+# LOCAL
+from tenpo.log_utils import getLogger
+
+LOG = getLogger()
+
+ProfileMode = Literal["cprofile", "sample"]
+
+MAX_PROFILE_SECONDS = 60
+SAMPLE_INTERVAL = 0.005  # seconds between stack samples
+TOP_FUNCTIONS = 40
+TRACEMALLOC_FRAMES = 10
+TOP_ALLOCATIONS = 25
+
+
+async def run_cprofile(seconds: float) -> str:
+    """
+    cProfile the event loop thread for `seconds`, while the bot runs as
+    usual. Profilers hook one thread each; this one is the loop's.
+    """
+    profile = cProfile.Profile()
+    profile.enable()
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        profile.disable()
+    out = io.StringIO()
+    stats = pstats.Stats(profile, stream=out)
+    _ = stats.sort_stats(pstats.SortKey.CUMULATIVE).print_stats(TOP_FUNCTIONS)
+    _ = stats.sort_stats(pstats.SortKey.TIME).print_stats(TOP_FUNCTIONS)
+    return out.getvalue()
+
+
+class StackSampler:
+    """
+    Samples the stack of one thread from another, every `interval`. Costs
+    the sampled thread almost nothing, but counts samples, not calls, and
+    only sees it where it lets go of the GIL; idle waits are overcounted.
+    """
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples = 0
+        # innermost function of each sample, and every function on it
+        self.own: Counter[str] = Counter()
+        self.total: Counter[str] = Counter()
+        self.stacks: Counter[str] = Counter()
+
+    def sample(self):
+        frame = sys._current_frames().get(self.thread_id)
+        if frame is None:
+            return
+        self.samples += 1
+        names: list[str] = []
+        while frame:
+            code = frame.f_code
+            names.append(
+                "%s (%s:%d)" % (code.co_qualname, code.co_filename, code.co_firstlineno)
+            )
+            frame = frame.f_back
+        self.own[names[0]] += 1
+        self.total.update(set(names))
+        self.stacks[";".join(reversed(names))] += 1
+
+    def run(self, seconds: float):
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            self.sample()
+            time.sleep(self.interval)
+
+    def report(self, limit: int = TOP_FUNCTIONS) -> str:
+        lines = ["%s samples, every %sms" % (self.samples, self.interval * 1000)]
+        for title, counts in (("own", self.own), ("total", self.total)):
+            lines.append("\n%8s %7s  function" % (title, "%"))
+            for name, n in counts.most_common(limit):
+                lines.append("%8d %6.1f%%  %s" % (n, 100 * n / self.samples, name))
+        # collapsed stacks, for flamegraph.pl or speedscope
+        lines.append("\n# collapsed stacks")
+        lines.extend("%s %d" % (stack, n) for stack, n in self.stacks.most_common())
+        return "\n".join(lines)
+
+
+async def run_sampler(seconds: float, interval: float = SAMPLE_INTERVAL) -> str:
+    """Sample the event loop thread's stack for `seconds`, from a worker thread."""
+    sampler = StackSampler(threading.get_ident(), interval)
+    await asyncio.to_thread(sampler.run, seconds)
+    if not sampler.samples:
+        return "No samples taken."
+    return sampler.report()
+
+
+async def profile_loop(seconds: float, mode: ProfileMode) -> str:
+    seconds = min(max(seconds, 1), MAX_PROFILE_SECONDS)
+    LOG.info("Profiling the event loop for %ss with %s", seconds, mode)
+    if mode == "cprofile":
+        return await run_cprofile(seconds)
+    return await run_sampler(seconds)
+
+
+class MemoryTracker:
+    """`tracemalloc` snapshots, each diffed against the one before it."""
+
+    def __init__(self):
+        self.last: tracemalloc.Snapshot | None = None
+
+    def start(self) -> str:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        self.last = tracemalloc.take_snapshot()
+        return "Tracing allocations; %s" % format_traced()
+
+    def diff(self, limit: int = TOP_ALLOCATIONS) -> str:
+        if not tracemalloc.is_tracing() or self.last is None:
+            return "Not tracing; start first."
+        snapshot = tracemalloc.take_snapshot()
+        changes = snapshot.compare_to(self.last, "lineno")
+        self.last = snapshot
+        lines = [format_traced(), "top %s changes since the last snapshot:" % limit]
+        lines.extend(str(change) for change in changes[:limit])
+        return "\n".join(lines)
+
+    def stop(self) -> str:
+        self.last = None
+        if not tracemalloc.is_tracing():
+            return "Not tracing."
+        tracemalloc.stop()
+        return "Stopped tracing allocations."
+
+
+def format_traced() -> str:
+    current, peak = tracemalloc.get_traced_memory()
+    return "%.1f MiB traced, %.1f MiB peak" % (current / 2**20, peak / 2**20)
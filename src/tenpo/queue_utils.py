@@ -0,0 +1,342 @@
+# STL
+import time
+import asyncio
+from typing import Generic, Literal, TypeVar, NamedTuple
+from collections import Counter, deque
+from collections.abc import Callable, Awaitable
+
+# LOCAL
+from tenpo.log_utils import getLogger
+from tenpo.metrics_utils import METRICS
+
+LOG = getLogger()
+
+K = TypeVar("K")
+T = TypeVar("T")
+
+# what to drop once the queue is full:
+# oldest: the longest queued item
+# stale: every item older than max_age; failing that, the new item
+# priority: the oldest item of the lowest priority, the new item included
+ShedPolicy = Literal["oldest", "stale", "priority"]
+SHED_POLICIES: tuple[ShedPolicy, ...] = ("oldest", "stale", "priority")
+
+QUEUE_DEPTH = METRICS.gauge("tenpo_queue_depth", "Items waiting, by queue.", ("queue",))
+QUEUE_WAIT = METRICS.histogram(
+    "tenpo_queue_wait_seconds", "Time items spent queued, by queue.", ("queue",)
+)
+QUEUE_SHED = METRICS.counter(
+    "tenpo_queue_shed_total",
+    "Items dropped unhandled, by queue and reason.",
+    ("queue", "reason"),
+)
+STAGE_BUSY = METRICS.histogram(
+    "tenpo_stage_busy_seconds", "Time a worker spent on one item, by stage.", ("stage",)
+)
+STAGE_WORKERS = METRICS.gauge("tenpo_stage_workers", "Workers, by stage.", ("stage",))
+
+
+class Entry(NamedTuple, Generic[T]):
+    born: float  # unix time the item came to be, for its age
+    queued: float  # monotonic time it was queued
+    item: T
+
+
+class ShedQueue(Generic[T]):
+    """
+    A bounded FIFO which drops items rather than grow or block its producer.
+    Items have a priority; each priority has its own deque, so shedding the
+    oldest item of the lowest priority is as cheap as shedding the oldest.
+    Items older than `max_age` are dropped when they reach the front, since
+    they would be ignored anyway.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        maxsize: int,
+        policy: ShedPolicy = "oldest",
+        max_age: float = float("inf"),
+        priorities: int = 1,
+    ):
+        assert policy in SHED_POLICIES, policy
+        self.name = name
+        self.maxsize = maxsize
+        self.policy = policy
+        self.max_age = max_age
+        self.lanes: list[deque[Entry[T]]] = [deque() for _ in range(priorities)]
+        self.size = 0
+        self.__ready = asyncio.Event()
+        self.__shed = {
+            reason: QUEUE_SHED.labels(name, reason)
+            for reason in ("oldest", "stale", "priority", "rejected", "expired")
+        }
+        self.__wait = QUEUE_WAIT.labels(name)
+        QUEUE_DEPTH.labels(name).track(lambda: self.size)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __drop(self, lane: int, reason: str):
+        _ = self.lanes[lane].popleft()
+        self.size -= 1
+        self.__shed[reason].inc()
+
+    def __oldest_lane(self) -> int:
+        """The lane whose head was queued first."""
+        heads = [(lane[0].queued, i) for i, lane in enumerate(self.lanes) if lane]
+        return min(heads)[1]
+
+    def __purge_stale(self) -> int:
+        cutoff = time.time() - self.max_age
+        purged = 0
+        for lane in self.lanes:
+            kept = deque(entry for entry in lane if entry.born >= cutoff)
+            purged += len(lane) - len(kept)
+            lane.clear()
+            lane.extend(kept)
+        self.size -= purged
+        self.__shed["stale"].inc(purged)
+        return purged
+
+    def __make_room(self, priority: int) -> bool:
+        """Shed one queued item by policy to make room for one of `priority`."""
+        if self.policy == "oldest":
+            self.__drop(self.__oldest_lane(), "oldest")
+            return True
+        if self.policy == "stale":
+            if self.__purge_stale():
+                return True
+        elif self.policy == "priority":
+            # ties go against the queued item, being older than the new one
+            lowest = next(i for i, lane in enumerate(self.lanes) if lane)
+            if lowest <= priority:
+                self.__drop(lowest, "priority")
+                return True
+        self.__shed["rejected"].inc()
+        return False
+
+    def put(self, item: T, born: float | None = None, priority: int = 0) -> bool:
+        """Queue `item`, shedding by policy if full. False if `item` was shed."""
+        if self.size >= self.maxsize and not self.__make_room(priority):
+            return False
+        now = time.time()
+        self.lanes[priority].append(Entry(born or now, time.monotonic(), item))
+        self.size += 1
+        self.__ready.set()
+        return True
+
+    async def get(self) -> T:
+        """The oldest queued item still young enough to handle."""
+        while True:
+            while not self.size:
+                self.__ready.clear()
+                _ = await self.__ready.wait()
+            lane = self.__oldest_lane()
+            entry = self.lanes[lane].popleft()
+            self.size -= 1
+            if time.time() - entry.born > self.max_age:
+                self.__shed["expired"].inc()
+                continue
+            self.__wait.observe(time.monotonic() - entry.queued)
+            return entry.item
+
+
+class StageQueue(Generic[T]):
+    """
+    A bounded FIFO between two stages. Putting waits for room, so a slow
+    stage holds back the one before it rather than drop work already done;
+    only the first queue sheds.
+    """
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.__queue: asyncio.Queue[tuple[float, T]] = asyncio.Queue(maxsize)
+        self.__wait = QUEUE_WAIT.labels(name)
+        QUEUE_DEPTH.labels(name).track(self.__queue.qsize)
+
+    def __len__(self) -> int:
+        return self.__queue.qsize()
+
+    async def put(self, item: T):
+        await self.__queue.put((time.monotonic(), item))
+
+    async def get(self) -> T:
+        queued, item = await self.__queue.get()
+        self.__wait.observe(time.monotonic() - queued)
+        return item
+
+
+class WorkerPool(Generic[T]):
+    """`workers` tasks of the `stage`, each handling one item at a time."""
+
+    def __init__(
+        self,
+        queue: ShedQueue[T] | StageQueue[T],
+        handler: Callable[[T], Awaitable[None]],
+        workers: int,
+        stage: str | None = None,
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.stage = stage or queue.name
+        self.tasks: list[asyncio.Task] = []
+        self.__busy = STAGE_BUSY.labels(self.stage)
+
+    async def __work(self):
+        while True:
+            item = await self.queue.get()
+            start = time.perf_counter()
+            try:
+                await self.handler(item)
+            except Exception as e:
+                LOG.error("Worker of %s failed: %s", self.stage, e)
+            finally:
+                _ = self.__busy.observe_since(start)
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        STAGE_WORKERS.labels(self.stage).set(self.workers)
+        self.tasks = [
+            loop.create_task(self.__work(), name=f"{self.stage}-{i}")
+            for i in range(self.workers)
+        ]
+
+    def stop(self):
+        for task in self.tasks:
+            _ = task.cancel()
+        self.tasks = []
+
+
+class FairScheduler(Generic[K, T]):
+    """
+    Per-key FIFO queues, served by `workers` tasks in deficit round robin:
+    each key's turn adds `quantum` to its deficit, and it is served while
+    its deficit covers the cost of its next item. So one busy key can't
+    starve the rest, and with equal costs this is plain round robin. A key
+    runs at most `per_key` items at once, started in the order they came.
+    Past `maxsize` queued items, the key with the most queued sheds its
+    oldest; a spike is paid for by the key causing it.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        handler: Callable[[T], Awaitable[None]],
+        workers: int,
+        per_key: int = 1,
+        maxsize: int = 10_000,
+        quantum: float = 1.0,
+        stage: str | None = None,
+    ):
+        self.name = name
+        self.stage = stage or name
+        self.handler = handler
+        self.workers = workers
+        self.per_key = per_key
+        self.maxsize = maxsize
+        self.quantum = quantum
+        self.queues: dict[K, deque[tuple[float, float, T]]] = {}  # cost, queued
+        self.ring: deque[K] = deque()  # keys with queued items, in turn order
+        self.deficit: dict[K, float] = {}
+        self.running: Counter[K] = Counter()
+        self.size = 0
+        self.tasks: list[asyncio.Task] = []
+        self.__granted: K | None = None  # whose turn has had its quantum
+        self.__ready = asyncio.Event()
+        self.__shed = QUEUE_SHED.labels(name, "largest")
+        self.__wait = QUEUE_WAIT.labels(name)
+        self.__busy = STAGE_BUSY.labels(self.stage)
+        QUEUE_DEPTH.labels(name).track(lambda: self.size)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __remove(self, key: K):
+        del self.queues[key]
+        self.ring.remove(key)
+        self.deficit.pop(key, None)
+        if self.__granted == key:
+            self.__granted = None
+
+    def __shed_largest(self):
+        key = max(self.queues, key=lambda k: len(self.queues[k]))
+        _ = self.queues[key].popleft()
+        self.size -= 1
+        self.__shed.inc()
+        if not self.queues[key]:
+            self.__remove(key)
+
+    def submit(self, key: K, item: T, cost: float = 1.0):
+        """Queue `item` behind `key`'s others. `cost` must not exceed `quantum`."""
+        if self.size >= self.maxsize:
+            self.__shed_largest()
+        if (queue := self.queues.get(key)) is None:
+            queue = self.queues[key] = deque()
+            self.ring.append(key)
+        queue.append((cost, time.monotonic(), item))
+        self.size += 1
+        self.__ready.set()
+
+    def __turn(self):
+        self.ring.rotate(-1)
+        self.__granted = None
+
+    def __pick(self) -> tuple[K, T] | None:
+        # each key is visited at most twice: once to skip, once to serve
+        for _ in range(2 * len(self.ring)):
+            key = self.ring[0]
+            if self.running[key] >= self.per_key:
+                self.__turn()
+                continue
+            if self.__granted != key:
+                self.deficit[key] = self.deficit.get(key, 0.0) + self.quantum
+                self.__granted = key
+            queue = self.queues[key]
+            cost, queued, item = queue[0]
+            if self.deficit[key] < cost:
+                self.__turn()
+                continue
+            _ = queue.popleft()
+            self.size -= 1
+            self.deficit[key] -= cost
+            self.running[key] += 1
+            if not queue:
+                self.__remove(key)
+            self.__wait.observe(time.monotonic() - queued)
+            return key, item
+        return None
+
+    def __done(self, key: K):
+        self.running[key] -= 1
+        if not self.running[key]:
+            del self.running[key]
+        self.__ready.set()
+
+    async def __work(self):
+        while True:
+            if (picked := self.__pick()) is None:
+                self.__ready.clear()
+                _ = await self.__ready.wait()
+                continue
+            key, item = picked
+            start = time.perf_counter()
+            try:
+                await self.handler(item)
+            except Exception as e:
+                LOG.error("Worker of %s failed for %s: %s", self.stage, key, e)
+            finally:
+                _ = self.__busy.observe_since(start)
+                self.__done(key)
+
+    def start(self, loop: asyncio.AbstractEventLoop):
+        STAGE_WORKERS.labels(self.stage).set(self.workers)
+        self.tasks = [
+            loop.create_task(self.__work(), name=f"{self.stage}-{i}")
+            for i in range(self.workers)
+        ]
+
+    def stop(self):
+        for task in self.tasks:
+            _ = task.cancel()
+        self.tasks = []
@@ -0,0 +1,101 @@
+# STL
+import time
+import asyncio
+from math import inf
+from heapq import heappop, heappush
+from typing import Callable, Awaitable
+
+# LOCAL
+from tenpo.log_utils import getLogger
+
+LOG = getLogger()
+
+# (active, until): whether the window is open, and the epoch second that changes
+Window = tuple[bool, float]
+Resolver = Callable[[int], Awaitable[Window]]
+Subscriber = Callable[[int, bool], Awaitable[None]]
+
+
+class Schedule:
+    """
+    The event window state of every timed entity, kept as a heap of
+    (next transition, eid). Lookups are a dict read; `run` sleeps until the
+    earliest transition, re-resolves that entity, and tells subscribers
+    whenever a window opens or closes.
+    """
+
+    def __init__(self):
+        self.__heap: list[tuple[float, int]] = []
+        self.__windows: dict[int, Window] = {}
+        self.__subscribers: list[Subscriber] = []
+        self.__wake = asyncio.Event()
+        self.__tasks: set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self.__windows)
+
+    def get(self, eid: int, now: float | None = None) -> bool | None:
+        """Whether `eid` is in a window, or None if that must be resolved."""
+        window = self.__windows.get(eid)
+        if window is None:
+            return None
+        if (now or time.time()) >= window[1]:
+            return None
+        return window[0]
+
+    def set(self, eid: int, active: bool, until: float):
+        prev = self.__windows.get(eid)
+        self.__windows[eid] = (active, until)
+        if until != inf:
+            heappush(self.__heap, (until, eid))
+            self.__wake.set()
+        if prev is not None and prev[0] != active:
+            self.__publish(eid, active)
+
+    def invalidate(self, eid: int):
+        """Re-resolve `eid` now, e.g. because its timing config changed."""
+        if (window := self.__windows.get(eid)) is None:
+            return
+        now = time.time()
+        self.__windows[eid] = (window[0], now)
+        heappush(self.__heap, (now, eid))
+        self.__wake.set()
+
+    def invalidate_all(self):
+        for eid in list(self.__windows):
+            self.invalidate(eid)
+
+    def subscribe(self, subscriber: Subscriber):
+        self.__subscribers.append(subscriber)
+
+    def __publish(self, eid: int, active: bool):
+        LOG.info("Event window for %s is now %s", eid, "open" if active else "closed")
+        for subscriber in self.__subscribers:
+            task = asyncio.create_task(subscriber(eid, active))
+            # keep a reference so the task isn't collected mid-flight
+            self.__tasks.add(task)
+            task.add_done_callback(self.__tasks.discard)
+
+    async def run(self, resolve: Resolver):
+        """Wake at each transition and re-resolve whoever it belongs to."""
+        while True:
+            now = time.time()
+            while self.__heap and self.__heap[0][0] <= now:
+                until, eid = heappop(self.__heap)
+                window = self.__windows.get(eid)
+                if window is None or window[1] != until:
+                    continue  # superseded by a later `set`
+                try:
+                    active, until = await resolve(eid)
+                except Exception as e:
+                    LOG.error("Couldn't resolve event window for %s: %s", eid, e)
+                    _ = self.__windows.pop(eid, None)
+                    continue
+                self.set(eid, active, until)
+
+            self.__wake.clear()
+            delay = self.__heap[0][0] - time.time() if self.__heap else None
+            try:
+                _ = await asyncio.wait_for(self.__wake.wait(), timeout=delay)
+            except TimeoutError:
+                pass
@@ -0,0 +1,73 @@
+"""
+Split an existing database into shards for `DB_SHARDS`.
+
+    python -m tenpo.shard_utils tenpobot.sqlite 4
+
+writes `tenpobot.0.sqlite` through `tenpobot.3.sqlite` and leaves the
+original alone. Stop the bot first; writes made during the split are lost.
+"""
+
+# STL
+import os
+import asyncio
+import sqlite3
+import argparse
+
+# LOCAL
+from tenpo.db import TenpoDBFactory, shard_path
+from tenpo.log_utils import getLogger, configure_logger
+
+LOG = getLogger()
+
+# entity and its rules must land together; both are routed by entity id
+SHARDED_TABLES = {
+    "entity": ("id", "id, config"),
+    "rules": ("eid", "id, eid, ctype, exception"),
+}
+
+
+async def split_database(source: str, shards: int) -> list[str]:
+    if shards < 2:
+        raise ValueError("Need at least 2 shards to split into")
+    if not os.path.exists(source):
+        raise FileNotFoundError(source)
+
+    paths = [shard_path(source, i, shards) for i in range(shards)]
+    if existing := [path for path in paths if os.path.exists(path)]:
+        raise FileExistsError("Refusing to overwrite shards: %s" % existing)
+
+    # creates the schema in every shard
+    for path in paths:
+        db = await TenpoDBFactory(path)
+        await db.close()
+
+    for i, path in enumerate(paths):
+        conn = sqlite3.connect(path)
+        try:
+            conn.execute("ATTACH DATABASE ? AS src", (source,))
+            for table, (key, columns) in SHARDED_TABLES.items():
+                cursor = conn.execute(
+                    f"INSERT INTO {table} ({columns}) "
+                    f"SELECT {columns} FROM src.{table} WHERE {key} % ? = ?",
+                    (shards, i),
+                )
+                LOG.info("Shard %s: copied %s rows of %s", i, cursor.rowcount, table)
+            conn.commit()
+        finally:
+            conn.close()
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("source", help="database file to split")
+    parser.add_argument("shards", type=int, help="number of shards to write")
+    args = parser.parse_args()
+
+    configure_logger("tenpo")
+    paths = asyncio.run(split_database(args.source, args.shards))
+    print("Wrote %s. Set DB_SHARDS=%s to use them." % (", ".join(paths), args.shards))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Where startup time goes: every import, cog load and init step.
+
+    STARTUP_PROFILE=1 python -m tenpo
+
+Read from the real environment, not `.env`, since imports start before
+dotenv is loaded. Only the standard library is imported here, so the
+hook is in place before anything heavy.
+"""
+
+# STL
+import os
+import sys
+import time
+import builtins
+from typing import NamedTuple
+from contextlib import contextmanager
+
+STARTUP_BUDGET = float(os.getenv("STARTUP_BUDGET") or 5.0)  # seconds to ready
+TOP_IMPORTS = 25
+
+
+class Timing(NamedTuple):
+    kind: str  # import, cog, init
+    name: str
+    seconds: float  # including anything it started
+    own: float  # excluding anything timed under it
+
+
+class StartupProfile:
+    def __init__(self, enabled: bool):
+        self.enabled = enabled
+        self.start = time.perf_counter()
+        self.timings: list[Timing] = []
+        # time taken by what ran under each open timing
+        self.__nested: list[float] = []
+        self.__import = builtins.__import__
+        if enabled:
+            builtins.__import__ = self.__timed_import
+
+    def __record(self, kind: str, name: str, start: float):
+        elapsed = time.perf_counter() - start
+        own = elapsed - self.__nested.pop()
+        if self.__nested:
+            self.__nested[-1] += elapsed
+        self.timings.append(Timing(kind, name, elapsed, own))
+
+    def __timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        # relative or already imported: a dict lookup, not worth timing
+        if level or name in sys.modules:
+            return self.__import(name, globals, locals, fromlist, level)
+        start = time.perf_counter()
+        self.__nested.append(0.0)
+        try:
+            return self.__import(name, globals, locals, fromlist, level)
+        finally:
+            self.__record("import", name, start)
+
+    @contextmanager
+    def step(self, kind: str, name: str):
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        self.__nested.append(0.0)
+        try:
+            yield
+        finally:
+            self.__record(kind, name, start)
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.start
+
+    def finish(self):
+        """Stop timing imports."""
+        if builtins.__import__ == self.__timed_import:
+            builtins.__import__ = self.__import
+
+    def report(self, stage: str, budget: float = STARTUP_BUDGET) -> str:
+        elapsed = self.elapsed()
+        verdict = "within" if elapsed <= budget else "OVER"
+        lines = [
+            "%s after %.3fs, %s the %.1fs budget" % (stage, elapsed, verdict, budget),
+            "%-7s %-40s %9s %9s" % ("kind", "name", "total ms", "own ms"),
+        ]
+        steps = [t for t in self.timings if t.kind != "import"]
+        imports = sorted(
+            (t for t in self.timings if t.kind == "import"),
+            key=lambda t: t.own,
+            reverse=True,
+        )
+        for t in steps + imports[:TOP_IMPORTS]:
+            lines.append(
+                "%-7s %-40s %9.1f %9.1f"
+                % (t.kind, t.name[:40], t.seconds * 1000, t.own * 1000)
+            )
+        return "\n".join(lines)
+
+
+STARTUP = StartupProfile(enabled=bool(os.getenv("STARTUP_PROFILE")))
@@ -39,6 +39,7 @@ TIMING_MAP = {
     "ala": "mi lukin ala e toki",
     "mun": "mi lukin lon ni: mun suli li pimeja ale li suno ale",
     "wile": "mi lukin lon tenpo wile tan ilo `/lawa_ma tenpo`",
+    "mute": "mi lukin lon tenpo ale tan ilo `/lawa_ma tenpo_mute`",
 }
 
 BANNED_REACTS = [
@@ -0,0 +1,160 @@
+# STL
+from math import inf
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import islice
+from collections.abc import Iterable, Generator
+
+# LOCAL
+from tenpo.log_utils import getLogger
+from tenpo.phase_utils import PhaseTimer, get_phase_timer
+from tenpo.metrics_utils import track_lru_cache
+from tenpo.croniter_utils import (
+    TIMER_CACHE_SIZE,
+    EventTimer,
+    parse_timezone,
+    get_event_timer,
+)
+
+LOG = getLogger()
+
+# in place of a cron, opens the window at every new and full moon
+MOON = "mun"
+# how far ahead windows are merged, and the most taken from one schedule
+MERGE_HORIZON = timedelta(days=60)
+MAX_WINDOWS = 500
+
+# (cron or MOON, timezone, length)
+ScheduleConfig = tuple[str, str, str]
+Interval = tuple[float, float]
+
+
+def get_schedule_timer(config: ScheduleConfig) -> EventTimer | PhaseTimer:
+    cron, timezone, length = config
+    if cron.strip() == MOON:
+        return get_phase_timer(timezone, length)
+    return get_event_timer(cron, timezone, length)
+
+
+def merge_intervals(intervals: Iterable[Interval]) -> list[Interval]:
+    """Sorted, non-overlapping union of `intervals`; touching ones are joined."""
+    merged: list[Interval] = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class MultiTimer:
+    """
+    Several schedules at once, as the union of their windows. The windows
+    from a reference time to `MERGE_HORIZON` past it are merged into one
+    sorted list of disjoint intervals, so whether an event is on is a single
+    bisect however many schedules there are. Queries past the merged span
+    rebuild it around their own ref.
+    """
+
+    def __init__(self, configs: Iterable[ScheduleConfig]):
+        self.configs = tuple(configs)
+        if not self.configs:
+            raise ValueError("A MultiTimer needs at least one schedule")
+        self.__timers = [get_schedule_timer(config) for config in self.configs]
+        self.__tz = parse_timezone(self.configs[0][1])
+        self.__starts: list[float] = []
+        self.__ends: list[float] = []
+        self.__valid_from = inf
+        self.__valid_to = -inf
+
+    def __build(self, ref: datetime):
+        until = ref + MERGE_HORIZON
+        valid_to = until.timestamp()
+        intervals: list[Interval] = []
+        for timer in self.__timers:
+            # the window before `ref` too, since it may still be open
+            start, end = timer.get_prev_range(ref)
+            intervals.append((start.timestamp(), end.timestamp()))
+            for start, end in islice(timer.iter_events(ref), MAX_WINDOWS):
+                intervals.append((start.timestamp(), end.timestamp()))
+                if start > until:
+                    break
+            else:
+                # ran out short of the horizon; later windows are unknown
+                valid_to = min(valid_to, start.timestamp())
+
+        merged = merge_intervals(intervals)
+        self.__starts = [start for start, _ in merged]
+        self.__ends = [end for _, end in merged]
+        self.__valid_from = ref.timestamp()
+        self.__valid_to = valid_to
+        LOG.debug(
+            "Merged %s schedules into %s windows", len(self.__timers), len(merged)
+        )
+
+    def __ts(self, ref: datetime | None) -> float:
+        if not ref:
+            ref = datetime.now(tz=self.__tz)
+        ts = ref.timestamp()
+        if not self.__valid_from <= ts < self.__valid_to:
+            self.__build(ref)
+        return ts
+
+    def __range(self, i: int) -> tuple[datetime, datetime]:
+        return (
+            datetime.fromtimestamp(self.__starts[i], tz=self.__tz),
+            datetime.fromtimestamp(self.__ends[i], tz=self.__tz),
+        )
+
+    def get_prev_range(self, ref: datetime | None = None) -> tuple[datetime, datetime]:
+        """The last merged window starting strictly before `ref`."""
+        ts = self.__ts(ref)
+        return self.__range(bisect_left(self.__starts, ts) - 1)
+
+    def get_next_range(self, ref: datetime | None = None) -> tuple[datetime, datetime]:
+        """The first merged window starting strictly after `ref`."""
+        ts = self.__ts(ref)
+        i = bisect_right(self.__starts, ts)
+        if i == len(self.__starts) or self.__starts[i] >= self.__valid_to:
+            self.__build(datetime.fromtimestamp(ts, tz=self.__tz))
+            i = bisect_right(self.__starts, ts)
+        return self.__range(i)
+
+    def get_next(self, ref: datetime | None = None) -> datetime:
+        return self.get_next_range(ref)[0]
+
+    def iter_events(
+        self,
+        ref: datetime | None = None,
+    ) -> Generator[tuple[datetime, datetime], None, None]:
+        start = ref or datetime.now(tz=self.__tz)
+        while True:
+            start, end = self.get_next_range(start)
+            yield start, end
+
+    def get_events_from(
+        self,
+        n: int = 3,
+        ref: datetime | None = None,
+    ) -> Generator[tuple[datetime, datetime], None, None]:
+        yield from islice(self.iter_events(ref), n)
+
+    def is_event_on(self, ref: datetime | None = None) -> bool:
+        ts = self.__ts(ref)
+        i = bisect_right(self.__starts, ts) - 1
+        return i >= 0 and ts < self.__ends[i]
+
+
+@lru_cache(maxsize=TIMER_CACHE_SIZE)
+def _cached_multi_timer(configs: tuple[ScheduleConfig, ...]) -> MultiTimer:
+    return MultiTimer(configs)
+
+
+track_lru_cache("multi_timer", _cached_multi_timer)
+
+
+def get_multi_timer(configs: Iterable[ScheduleConfig]) -> MultiTimer:
+    """The shared timer for this list of schedules, like `get_event_timer`."""
+    return _cached_multi_timer(tuple(tuple(config) for config in configs))
@@ -0,0 +1,248 @@
+"""
+Replay a corpus of messages through `should_respond` without Discord.
+
+    python tests/replay.py corpus.jsonl
+    python tests/replay.py --synthetic 20000
+    make profile  # the same under kernprof, line by line
+
+Each corpus line is one message:
+
+    {"content": "toki a", "author": 1, "guild": 10, "channel": 100,
+     "category": 1000, "thread": null, "roles": [], "bot": false, "age": 5}
+
+Messages become lightweight fakes of `Message`, `Guild`, `Member` and
+`Thread`, and run against a fresh `TenpoDB(":memory:")` seeded with
+synthetic rules for the guilds and authors they mention. Reported are
+messages per second through `should_respond`, and latency percentiles
+of each of its stages.
+"""
+
+# STL
+import os
+import json
+import time
+import random
+import asyncio
+import argparse
+import builtins
+import importlib
+from datetime import UTC, datetime, timedelta
+from statistics import quantiles
+from collections import defaultdict
+from collections.abc import Iterable
+
+# the cog imports the bot's entrypoint, which wants these
+os.environ.setdefault("DISCORD_TOKEN", "replay")
+os.environ.setdefault("DB_FILE", ":memory:")
+
+# PDM
+from discord import Thread, MessageType
+
+# LOCAL
+from tenpo.db import IjoSiko, TenpoDB, TenpoDBFactory
+from tenpo.toki_pona_utils import is_toki_pona
+
+COG = importlib.import_module("tenpo.cogs.o-toki-pona-taso.cog")
+STAGES = ("preconditions", "guild policy", "user policy", "classification")
+
+TOKI_PONA = [
+    "toki! mi jan pona sina",
+    "sina pona ala pona?",
+    "mi wile moku e kili",
+    "tenpo suno ni li pona mute",
+    "o lukin e lipu ni",
+]
+NOT_TOKI_PONA = [
+    "hello everyone!",
+    "does anyone know how to say cat?",
+    "mi wile eat food",
+    "lol",
+    "good morning all",
+]
+
+
+class FakeGuild:
+    def __init__(self, id: int):
+        self.id = id
+
+
+class FakeMember:
+    def __init__(self, id: int, roles: Iterable[int], bot: bool = False):
+        self.id = id
+        self.bot = bot
+        self.name = str(id)
+        self.roles = set(roles)
+
+    def get_role(self, role: int) -> int | None:
+        return role if role in self.roles else None
+
+
+class FakeChannel:
+    def __init__(self, id: int, category_id: int | None):
+        self.id = id
+        self.category_id = category_id
+
+
+class FakeThread(Thread):
+    """Passes `isinstance(channel, Thread)` without any client state."""
+
+    category_id = None  # shadows Thread's property
+
+    def __init__(self, id: int, parent_id: int, category_id: int | None):
+        self.id = id
+        self.parent_id = parent_id
+        self.category_id = category_id
+
+
+class FakeMessage:
+    def __init__(self, data: dict):
+        self.content: str = data["content"]
+        self.author = FakeMember(
+            data["author"], data.get("roles", []), data.get("bot", False)
+        )
+        self.guild = FakeGuild(data["guild"]) if data.get("guild") else None
+        category = data.get("category")
+        if thread := data.get("thread"):
+            self.channel = FakeThread(thread, data["channel"], category)
+        else:
+            self.channel = FakeChannel(data["channel"], category)
+        self.type = MessageType.default
+        self.created_at = datetime.now(UTC) - timedelta(seconds=data.get("age", 0))
+
+
+def synthetic_corpus(n: int, seed: int = 1234) -> list[dict]:
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(n):
+        guild = rng.randrange(20)
+        channel = guild * 100 + rng.randrange(10)
+        corpus.append(
+            {
+                "content": rng.choice(rng.choice([TOKI_PONA, NOT_TOKI_PONA])),
+                "author": 10_000 + rng.randrange(500),
+                "guild": 1 + guild,
+                "channel": 100_000 + channel,
+                "category": 200_000 + channel // 5,
+                "thread": 300_000 + channel if rng.random() < 0.1 else None,
+                "roles": [7] if rng.random() < 0.5 else [],
+                "bot": rng.random() < 0.02,
+                "age": rng.expovariate(1 / 60),
+            }
+        )
+    return corpus
+
+
+def load_corpus(path: str) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def seed(db: TenpoDB, corpus: list[dict]):
+    """
+    Every guild checks its whole guild, minus one channel; every fourth only
+    checks members with role 7. Every third author opted in on their guild.
+    """
+    channels: dict[int, set[int]] = defaultdict(set)
+    authors: dict[int, int] = {}
+    for message in corpus:
+        if guild := message.get("guild"):
+            channels[guild].add(message["channel"])
+            authors.setdefault(message["author"], guild)
+
+    for guild, guild_channels in channels.items():
+        await db.set_timing(guild, "ale")
+        await db.upsert_rule(guild, IjoSiko.GUILD, guild)
+        excepted = min(guild_channels)
+        await db.upsert_rule(excepted, IjoSiko.CHANNEL, guild, exception=True)
+        if guild % 4 == 0:
+            await db.set_role(guild, 7)
+    for author, guild in authors.items():
+        if author % 3 == 0:
+            await db.upsert_rule(guild, IjoSiko.GUILD, author)
+            await db.toggle_open(author, "//")
+
+
+async def staged(message: FakeMessage, timings: dict[str, list[float]]) -> bool:
+    """`should_respond`, stage by stage, timing each."""
+    start = time.perf_counter()
+    ok = await COG.preconditions(message)
+    timings["preconditions"].append(time.perf_counter() - start)
+    if not ok:
+        return False
+
+    spoilers: set[bool] = set()
+    for stage, check, eid in (
+        ("guild policy", COG.should_check_guild, message.guild.id),
+        ("user policy", COG.should_check_user, message.author.id),
+    ):
+        start = time.perf_counter()
+        if await check(message):
+            spoilers.add(await COG.DB.get_spoilers(eid))
+        timings[stage].append(time.perf_counter() - start)
+    if not spoilers:
+        return False
+
+    start = time.perf_counter()
+    bad = any(not is_toki_pona(message.content, spoilers=s) for s in spoilers)
+    timings["classification"].append(time.perf_counter() - start)
+    return bad
+
+
+def report(name: str, samples: list[float]):
+    if len(samples) < 2:
+        print("%-16s %8d" % (name, len(samples)))
+        return
+    cuts = quantiles(samples, n=100)
+    print(
+        "%-16s %8d %9.1f %9.1f %9.1f"
+        % (name, len(samples), cuts[49] * 1e6, cuts[94] * 1e6, cuts[98] * 1e6)
+    )
+
+
+async def replay(corpus: list[dict]):
+    db = await TenpoDBFactory(":memory:")
+    COG.DB = db
+    await seed(db, corpus)
+    messages = [FakeMessage(data) for data in corpus]
+
+    # warm the caches, then a straight run for throughput
+    for message in messages:
+        _ = await COG.should_respond(message)
+    start = time.perf_counter()
+    verdicts = [await COG.should_respond(message) for message in messages]
+    elapsed = time.perf_counter() - start
+
+    timings: dict[str, list[float]] = {stage: [] for stage in STAGES}
+    staged_verdicts = [await staged(message, timings) for message in messages]
+    assert staged_verdicts == verdicts, "staged replay drifted from should_respond"
+
+    print(
+        "%s messages in %.3fs: %.0f msgs/sec, %s responded to"
+        % (len(messages), elapsed, len(messages) / elapsed, sum(verdicts))
+    )
+    print("%-16s %8s %9s %9s %9s" % ("stage", "count", "p50 us", "p95 us", "p99 us"))
+    for stage in STAGES:
+        report(stage, timings[stage])
+    await db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("corpus", nargs="?", help="JSONL file of messages")
+    parser.add_argument("--synthetic", type=int, default=5000, help="else, this many")
+    args = parser.parse_args()
+
+    # under kernprof, profile every stage line by line
+    if line_profile := getattr(builtins, "profile", None):
+        for name in ("preconditions", "should_check_guild", "should_check_user"):
+            setattr(COG, name, line_profile(getattr(COG, name)))
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        corpus = synthetic_corpus(args.synthetic)
+    asyncio.run(replay(corpus))
+
+
+if __name__ == "__main__":
+    main()
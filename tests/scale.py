@@ -0,0 +1,129 @@
+"""
+Sweep population size against the latency of the DB's hot calls.
+
+    python tests/scale.py --guilds 1000 10000 100000 --users-per-guild 10
+
+Each population is generated once with `tenpo.population_utils` into
+--dir and reused by later runs. Calls ask about random, real places in
+it, so the caches hit about as often as they would in production.
+`in_checked_channel` is reported warm, straight after `list_rules` for
+the same entity, and cold, for entities nothing has touched yet.
+"""
+
+# STL
+import os
+import time
+import random
+import asyncio
+import argparse
+from statistics import quantiles
+
+# LOCAL
+from tenpo.db import TenpoDB, TenpoDBFactory
+from tenpo.population_utils import Place, sample_place, generate_population
+
+CALLS = (
+    "list_rules",
+    "in_checked_channel cold",
+    "in_checked_channel warm",
+    "is_event_time",
+    "get_calendars",
+)
+
+
+async def measure(
+    db: TenpoDB,
+    seed: int,
+    guilds: int,
+    users: int,
+    n: int,
+) -> dict[str, list[float]]:
+    rng = random.Random(seed)
+    timings: dict[str, list[float]] = {call: [] for call in CALLS}
+    touched: set[int] = set()
+
+    async def check(call: str, eid: int, place: Place):
+        start = time.perf_counter()
+        _ = await db.in_checked_channel(
+            eid, place.thread, place.channel, place.category, place.guild
+        )
+        timings[call].append(time.perf_counter() - start)
+
+    for _ in range(n):
+        place = sample_place(rng, seed, guilds, users)
+        eid = place.user if rng.random() < 0.5 else place.guild
+        touched.add(eid)
+
+        start = time.perf_counter()
+        _ = await db.list_rules(eid)
+        timings["list_rules"].append(time.perf_counter() - start)
+        # right after `list_rules`, so its rules are always cached
+        await check("in_checked_channel warm", eid, place)
+
+        # a second place, checked only if nothing has cached its rules yet
+        place = sample_place(rng, seed, guilds, users)
+        eid = place.user if rng.random() < 0.5 else place.guild
+        if eid not in touched:
+            touched.add(eid)
+            await check("in_checked_channel cold", eid, place)
+
+        start = time.perf_counter()
+        _ = await db.is_event_time(place.guild)
+        timings["is_event_time"].append(time.perf_counter() - start)
+
+    # a scan of every entity; a few are enough
+    for _ in range(max(n // 200, 3)):
+        start = time.perf_counter()
+        _ = await db.get_calendars()
+        timings["get_calendars"].append(time.perf_counter() - start)
+    return timings
+
+
+def format_row(guilds: int, call: str, samples: list[float]) -> str:
+    if len(samples) < 2:  # every entity was touched before it was drawn again
+        return "%9d %-24s %7d" % (guilds, call, len(samples))
+    cuts = quantiles(samples, n=100)
+    return "%9d %-24s %7d %9.3f %9.3f %9.3f" % (
+        guilds,
+        call,
+        len(samples),
+        cuts[49] * 1000,
+        cuts[94] * 1000,
+        cuts[98] * 1000,
+    )
+
+
+async def sweep(sizes: list[int], users_per_guild: int, n: int, seed: int, dir: str):
+    print(
+        "%9s %-24s %7s %9s %9s %9s"
+        % ("guilds", "call", "count", "p50 ms", "p95 ms", "p99 ms")
+    )
+    for guilds in sizes:
+        users = guilds * users_per_guild
+        path = os.path.join(dir, f"population.{seed}.{guilds}.{users}.sqlite")
+        if not os.path.exists(path):
+            entities, rules = await generate_population(path, guilds, users, seed)
+            print("# generated %s entities, %s rules" % (entities, rules))
+
+        db = await TenpoDBFactory(path)
+        timings = await measure(db, seed, guilds, users, n)
+        await db.close()
+        for call in CALLS:
+            print(format_row(guilds, call, timings[call]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--guilds", type=int, nargs="+", default=[1000, 10_000])
+    parser.add_argument("--users-per-guild", type=int, default=10)
+    parser.add_argument("--calls", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("--dir", default=".")
+    args = parser.parse_args()
+    asyncio.run(
+        sweep(args.guilds, args.users_per_guild, args.calls, args.seed, args.dir)
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+# STL
+import time
+from zoneinfo import available_timezones
+
+# PDM
+import pytest
+
+# LOCAL
+from tenpo.autocomplete_utils import AutocompleteIndex, match_score, fuzzy_filter
+
+TIMEZONES = sorted(available_timezones())
+
+
+def test_index_matches_fuzzy_filter():
+    index = AutocompleteIndex(TIMEZONES, limit=len(TIMEZONES))
+    for query in ["a", "am", "amc", "amch", "us/", "xyz", "Eur"]:
+        assert sorted(index.search(query)) == sorted(fuzzy_filter(query, TIMEZONES))
+
+
+def test_index_ranks_best_matches_first():
+    index = AutocompleteIndex(TIMEZONES)
+    assert index.search("utc")[:2] == ["UTC", "Etc/UTC"]
+    assert index.search("us/c")[0] == "US/Central"
+    assert index.search("eur lon")[0] == "Europe/London"
+    assert len(index.search("")) == 25
+
+
+QUERIES = ["a", "am", "ame", "amer", "ameri", "americ", "america/", "america/c"]
+
+
+def test_index_keystrokes_only_rescore_the_last_matches(monkeypatch):
+    scored = 0
+
+    def counted(query: str, lowered: str):
+        nonlocal scored
+        scored += 1
+        return match_score(query, lowered)
+
+    monkeypatch.setattr("tenpo.autocomplete_utils.match_score", counted)
+    index = AutocompleteIndex(TIMEZONES, limit=len(TIMEZONES))
+    matched = len(TIMEZONES)
+    for query in QUERIES:
+        scored = 0
+        found = index.search(query)
+        # once to narrow, once to rank, and only what the last keystroke found
+        assert scored <= 2 * matched
+        matched = len(found)
+    assert matched < len(TIMEZONES) / 10
+
+
+@pytest.mark.slow
+def test_bench_index_keystrokes():
+    def per_keystroke() -> float:
+        index = AutocompleteIndex(TIMEZONES)
+        start = time.perf_counter()
+        for query in QUERIES:
+            _ = index.search(query)
+        return (time.perf_counter() - start) / len(QUERIES)
+
+    assert min(per_keystroke() for _ in range(5)) < 0.001
@@ -0,0 +1,76 @@
+# STL
+import time
+from datetime import UTC, datetime, timedelta
+
+# PDM
+import numpy
+import pytest
+
+# LOCAL
+from tenpo.croniter_utils import EventTimer, get_event_timer
+
+RNG = numpy.random.default_rng(1234)
+STEP = timedelta(days=3)
+
+
+def test_shared_timer_depends_only_on_ref():
+    timer = get_event_timer("0 0 * * 6", "US/Central", "24h")
+    assert timer is get_event_timer(" 0 0 * * 6 ", "US/Central", "24h")
+
+    ref = datetime(2025, 3, 5, 12, tzinfo=UTC)
+    first = timer.get_next_range(ref)
+    # asking about another time in between must not change the answer
+    _ = timer.get_prev(ref + timedelta(days=30))
+    assert timer.get_next_range(ref) == first
+
+    # a ref in another timezone means the same instant
+    assert first[0] == datetime(2025, 3, 8, 6, tzinfo=UTC)
+    assert first[0].utcoffset() == timedelta(hours=-6)
+    assert timer.is_event_on(first[0] + timedelta(hours=1))
+    assert not timer.is_event_on(first[1])
+
+
+@pytest.mark.parametrize("cron", ["0 0 * * 6", "30 18 * * *", "*/5 * * * *"])
+@pytest.mark.parametrize("tz", ["UTC", "Europe/London"])
+def test_occurrence_table_matches_croniter(cron: str, tz: str):
+    plain = EventTimer(cron, tz, "2h")
+    table = EventTimer(cron, tz, "2h", horizon=timedelta(days=90))
+
+    # walk across a DST change, with refs both on and between occurrences
+    ref = datetime(2026, 3, 1, tzinfo=UTC)
+    for _ in range(60):
+        for get in ("get_prev", "get_next"):
+            expected = getattr(plain, get)(ref)
+            found = getattr(table, get)(ref)
+            assert found == expected
+            assert found.utcoffset() == expected.utcoffset()
+        ref = plain.get_next(ref) if RNG.random() < 0.5 else ref + RNG.random() * STEP
+    assert list(table.get_events_from(5, ref)) == list(plain.get_events_from(5, ref))
+
+
+@pytest.mark.slow
+@pytest.mark.parametrize("cron", ["0 0 * * 6", "0 0 * * *"])
+def test_bench_occurrence_table(cron: str):
+    plain = EventTimer(cron, "US/Central", "24h")
+    table = EventTimer(cron, "US/Central", "24h", horizon=timedelta(days=90))
+    now = datetime.now(UTC)
+    # is_event_on as the bot asks it: a few times a minute over a month
+    refs = [now + timedelta(seconds=int(s)) for s in RNG.uniform(0, 30 * 86400, 10_000)]
+
+    timings = {}
+    for name, timer in (("croniter", plain), ("table", table)):
+        start = time.perf_counter()
+        for ref in refs:
+            _ = timer.is_event_on(ref)
+        timings[name] = time.perf_counter() - start
+
+    print(
+        "`%s`, 10k is_event_on: croniter %.3fs, table %.3fs (%.0fx)"
+        % (
+            cron,
+            timings["croniter"],
+            timings["table"],
+            timings["croniter"] / timings["table"],
+        )
+    )
+    assert timings["table"] < timings["croniter"]
@@ -0,0 +1,65 @@
+# STL
+from types import SimpleNamespace
+from datetime import UTC, datetime, timedelta
+
+# PDM
+from discord import ScheduledEventStatus
+
+# LOCAL
+from tenpo.event_utils import DesiredEvent, plan_events
+
+NAME = "tenpo pi toki pona taso"
+DAY = timedelta(days=1)
+START = datetime(2025, 3, 1, tzinfo=UTC)
+
+
+def event(start: datetime, end: datetime, description: str = "", **kwargs):
+    values = dict(
+        name=NAME,
+        status=ScheduledEventStatus.scheduled,
+        start_time=start,
+        end_time=end,
+        description=description,
+    )
+    return SimpleNamespace(**(values | kwargs))
+
+
+def test_plan_events_changes_only_what_differs():
+    desired = [
+        DesiredEvent(START + i * 7 * DAY, START + (i * 7 + 1) * DAY, "")
+        for i in range(3)
+    ]
+    kept = event(desired[0].start + timedelta(microseconds=80), desired[0].end)
+    stale = event(START + 2 * DAY, START + 3 * DAY)
+    longer = event(desired[1].start, desired[1].end + DAY)
+    running = event(START - DAY, START, status=ScheduledEventStatus.active)
+    theirs = event(START + 3 * DAY, START + 4 * DAY, name="movie night")
+    later = event(START + 60 * DAY, START + 61 * DAY)
+
+    existing = [later, longer, stale, running, theirs, kept]
+    ops = plan_events(NAME, existing, desired, START - DAY)
+    assert [(op.kind, op.event) for op in ops] == [
+        ("delete", stale),
+        ("update", longer),
+        ("create", None),
+    ]
+    assert ops[1].desired == desired[1]
+    assert ops[2].desired == desired[2]
+
+    assert plan_events(NAME, [kept], desired[:1], START - DAY) == []
+
+
+def test_plan_events_leaves_started_events_alone():
+    now = START + timedelta(seconds=1)
+    # Discord hasn't marked it active yet
+    starting = event(START, START + DAY)
+    upcoming = DesiredEvent(START + 7 * DAY, START + 8 * DAY, "")
+    unplanned = event(START - DAY, START + 2 * DAY)
+
+    ops = plan_events(NAME, [starting, unplanned], [upcoming], now)
+    assert [(op.kind, op.desired) for op in ops] == [("create", upcoming)]
+
+    current = DesiredEvent(START, START + 2 * DAY, "")
+    ops = plan_events(NAME, [starting], [current, upcoming], now)
+    assert [(op.kind, op.desired) for op in ops] == [("create", upcoming)]
+    assert plan_events(NAME, [], [current], now) == []
@@ -0,0 +1,69 @@
+# STL
+import os
+import asyncio
+import importlib
+from types import SimpleNamespace
+from collections import Counter
+
+# the cog imports the bot's entrypoint, which wants these
+os.environ.setdefault("DISCORD_TOKEN", "test")
+os.environ.setdefault("DB_FILE", ":memory:")
+
+# PDM
+import pytest
+from discord import ScheduledEventStatus
+
+# LOCAL
+from tenpo.db import TenpoDBFactory
+
+COG = importlib.import_module("tenpo.cogs.events.cog")
+
+
+class FakeGuild:
+    """Keeps its events only where `fetch_scheduled_events` can see them."""
+
+    def __init__(self, guild_id: int):
+        self.id = guild_id
+        self.name = "ma"
+        self.scheduled_events = []  # the cache, which nothing updates
+        self.events = []
+        self.writes = 0
+
+    async def fetch_scheduled_events(self):
+        return list(self.events)
+
+    async def create_scheduled_event(self, **kwargs):
+        self.writes += 1
+        event = SimpleNamespace(status=ScheduledEventStatus.scheduled, **kwargs)
+
+        async def edit(**changes):
+            self.writes += 1
+            vars(event).update(changes)
+
+        async def delete():
+            self.writes += 1
+            self.events.remove(event)
+
+        event.edit, event.delete = edit, delete
+        self.events.append(event)
+        return event
+
+
+@pytest.mark.asyncio
+async def test_reconcile_twice_changes_nothing_the_second_time(monkeypatch):
+    db = await TenpoDBFactory(":memory:")
+    monkeypatch.setattr(COG, "DB", db)
+    guild = FakeGuild(1)
+    await db.set_timing(guild.id, "wile")
+    await db.set_cron(guild.id, "0 0 * * *")
+
+    cog = object.__new__(COG.CogEvents)  # skip starting the reconcile loop
+    cog.writes, cog.outcomes = {}, Counter()
+    cog.limit = asyncio.Semaphore(COG.EVENT_CONCURRENCY)
+
+    first = await cog.reconcile_guild(guild)
+    assert [op.kind for op in first] == ["create"] * COG.EVENT_LIMIT
+    assert len(guild.events) == guild.writes == COG.EVENT_LIMIT
+
+    assert await cog.reconcile_guild(guild) == []
+    assert guild.writes == COG.EVENT_LIMIT
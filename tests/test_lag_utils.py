@@ -0,0 +1,32 @@
+# STL
+import time
+import asyncio
+
+# PDM
+import pytest
+
+# LOCAL
+from tenpo.lag_utils import LagMonitor, format_stalls
+
+
+async def block_loop(seconds: float):
+    time.sleep(seconds)
+
+
+@pytest.mark.asyncio
+async def test_lag_monitor_catches_the_stalling_coroutine():
+    monitor = LagMonitor(interval=0.02, threshold=0.1)
+    task = asyncio.create_task(monitor.run())
+    await asyncio.sleep(0.1)
+    await block_loop(0.3)
+    await asyncio.sleep(0.1)
+    _ = task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    [stall] = monitor.worst()
+    assert 0.25 < stall.lag < 1.0
+    # taken while the loop was stuck, not once it was free again
+    assert "block_loop" in stall.stack
+    assert "block_loop" in format_stalls(monitor.worst())
+    assert monitor.stopped.is_set()
@@ -0,0 +1,46 @@
+# STL
+import queue
+import logging
+
+# LOCAL
+from tenpo.log_utils import SampleFilter, DeferredQueueHandler, with_exc_info
+
+
+def queued_logger(name: str) -> tuple[logging.Logger, queue.SimpleQueue]:
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    log = logging.getLogger(name)
+    log.setLevel(logging.DEBUG)
+    log.propagate = False
+    log.addHandler(DeferredQueueHandler(records))
+    return log, records
+
+
+def test_tracebacks_only_for_real_exceptions():
+    log, records = queued_logger("tenpo.test.exc_info")
+    error = with_exc_info(log.error)
+
+    error("no exception %s", 1)
+    try:
+        raise ValueError("real")
+    except ValueError:
+        error("handling %s", 2)
+
+    calm, handling = records.get_nowait(), records.get_nowait()
+    assert not calm.exc_info and not calm.stack_info
+    assert handling.exc_info and handling.exc_info[0] is ValueError
+    # attributed to the caller, and formatted only once the listener asks
+    assert calm.filename == "test_log_utils.py"
+    assert calm.args == (1,) and calm.getMessage() == "no exception 1"
+
+
+def test_sample_debug_lines_per_call_site():
+    log, records = queued_logger("tenpo.test.sample")
+    log.addFilter(SampleFilter(10))
+    for i in range(100):
+        log.debug("often %s", i)
+        log.info("always")
+    kept = [records.get_nowait() for _ in range(records.qsize())]
+    assert [r.args[0] for r in kept if r.levelno == logging.DEBUG] == list(
+        range(0, 100, 10)
+    )
+    assert sum(r.levelno == logging.INFO for r in kept) == 100
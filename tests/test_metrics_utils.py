@@ -0,0 +1,79 @@
+# STL
+import asyncio
+
+# PDM
+import pytest
+
+# LOCAL
+from tenpo.metrics_utils import (
+    Registry,
+    CallStats,
+    serve_metrics,
+    format_call_stats,
+    render_call_stats,
+)
+
+
+def test_render_prometheus_text():
+    registry = Registry()
+    counter = registry.counter("t_total", "Things.", ("kind",))
+    counter.labels('a "b"').inc(3)
+    registry.gauge("t_depth", "Depth.").labels().track(lambda: 7)
+    histogram = registry.histogram("t_seconds", "Time.", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 2.0):
+        histogram.labels().observe(value)
+    # families are shared by name
+    assert registry.counter("t_total", "Things.", ("kind",)) is counter
+
+    lines = registry.render().splitlines()
+    assert "# TYPE t_total counter" in lines
+    assert 't_total{kind="a \\"b\\""} 3' in lines
+    assert "t_depth 7" in lines
+    assert 't_seconds_bucket{le="0.1"} 2' in lines
+    assert 't_seconds_bucket{le="1.0"} 3' in lines
+    assert 't_seconds_bucket{le="+Inf"} 4' in lines
+    assert "t_seconds_sum 2.65" in lines
+    assert "t_seconds_count 4" in lines
+
+
+def test_render_call_stats():
+    stats = CallStats()
+    stats.calls = 2
+    stats.latency.observe(0.001)
+    lines = list(render_call_stats({"get_role": stats}, "t_db"))
+    assert 't_db_calls_total{method="get_role"} 2' in lines
+    assert 't_db_seconds_count{method="get_role"} 1' in lines
+
+
+def test_format_call_stats_ranks_by_total_time():
+    slow, fast, idle = CallStats(), CallStats(), CallStats()
+    slow.calls, slow.statements, slow.rows = 1, 4, 3
+    slow.latency.observe(0.02)
+    fast.calls, fast.errors, fast.statements = 3, 1, 3
+    for _ in range(3):
+        fast.latency.observe(0.001)
+    stats = {"get_role": fast, "a_rather_long_method_name_indeed": slow, "x": idle}
+
+    lines = format_call_stats(stats, limit=2).splitlines()
+    assert lines[0].split()[:5] == ["method", "calls", "err", "stmts", "rows"]
+    assert lines[1].split() == [
+        "a_rather_long_method_nam",
+        *("1", "0", "4", "3", "20.00", "25.00", "25.00"),
+    ]
+    assert lines[2].split() == ["get_role", "3", "1", "3", "0", "3.00", "1.00", "1.00"]
+    assert len(lines) == 3  # past the limit
+
+
+@pytest.mark.asyncio
+async def test_serve_metrics():
+    registry = Registry()
+    registry.counter("t_total", "Things.").labels().inc()
+    server = await serve_metrics(registry, 0)
+    port = server.sockets[0].getsockname()[1]
+    async with server:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = await reader.read()
+        writer.close()
+    assert response.startswith(b"HTTP/1.1 200 OK")
+    assert response.endswith(b"t_total 1\n")
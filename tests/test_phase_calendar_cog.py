@@ -0,0 +1,126 @@
+# STL
+import os
+import asyncio
+import importlib
+from types import SimpleNamespace
+from collections import Counter, deque
+
+# the cog imports the bot's entrypoint, which wants these
+os.environ.setdefault("DISCORD_TOKEN", "test")
+os.environ.setdefault("DB_FILE", ":memory:")
+
+# PDM
+import pytest
+
+# LOCAL
+from tenpo.db import TenpoDBFactory
+
+COG = importlib.import_module("tenpo.cogs.phase-calendar.cog")
+FULL = "🌕 mun tenpo"
+NEW = "🌑 mun tenpo"
+
+
+class FakeChannel:
+    def __init__(self, channel_id: int, name: str):
+        self.id = channel_id
+        self.name = name
+        self.edits = 0
+
+    async def edit(self, name: str):
+        self.edits += 1
+        self.name = name
+
+
+def make_cog(channels: list[FakeChannel]):
+    cog = object.__new__(COG.CogPhaseCalendar)  # skip starting the tick
+    cog.bot = SimpleNamespace(get_channel={c.id: c for c in channels}.get)
+    cog.applied, cog.renames, cog.outcomes = {}, {}, Counter()
+    cog.limit = asyncio.Semaphore(COG.RENAME_CONCURRENCY)
+    return cog
+
+
+def test_take_budget_refills_after_the_window(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr(COG.time, "monotonic", lambda: now[0])
+    cog = make_cog([])
+
+    assert all(cog.take_budget(1) for _ in range(COG.RENAME_BUDGET))
+    assert not cog.take_budget(1)
+    assert cog.take_budget(2)
+
+    now[0] = COG.RENAME_WINDOW + 1
+    assert cog.take_budget(1)
+
+
+def test_is_current_remembers_applied_titles():
+    channel = FakeChannel(1, FULL)
+    cog = make_cog([channel])
+
+    assert cog.is_current(channel, FULL)
+    assert cog.applied[1] == FULL
+    assert not cog.is_current(channel, NEW)
+
+    cog.applied[1] = NEW  # renamed by us, before Discord told the cache
+    assert cog.is_current(channel, NEW)
+
+
+@pytest.mark.asyncio
+async def test_moon_calendar_spreads_only_renames(monkeypatch):
+    current = FakeChannel(11, FULL)
+    stale = FakeChannel(12, NEW)
+    spent = FakeChannel(13, NEW)
+    turned = FakeChannel(14, NEW)  # the phase turns back while it waits
+    cog = make_cog([current, stale, spent, turned])
+    cog.renames[13] = deque([COG.time.monotonic()] * COG.RENAME_BUDGET)
+
+    async def get_calendar_titles():
+        return {c.id - 10: (c.id, FULL) for c in (current, stale, spent, turned)}
+
+    async def get_calendar_title(eid: int):
+        return NEW if eid == 4 else FULL
+
+    monkeypatch.setattr(COG, "get_calendar_titles", get_calendar_titles)
+    monkeypatch.setattr(COG, "get_calendar_title", get_calendar_title)
+    monkeypatch.setattr(COG, "RENAME_SPREAD", 1e-5)
+
+    delays = []
+    update_calendar = cog.update_calendar
+
+    async def spy(eid, channel_id, title, delay=0.0):
+        delays.append(delay)
+        return await update_calendar(eid, channel_id, title, delay)
+
+    cog.update_calendar = spy
+    await cog.moon_calendar()
+
+    spacing = COG.CALENDAR_MINUTES * 60 * COG.RENAME_SPREAD / 3
+    assert delays == pytest.approx([0, spacing, 2 * spacing])
+    assert cog.outcomes == Counter(skipped=2, sent=1, rate_limited=1)
+    assert [c.edits for c in (current, stale, spent, turned)] == [0, 1, 0, 0]
+
+
+@pytest.mark.asyncio
+async def test_bulk_titles_match_each_calendar(monkeypatch):
+    db = await TenpoDBFactory(":memory:")
+    monkeypatch.setattr(COG, "DB", db)
+    # always open, almost never open, someone else's timing, and a shared one
+    configs = [
+        ("mun", "UTC", "720h"),
+        ("mun", "Asia/Tokyo", "1m"),
+        ("wile", "UTC", "720h"),
+        ("mun", "UTC", "720h"),
+    ]
+    for eid, (timing, timezone, length) in enumerate(configs, start=1):
+        await db.set_calendar(eid, 100 + eid)
+        await db.set_timing(eid, timing)
+        await db.set_timezone(eid, timezone)
+        await db.set_length(eid, length)
+
+    titles = await COG.get_calendar_titles()
+    assert titles == {
+        eid: (100 + eid, await COG.get_calendar_title(eid))
+        for eid in range(1, len(configs) + 1)
+    }
+    assert titles[1][1].endswith("o toki pona taso")
+    assert titles[3][1].endswith("mun tenpo")
+    await db.close()
@@ -0,0 +1,112 @@
+# STL
+import time
+from datetime import UTC, datetime, timedelta
+from itertools import islice
+
+# PDM
+import numpy
+import pytest
+
+# LOCAL
+from tenpo.phase_utils import (
+    PHASE_EMOJIS,
+    EMOJI_STEP_SIZE,
+    PhaseTimer,
+    degrees_to_emoji,
+    find_moon_events,
+    moon_windows_open,
+    datetime_to_degrees,
+    timestamps_to_emojis,
+    timestamps_to_degrees,
+    degrees_to_emoji_indices,
+)
+
+RNG = numpy.random.default_rng(1234)
+# 2000-01-01 to 2040-01-01, inside de421's range
+TIMESTAMPS = RNG.uniform(946684800, 2208988800, 200)
+
+
+def test_vector_degrees_match_scalar():
+    degrees = timestamps_to_degrees(TIMESTAMPS)
+    for ts, deg in zip(TIMESTAMPS, degrees):
+        expected = datetime_to_degrees(datetime.fromtimestamp(ts, UTC))
+        assert deg == pytest.approx(expected, abs=1e-9)
+
+
+def test_vector_emojis_match_scalar():
+    degrees = numpy.linspace(0, 360, 1000, endpoint=False)
+    indices = degrees_to_emoji_indices(degrees)
+    for deg, index in zip(degrees, indices):
+        assert index == numpy.floor(deg // EMOJI_STEP_SIZE)
+        assert degrees_to_emoji(deg) == PHASE_EMOJIS[index]
+
+    emojis = timestamps_to_emojis(TIMESTAMPS)
+    for ts, emoji in zip(TIMESTAMPS, emojis):
+        deg = datetime_to_degrees(datetime.fromtimestamp(ts, UTC))
+        assert emoji == degrees_to_emoji(deg)
+
+
+@pytest.mark.slow
+def test_bench_vector_phase():
+    timestamps = RNG.uniform(946684800, 2208988800, 10_000)
+
+    start = time.perf_counter()
+    _ = timestamps_to_emojis(timestamps)
+    vector = time.perf_counter() - start
+
+    sample = timestamps[:200]
+    start = time.perf_counter()
+    for ts in sample:
+        _ = degrees_to_emoji(datetime_to_degrees(datetime.fromtimestamp(ts, UTC)))
+    scalar = (time.perf_counter() - start) * len(timestamps) / len(sample)
+
+    print(
+        "10k points: vectorised %.3fs, scalar ~%.3fs (%.0fx)"
+        % (vector, scalar, scalar / vector)
+    )
+    assert vector < scalar
+
+
+def test_single_sweep_matches_stepped_search():
+    timer = PhaseTimer("US/Central", "3d")
+    ref = datetime(2025, 3, 1, tzinfo=UTC)
+
+    stepped = []
+    step_ref = ref
+    for _ in range(12):
+        start, end = timer.get_next_range(step_ref)
+        stepped.append((start, end))
+        step_ref = start + timedelta(days=1)
+
+    def assert_close(found: list[tuple[datetime, datetime]]):
+        # the root search differs by microseconds with the span searched
+        assert len(found) == len(stepped)
+        for (start, end), (want_start, want_end) in zip(found, stepped):
+            assert abs(start - want_start) < timedelta(seconds=1)
+            assert abs(end - want_end) < timedelta(seconds=1)
+
+    assert_close(list(timer.get_events_from(12, ref)))
+    assert_close(list(islice(timer.iter_events(ref, chunk_days=20), 12)))
+
+    phases = [phase for *_, phase in timer.get_phases_from(12, ref)]
+    assert phases == [timer.get_phase(start) for start, _ in stepped]
+
+
+def test_shared_windows_match_each_timer():
+    configs = [("UTC", "24h"), ("US/Central", "3d"), ("Asia/Tokyo", "90m")]
+    start = datetime(2025, 3, 1, tzinfo=UTC)
+    events = find_moon_events(start, start + timedelta(days=30))
+    # either side of each window's start and of each config's end
+    refs = [
+        event.utc_datetime() + timedelta(hours=hours)
+        for event, _ in events
+        for hours in (-1, 0.5, 1.6, 23, 25, 71, 73)
+    ]
+    seen = set()
+    for ref in refs:
+        windows = moon_windows_open(configs + [("Nowhere/Special", "24h")], ref)
+        assert not windows[("Nowhere/Special", "24h")]
+        for config in configs:
+            assert windows[config] == PhaseTimer(*config).is_event_on(ref), ref
+            seen.add(windows[config])
+    assert seen == {True, False}
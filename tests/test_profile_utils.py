@@ -0,0 +1,42 @@
+# STL
+import time
+import asyncio
+
+# PDM
+import pytest
+
+# LOCAL
+from tenpo.profile_utils import MemoryTracker, run_sampler, run_cprofile
+
+GROWTH: list[bytes] = []
+
+
+async def busy(seconds: float):
+    await asyncio.sleep(0.1)  # let the profiler start
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        _ = sum(range(1000))
+
+
+@pytest.mark.asyncio
+async def test_sampler_sees_the_busy_coroutine():
+    report, _ = await asyncio.gather(run_sampler(0.5, 0.005), busy(0.3))
+    assert "busy" in report.split("# collapsed stacks")[0]
+
+
+@pytest.mark.asyncio
+async def test_cprofile_sees_the_busy_coroutine():
+    report, _ = await asyncio.gather(run_cprofile(0.5), busy(0.3))
+    assert "busy" in report
+
+
+def test_memory_diff_finds_growth():
+    memory = MemoryTracker()
+    assert memory.diff().startswith("Not tracing")
+    _ = memory.start()
+    try:
+        GROWTH.extend(bytes(1000) for _ in range(1000))
+        assert "test_profile_utils.py" in memory.diff().splitlines()[2]
+    finally:
+        _ = memory.stop()
+        GROWTH.clear()
@@ -0,0 +1,181 @@
+# STL
+import time
+import asyncio
+from collections import Counter
+
+# PDM
+import pytest
+
+# LOCAL
+from tenpo.queue_utils import ShedQueue, StageQueue, WorkerPool, FairScheduler
+
+
+def drain(queue: ShedQueue) -> list:
+    items = []
+    while len(queue):
+        items.append(asyncio.run(queue.get()))
+    return items
+
+
+def test_shed_oldest():
+    queue = ShedQueue("test_oldest", 3, "oldest")
+    for i in range(5):
+        assert queue.put(i)
+    assert drain(queue) == [2, 3, 4]
+
+
+def test_shed_stale_then_reject():
+    queue = ShedQueue("test_stale", 3, "stale", max_age=60)
+    now = time.time()
+    assert queue.put("old", born=now - 120)
+    assert queue.put("a", born=now)
+    assert queue.put("b", born=now)
+    assert queue.put("c", born=now)  # pushes out "old"
+    assert not queue.put("d", born=now)  # nothing stale left
+    assert drain(queue) == ["a", "b", "c"]
+
+
+def test_shed_reacts_before_deletes():
+    react, delete = 0, 1
+    queue = ShedQueue("test_priority", 3, "priority", priorities=2)
+    assert queue.put("delete 1", priority=delete)
+    assert queue.put("react 1", priority=react)
+    assert queue.put("react 2", priority=react)
+    assert queue.put("delete 2", priority=delete)  # sheds react 1
+    assert queue.put("react 3", priority=react)  # sheds react 2, the older
+    assert queue.put("delete 3", priority=delete)  # sheds react 3
+    assert not queue.put("react 4", priority=react)  # all deletes left
+    # still first in, first out across priorities
+    assert drain(queue) == ["delete 1", "delete 2", "delete 3"]
+
+
+def test_expired_items_are_skipped():
+    queue = ShedQueue("test_expired", 10, "oldest", max_age=60)
+    assert queue.put("old", born=time.time() - 120)
+    assert queue.put("new")
+    assert drain(queue) == ["new"]
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_bounds_concurrency():
+    queue = ShedQueue("test_pool", 100, "oldest")
+    running, peak, done = 0, 0, []
+
+    async def handle(item: int):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        done.append(item)
+
+    pool = WorkerPool(queue, handle, workers=4)
+    pool.start(asyncio.get_running_loop())
+    for i in range(20):
+        assert queue.put(i)
+    while len(done) < 20:
+        await asyncio.sleep(0.01)
+    pool.stop()
+    assert peak == 4
+    assert sorted(done) == list(range(20))
+
+
+@pytest.mark.asyncio
+async def test_stage_queue_holds_back_the_stage_before():
+    first = ShedQueue("test_first", 100, "oldest")
+    between: StageQueue[int] = StageQueue("test_between", 2)
+    done = []
+
+    async def slow(item: int):
+        await asyncio.sleep(0.01)
+        done.append(item)
+
+    feed = WorkerPool(first, between.put, workers=1, stage="test_feed")
+    handle = WorkerPool(between, slow, workers=1)
+    for pool in (feed, handle):
+        pool.start(asyncio.get_running_loop())
+    for i in range(10):
+        assert first.put(i)
+    await asyncio.sleep(0.03)
+    assert len(between) <= 2 and len(first) > 0  # waiting, not shed
+    while len(done) < 10:
+        await asyncio.sleep(0.01)
+    feed.stop()
+    handle.stop()
+    assert done == list(range(10))
+
+
+async def run_scheduler(scheduler: FairScheduler, done: list, n: int):
+    scheduler.start(asyncio.get_running_loop())
+    while len(done) < n:
+        await asyncio.sleep(0.005)
+    scheduler.stop()
+
+
+@pytest.mark.asyncio
+async def test_fair_scheduler_serves_quiet_keys_between_a_spike():
+    done = []
+
+    async def handle(item: tuple[str, int]):
+        await asyncio.sleep(0)
+        done.append(item)
+
+    scheduler = FairScheduler("test_fair", handle, workers=1)
+    for i in range(50):
+        scheduler.submit("noisy", ("noisy", i))
+    for key in ("quiet 1", "quiet 2"):
+        scheduler.submit(key, (key, 0))
+    await run_scheduler(scheduler, done, 52)
+
+    # each quiet key is served within the first round, not after the spike
+    assert done.index(("quiet 1", 0)) < 3 and done.index(("quiet 2", 0)) < 3
+    assert [i for key, i in done if key == "noisy"] == list(range(50))
+
+
+@pytest.mark.asyncio
+async def test_fair_scheduler_caps_and_costs():
+    running, peak, done = Counter(), Counter(), []
+
+    async def handle(item: tuple[str, int]):
+        key = item[0]
+        running[key] += 1
+        peak[key] = max(peak[key], running[key])
+        await asyncio.sleep(0.01)
+        running[key] -= 1
+        done.append(item)
+
+    scheduler = FairScheduler("test_cap", handle, workers=8, per_key=2, quantum=2)
+    for i in range(10):
+        scheduler.submit("cheap", ("cheap", i), cost=1)
+        scheduler.submit("costly", ("costly", i), cost=2)
+    await run_scheduler(scheduler, done, 20)
+    assert peak == {"cheap": 2, "costly": 2}
+
+
+def test_fair_scheduler_sheds_the_largest_backlog():
+    async def handle(item):
+        pass
+
+    scheduler = FairScheduler("test_fair_shed", handle, workers=1, maxsize=4)
+    for i in range(3):
+        scheduler.submit("noisy", i)
+    scheduler.submit("quiet", 0)
+    scheduler.submit("quiet", 1)  # full: noisy loses its oldest
+    assert len(scheduler) == 4
+    assert [item for _, _, item in scheduler.queues["noisy"]] == [1, 2]
+    assert len(scheduler.queues["quiet"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_fair_scheduler_weighs_turns_by_cost():
+    done = []
+
+    async def handle(key: str):
+        done.append(key)
+
+    scheduler = FairScheduler("test_drr", handle, workers=1, quantum=2)
+    for _ in range(6):
+        scheduler.submit("cheap", "cheap", cost=1)
+        scheduler.submit("costly", "costly", cost=2)
+    await run_scheduler(scheduler, done, 9)
+    assert done[:9] == ["cheap", "cheap", "costly"] * 3
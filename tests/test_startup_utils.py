@@ -0,0 +1,38 @@
+# STL
+import sys
+import time
+import builtins
+
+# LOCAL
+from tenpo.startup_utils import StartupProfile
+
+
+def test_startup_profile_times_steps_and_imports():
+    original = builtins.__import__
+    _ = sys.modules.pop("wave", None)
+    profile = StartupProfile(enabled=True)
+    try:
+        with profile.step("cog", "outer"):
+            time.sleep(0.02)
+            with profile.step("init", "inner"):
+                time.sleep(0.05)
+            _ = __import__("wave")
+    finally:
+        profile.finish()
+    assert builtins.__import__ is original
+
+    timings = {t.name: t for t in profile.timings}
+    assert timings["inner"].own >= 0.05
+    assert timings["outer"].seconds >= 0.07
+    # the inner step and the import are not the outer step's own time
+    assert timings["outer"].own < timings["outer"].seconds - 0.05
+    assert timings["wave"].kind == "import"
+    report = profile.report("Done", budget=60)
+    assert "within the 60.0s budget" in report and "wave" in report
+
+
+def test_disabled_profile_times_nothing():
+    profile = StartupProfile(enabled=False)
+    with profile.step("cog", "anything"):
+        _ = __import__("json")
+    assert profile.timings == []
@@ -1,8 +1,11 @@
 """
 Test the interface of TenpoDB
 """
+
 # STL
+import os
 import asyncio
+import sqlite3
 from typing import List
 from datetime import datetime
 
@@ -11,7 +14,19 @@ import pytest
 from sqlalchemy import text, select, update
 
 # LOCAL
-from tenpo.db import Entity, TenpoDB, ConfigKey
+from tenpo.db import (
+    CURRENT_CALL,
+    DEFAULT_REACTS,
+    Entity,
+    IjoSiko,
+    TenpoDB,
+    ConfigKey,
+    BackupError,
+    BackupProgress,
+    TenpoDBFactory,
+)
+from tenpo.shard_utils import split_database
+from tenpo.croniter_utils import InvalidCron
 
 
 @pytest.fixture(scope="module")
@@ -213,3 +228,197 @@ async def test_toggle_open(tenpo_db) -> None:
 
     saved_opens = await tenpo_db.get_opens(1)
     assert saved_opens == []
+
+
+@pytest.mark.asyncio
+async def test_cross_process_eviction(tmp_path, monkeypatch) -> None:
+    monkeypatch.setattr("tenpo.db.CHANGE_POLL_INTERVAL", 0)
+    db_file = str(tmp_path / "tenpo.sqlite")
+    ours = await TenpoDBFactory(db_file)
+    theirs = await TenpoDBFactory(db_file)
+
+    # warm our cache for both entities
+    assert await ours.get_timing(1) == "ala"
+    assert await ours.get_timing(2) == "ala"
+    assert not await ours.in_checked_channel(1, None, 10, None, None)
+    assert not await ours.is_event_time(3)
+
+    await theirs.set_timing(1, "ale")
+    await theirs.upsert_rule(10, IjoSiko.CHANNEL, 1)
+    await theirs.set_timing(3, "ale")
+
+    assert await ours.is_event_time(3)
+    assert await ours.get_timing(1) == "ale"
+    assert await ours.in_checked_channel(1, None, 10, None, None)
+    assert await ours.get_timing(2) == "ala"
+
+    await ours.close()
+    await theirs.close()
+
+
+@pytest.mark.asyncio
+async def test_cached_config_is_not_shared() -> None:
+    db = await TenpoDBFactory(":memory:")
+
+    reacts = await db.get_reacts(1)
+    reacts.clear()
+    assert await db.get_reacts(1) == DEFAULT_REACTS
+
+    rules, _ = await db.list_rules(1)
+    rules[IjoSiko.ALL].add(1)
+    rules, _ = await db.list_rules(1)
+    assert not rules[IjoSiko.ALL]
+
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_schedule_publishes_transitions() -> None:
+    db = await TenpoDBFactory(":memory:")
+    transitions = []
+
+    async def subscriber(eid: int, active: bool):
+        transitions.append((eid, active))
+
+    db.schedule.subscribe(subscriber)
+    runner = asyncio.create_task(db.schedule.run(db.resolve_window))
+
+    await db.set_timing(1, "ale")
+    assert await db.is_event_time(1)
+    await db.set_timing(1, "ala")
+    await asyncio.sleep(0.1)
+    assert not await db.is_event_time(1)
+    assert transitions == [(1, False)]
+
+    runner.cancel()
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_toggle_schedules() -> None:
+    db = await TenpoDBFactory(":memory:")
+    always = ("* * * * *", "UTC", "2m")  # overlapping windows, so always on
+    weekly = ("0 0 * * 6", "UTC", "24h")
+
+    assert await db.toggle_schedule(1, always)
+    assert await db.toggle_schedule(1, weekly)
+    assert await db.get_schedules(1) == [always, weekly]
+    await db.set_timing(1, "mute")
+    assert 1 in await db.get_timed()
+    assert await db.is_event_time(1)
+
+    assert not await db.toggle_schedule(1, always)
+    assert await db.get_schedules(1) == [weekly]
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_snapshot_matches_getters() -> None:
+    db = await TenpoDBFactory(":memory:")
+    await db.set_timing(1, "wile")
+    await db.set_cron(1, "0 12 * * 5")
+    await db.toggle_open(1, "//")
+
+    snapshot = await db.get_snapshot(1)
+    assert snapshot["timing"] == await db.get_timing(1) == "wile"
+    assert snapshot["cron"] == await db.get_cron(1)
+    assert snapshot["timezone"] == await db.get_timezone(1)
+    assert snapshot["opens"] == await db.get_opens(1) == ["//"]
+    assert snapshot["reacts"] == await db.get_reacts(1)
+    assert (snapshot["rules"], snapshot["exceptions"]) == await db.list_rules(1)
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_old_files_switch_to_incremental_vacuum(tmp_path) -> None:
+    db_file = str(tmp_path / "tenpo.sqlite")
+    conn = sqlite3.connect(db_file)
+    _ = conn.execute("CREATE TABLE old (id INTEGER)")
+    conn.close()
+
+    db = await TenpoDBFactory(db_file)
+    async with db.engine.connect() as conn:
+        result = await conn.exec_driver_sql("PRAGMA auto_vacuum")
+        assert result.scalar_one() == 2  # INCREMENTAL
+    await db.close()
+
+
+def test_backup_progress_gives_up_on_restarts(monkeypatch) -> None:
+    monkeypatch.setattr("tenpo.db.BACKUP_SLEEP", 0)
+    monkeypatch.setattr("tenpo.db.BACKUP_RESTARTS", 2)
+    progress = BackupProgress("tenpo.sqlite")
+    progress(0, 9, 10)
+    progress(0, 8, 10)
+    progress(0, 9, 10)  # written to; back to the first page
+    progress(0, 8, 10)
+    progress(0, 9, 11)
+    assert progress.restarts == 2
+    with pytest.raises(BackupError):
+        progress(0, 10, 11)
+
+
+@pytest.mark.asyncio
+async def test_failed_backup_leaves_nothing(tmp_path, monkeypatch) -> None:
+    class Busy(BackupProgress):
+        def __call__(self, status: int, remaining: int, total: int):
+            raise BackupError(self.path)
+
+    monkeypatch.setattr("tenpo.db.BackupProgress", Busy)
+    db = await TenpoDBFactory(str(tmp_path / "tenpo.sqlite"), shards=2)
+    target = str(tmp_path / "backup.sqlite")
+    with pytest.raises(BackupError):
+        await db.backup(target)
+    assert sorted(os.listdir(tmp_path)) == ["tenpo.0.sqlite", "tenpo.1.sqlite"]
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_refuse_unsplit_shards(tmp_path) -> None:
+    db_file = str(tmp_path / "tenpo.sqlite")
+    db = await TenpoDBFactory(db_file)
+    await db.set_pause(1, 10)
+    await db.close()
+
+    with pytest.raises(FileNotFoundError, match="shard_utils"):
+        _ = await TenpoDBFactory(db_file, shards=2)
+    assert not os.path.exists(tmp_path / "tenpo.0.sqlite")
+
+    _ = await split_database(db_file, 2)
+    db = await TenpoDBFactory(db_file, shards=2)
+    assert await db.get_pause(1) == 10
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_peek_response_only_reads_the_cache() -> None:
+    db = await TenpoDBFactory(":memory:")
+    assert db.peek_response(1) is None
+    await db.set_response(1, "weka")
+    assert db.peek_response(1) is None  # evicted by the write
+    assert await db.get_response(1) == "weka"
+    assert db.peek_response(1) == "weka"
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_stats_charge_the_innermost_method() -> None:
+    db = await TenpoDBFactory(":memory:")
+    await db.set_cron(1, "0 0 * * *")
+    db.stats.clear()
+
+    _ = await db.get_cron(1)  # cached: only the check for others' writes
+    _ = await db.get_cron(2)  # uncached: that check, and the select
+    assert (db.stats["get_cron"].calls, db.stats["get_cron"].statements) == (2, 3)
+
+    # the write's statements are its own, the read it makes first is not
+    _ = await db.toggle_schedule(3, ("bad", "UTC", "1h"))
+    assert db.stats["toggle_schedule"].statements == 3
+    assert db.stats["get_schedules"].statements == 2
+
+    with pytest.raises(InvalidCron):
+        _ = await db.get_multi_timer(3)
+    timer = db.stats["get_multi_timer"]
+    assert (timer.calls, timer.errors, timer.statements) == (1, 1, 0)
+    assert (db.stats["get_schedules"].calls, db.stats["get_schedules"].errors) == (2, 0)
+    assert CURRENT_CALL.get() == "<none>"
+    await db.close()
@@ -0,0 +1,50 @@
+# STL
+from datetime import UTC, datetime, timedelta
+
+# PDM
+import numpy
+
+# LOCAL
+from tenpo.timer_utils import MultiTimer, merge_intervals, get_schedule_timer
+
+RNG = numpy.random.default_rng(1234)
+STEP = timedelta(days=3)
+SCHEDULES = [
+    ("0 0 * * 6", "US/Central", "24h"),
+    ("mun", "UTC", "2d"),
+    ("0 12 * * 5", "US/Central", "18h"),  # runs into saturday's window
+]
+
+
+def test_merge_intervals():
+    assert merge_intervals([(5, 6), (1, 3), (2, 4), (4, 4.5), (7, 8)]) == [
+        (1, 4.5),
+        (5, 6),
+        (7, 8),
+    ]
+
+
+def test_multi_timer_is_union_of_schedules():
+    timer = MultiTimer(SCHEDULES)
+    start = datetime(2025, 3, 1, tzinfo=UTC)
+    end = start + timedelta(days=150)
+
+    # every window of every schedule over the span, found one by one
+    expected = []
+    for schedule in SCHEDULES:
+        for window in get_schedule_timer(schedule).iter_events(start - STEP):
+            if window[0] > end:
+                break
+            expected.append(window)
+
+    # refs spread over more than one merge horizon, so it rebuilds too
+    for offset in sorted(RNG.uniform(0, 150, 300)):
+        ref = start + timedelta(days=offset)
+        is_on = any(begin <= ref < until for begin, until in expected)
+        assert timer.is_event_on(ref) == is_on
+
+    windows = list(timer.get_events_from(20, start))
+    for (_, end), (next_start, _) in zip(windows, windows[1:]):
+        assert end < next_start  # sorted and disjoint
+    # friday noon through saturday is one window, not two
+    assert any(end - begin == timedelta(hours=36) for begin, end in windows)